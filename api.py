@@ -5,7 +5,7 @@ import uuid
 import random
 from typing import Annotated
 
-from fastapi import FastAPI, Depends, status, HTTPException, BackgroundTasks, Response
+from fastapi import FastAPI, Depends, status, HTTPException, Response
 from pydantic import BaseModel, Field
 from starlette.responses import JSONResponse
 from pathlib import Path
@@ -15,6 +15,9 @@ configure_logging()
 
 import ocr
 from aws import aws
+from ocr import readingorder
+from ocr.checkpoint import document_checkpoint_dir
+from ocr.textract import ratelimit, cache
 from utils import task
 from utils.settings import ApiSettings, api_settings
 
@@ -27,12 +30,24 @@ class StartPayload(BaseModel):
 if api_settings().skip_processing:
     logging.warning("SKIP_PROCESSING is active, files will always be marked as completed without being proceed")
 
+task.configure(workers=api_settings().workers, queue_limit=api_settings().queue_limit)
+ratelimit.configure(
+    max_rate=api_settings().textract_max_tps,
+    min_rate=api_settings().textract_min_tps,
+    state_path=api_settings().textract_rate_limit_file
+)
+cache.configure(path=api_settings().textract_cache_path, max_mb=api_settings().textract_cache_max_mb)
+readingorder.configure(
+    max_lines=api_settings().reading_order_max_lines or None,
+    time_budget_seconds=api_settings().reading_order_time_budget_seconds or None
+)
+aws.configure(api_settings())
+
 
 @app.post("/")
 def start(
         payload: StartPayload,
         settings: Annotated[ApiSettings, Depends(api_settings)],
-        background_tasks: BackgroundTasks,
 ):
     if not payload.file.endswith('.pdf'):
         raise HTTPException(
@@ -40,22 +55,38 @@ def start(
             detail={"message": "input must be a PDF file"}
         )
 
-    aws_client = aws.connect(settings)
-    has_file = aws_client.exists_input_file(
+    aws_client = aws.shared_client()
+    file_size = aws_client.input_file_size(
         settings.s3_input_bucket,
         f'{settings.s3_input_folder}{payload.file}',
     )
 
-    if not has_file:
+    if file_size is None:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail={"message": "file does not exist"}
         )
 
-    task.start(payload.file, background_tasks, lambda: process(payload, aws_client, settings))
+    try:
+        task.start(payload.file, lambda: process(payload, aws_client, settings, file_size))
+    except task.QueueFullError:
+        logging.warning(f"Rejecting '{payload.file}', as the queue is full.")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={"message": "too many files are waiting to be processed, please retry later"},
+            headers={"Retry-After": str(settings.queue_retry_after_seconds)},
+        )
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
+@app.get("/status")
+def get_status():
+    return JSONResponse(status_code=status.HTTP_200_OK, content={
+        "queue": task.status(),
+        "connections": aws.shared_client().pool_stats(),
+    })
+
+
 class CollectPayload(BaseModel):
     file: str = Field(min_length=1)
 
@@ -97,6 +128,7 @@ def process(
         payload: StartPayload,
         aws_client: aws.Client,
         settings: Annotated[ApiSettings, Depends(api_settings)],
+        file_size: int | None = None,
 ):
     task_id = f"{uuid.uuid4()}"
     tmp_dir = Path(settings.tmp_path) / task_id
@@ -112,11 +144,19 @@ def process(
     output_path = output_dir / filename
     os.makedirs(output_dir, exist_ok=True)
 
-    aws.load_file(
-        aws_client.s3_input.Bucket(settings.s3_input_bucket),
-        f'{settings.s3_input_folder}{payload.file}',
-        str(input_path),
-    )
+    input_key = f'{settings.s3_input_folder}{payload.file}'
+    transfer_config = aws.transfer_config(settings.download_part_mb, settings.download_concurrency)
+    input_bytes = None
+    if (
+        not settings.skip_processing
+        and file_size is not None
+        and file_size <= settings.input_in_memory_max_mb * aws.MB
+    ):
+        input_bytes = aws.download_bytes(aws_client.s3_input, settings.s3_input_bucket, input_key, transfer_config)
+    else:
+        aws.download_file(
+            aws_client.s3_input, settings.s3_input_bucket, input_key, str(input_path), transfer_config
+        )
 
     if settings.skip_processing:
         # fake results from OCR processing and override output_path with input_path to replace file with metadata
@@ -131,13 +171,23 @@ def process(
             textract_client=aws_client.textract,
             confidence_threshold=settings.confidence_threshold,
             use_aggressive_strategy=settings.use_aggressive_strategy,
+            textract_max_concurrency=settings.textract_max_concurrency,
+            page_pipeline_depth=settings.page_pipeline_depth,
+            checkpoint_dir=document_checkpoint_dir(settings.checkpoint_path, payload.file) if settings.checkpoint_path else None,
+            save_interval_pages=settings.save_interval_pages,
+            save_interval_seconds=settings.save_interval_seconds,
+            input_bytes=input_bytes,
+            output_in_memory_max_bytes=settings.output_in_memory_max_mb * aws.MB,
+            output_verification=settings.output_verification,
         ).process()
 
-    aws.store_file(
-        aws_client.s3_output.Bucket(settings.s3_output_bucket),
+    aws.upload_file(
+        aws_client.s3_output,
+        settings.s3_output_bucket,
         f'{settings.s3_output_folder}{payload.file}',
         str(output_path),
-        process_result
+        process_result,
+        aws.transfer_config(settings.upload_part_mb, settings.upload_concurrency)
     )
 
     shutil.rmtree(tmp_dir)
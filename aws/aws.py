@@ -1,9 +1,17 @@
+import io
+import logging
+import queue
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Protocol
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from mypy_boto3_s3 import S3ServiceResource
+from mypy_boto3_s3 import S3Client
 from mypy_boto3_s3.service_resource import Bucket
 from mypy_boto3_textract import TextractClient as Textractor
 
@@ -21,25 +29,42 @@ class SupportsStr(Protocol):
 # note: AWS stores metadata keys in lower case per default
 METADATA_PAGE_COUNT_KEY = "pagecount"
 
+MB = 1024 * 1024
+
 
 @dataclass
 class Client:
-    s3_input: S3ServiceResource
-    s3_output: S3ServiceResource
+    """Low-level clients, which are thread-safe and can be shared by all requests and background jobs of the API.
+
+    Unlike the clients, boto3 resources (e.g. Bucket) are not thread-safe, so the S3 calls are made with the client API.
+    """
+    s3_input: S3Client
+    s3_output: S3Client
     textract: Textractor
 
     def exists_input_file(self, bucket_name: str, key: str) -> bool:
+        return self.input_file_size(bucket_name, key) is not None
+
+    def input_file_size(self, bucket_name: str, key: str) -> int | None:
+        """Returns the size of the input file in bytes, or None if the file does not exist."""
         try:
-            self.s3_input.Object(bucket_name, key).load()
-            return True
+            return self.s3_input.head_object(Bucket=bucket_name, Key=key)['ContentLength']
         except ClientError as e:
             if e.response['Error']['Code'] == '404':
-                return False
+                return None
             else:
                 raise e
 
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        return {
+            "s3_input": pool_stats(self.s3_input),
+            "s3_output": pool_stats(self.s3_output),
+            "textract": pool_stats(self.textract),
+        }
+
 
 def connect(settings: ApiSettings) -> Client:
+    config = client_config(settings)
     has_profile = is_set(settings.aws_profile)
 
     if has_profile:
@@ -53,12 +78,78 @@ def connect(settings: ApiSettings) -> Client:
         textract_session = session
 
     return Client(
-        s3_input=session.resource('s3', endpoint_url=settings.s3_input_endpoint),
-        s3_output=session.resource('s3', endpoint_url=settings.s3_output_endpoint),
-        textract=textract_session.client('textract')
+        s3_input=session.client('s3', endpoint_url=settings.s3_input_endpoint, config=config),
+        s3_output=session.client('s3', endpoint_url=settings.s3_output_endpoint, config=config),
+        textract=textract_session.client('textract', config=config)
     )
 
 
+def client_config(settings: ApiSettings) -> Config:
+    max_pool_connections = settings.aws_max_pool_connections
+    if max_pool_connections is None:
+        # Enough connections for all concurrent requests of all workers (but at least the botocore default). The same
+        # config is used for every client, so it must cover the concurrent Textract requests as well as the concurrent
+        # parts of the S3 downloads and uploads.
+        max_concurrency = max(
+            settings.textract_max_concurrency,
+            settings.download_concurrency,
+            settings.upload_concurrency
+        )
+        max_pool_connections = max(10, settings.workers * max_concurrency)
+
+    retries = {}
+    if settings.aws_retry_mode is not None:
+        retries['mode'] = settings.aws_retry_mode
+    if settings.aws_max_attempts is not None:
+        retries['total_max_attempts'] = settings.aws_max_attempts
+
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=settings.aws_tcp_keepalive,
+        retries=retries or None,
+    )
+
+
+_shared_client: Client | None = None
+
+
+def configure(settings: ApiSettings):
+    """Creates the clients that are shared by all requests and background jobs of the API.
+
+    Creating the clients only once avoids resolving the credentials and doing new TLS handshakes for every file, as
+    idle connections are kept in the connection pools of the clients and re-used.
+    """
+    global _shared_client
+    _shared_client = connect(settings)
+    config = client_config(settings)
+    logging.info(f"Connected to AWS with up to {config.max_pool_connections} pooled connections per client.")
+
+
+def shared_client() -> Client:
+    return _shared_client
+
+
+def pool_stats(client) -> dict[str, int]:
+    """Statistics about the urllib3 connection pools of a botocore client."""
+    # botocore does not offer a public API for this, so we have to access some internals. Fail gracefully if these
+    # internals ever change.
+    try:
+        http_session = client._endpoint.http_session
+        managers = [http_session._manager, *http_session._proxy_managers.values()]
+        pools = [manager.pools[key] for manager in managers for key in manager.pools.keys()]
+        return {
+            "max_pool_connections": http_session._max_pool_connections,
+            "pools": len(pools),
+            "connections_created": sum(pool.num_connections for pool in pools),
+            "idle_connections": sum(
+                1 for pool in pools if pool.pool is not None for conn in list(pool.pool.queue) if conn is not None
+            ),
+            "requests": sum(pool.num_requests for pool in pools),
+        }
+    except (AttributeError, KeyError):
+        return {}
+
+
 def is_set(value: str | None) -> bool:
     return value is not None and len(value) > 0
 
@@ -71,17 +162,132 @@ def open_session_by_service_role() -> boto3.Session:
     return boto3.Session()
 
 
-def load_file(bucket: Bucket, key: str, local_path: str):
-    bucket.download_file(key, local_path)
+def transfer_config(part_mb: int, concurrency: int) -> TransferConfig:
+    """Configuration for S3 transfers, where files larger than part_mb are transferred in parallel parts."""
+    return TransferConfig(
+        multipart_threshold=part_mb * MB,
+        multipart_chunksize=part_mb * MB,
+        max_concurrency=concurrency
+    )
+
+
+def load_file(bucket: Bucket, key: str, local_path: str, config: TransferConfig | None = None):
+    download_file(bucket.meta.client, bucket.name, key, local_path, config)
+
+
+def download_file(
+        s3_client: S3Client,
+        bucket_name: str,
+        key: str,
+        local_path: str,
+        config: TransferConfig | None = None
+):
+    s3_client.download_file(bucket_name, key, local_path, Config=config)
+
+
+def load_bytes(bucket: Bucket, key: str, config: TransferConfig | None = None) -> bytes:
+    return download_bytes(bucket.meta.client, bucket.name, key, config)
+
+
+def download_bytes(s3_client: S3Client, bucket_name: str, key: str, config: TransferConfig | None = None) -> bytes:
+    """Downloads a file directly into memory. Large files are downloaded using parallel ranged GET requests."""
+    buffer = io.BytesIO()
+    s3_client.download_fileobj(bucket_name, key, buffer, Config=config)
+    return buffer.getvalue()
+
+
+def list_objects(bucket: Bucket, prefix: str) -> Iterator[tuple[str, int]]:
+    """Lists the keys and sizes of all objects with the given prefix, one page of results after the other."""
+    for obj in bucket.objects.filter(Prefix=prefix):
+        yield obj.key, obj.size
+
+
+def list_objects_parallel(bucket: Bucket, prefix: str, concurrency: int) -> Iterator[tuple[str, int]]:
+    """Lists the keys and sizes of all objects with the given prefix, listing the sub-prefixes in parallel.
 
+    The sub-prefixes are the "directories" directly below the prefix, i.e. the common prefixes up to the next "/". Their
+    objects are yielded as soon as each page of results arrives, so the order of the objects is not deterministic.
+    """
+    paginator = bucket.meta.client.get_paginator("list_objects_v2")
+    sub_prefixes = []
+    for page in paginator.paginate(Bucket=bucket.name, Prefix=prefix, Delimiter="/"):
+        for obj in page.get("Contents", []):
+            yield obj["Key"], obj["Size"]
+        sub_prefixes.extend(common_prefix["Prefix"] for common_prefix in page.get("CommonPrefixes", []))
+    logging.info(f"Listing {len(sub_prefixes)} sub-prefixes of '{prefix}' with {concurrency} threads.")
 
-def store_file(bucket: Bucket, key: str, local_path: str, process_result: ProcessResult):
-    bucket.upload_file(local_path, key, ExtraArgs={
+    # Only a limited number of pages is buffered, so that the listing does not run too far ahead of the processing.
+    pages: queue.Queue[list[tuple[str, int]] | None] = queue.Queue(maxsize=2 * concurrency)
+    stopped = threading.Event()
+
+    def put(item: list[tuple[str, int]] | None):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def list_sub_prefix(sub_prefix: str):
+        try:
+            for sub_page in paginator.paginate(Bucket=bucket.name, Prefix=sub_prefix):
+                if stopped.is_set():
+                    return
+                put([(obj["Key"], obj["Size"]) for obj in sub_page.get("Contents", [])])
+        finally:
+            put(None)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="list") as executor:
+        futures = [executor.submit(list_sub_prefix, sub_prefix) for sub_prefix in sub_prefixes]
+        try:
+            remaining = len(futures)
+            while remaining:
+                objects = pages.get()
+                if objects is None:
+                    remaining -= 1
+                else:
+                    yield from objects
+            for future in futures:
+                future.result()
+        finally:
+            # also stops the threads when the iteration is aborted early
+            stopped.set()
+
+
+def store_file(
+        bucket: Bucket,
+        key: str,
+        local_path: str,
+        process_result: ProcessResult,
+        config: TransferConfig | None = None
+):
+    upload_file(bucket.meta.client, bucket.name, key, local_path, process_result, config)
+
+
+def upload_file(
+        s3_client: S3Client,
+        bucket_name: str,
+        key: str,
+        local_path: str,
+        process_result: ProcessResult,
+        config: TransferConfig | None = None
+):
+    """Uploads the output file directly from memory if the process result contains it, and from local_path otherwise.
+
+    Large files are uploaded as a multipart upload with parallel parts, see transfer_config().
+    """
+    extra_args = {
         'ContentType': 'application/pdf',
         'Metadata': {
             **_parse_metadata(METADATA_PAGE_COUNT_KEY, process_result.number_of_pages)
         }
-    })
+    }
+    if process_result.output_bytes is not None:
+        s3_client.upload_fileobj(
+            io.BytesIO(process_result.output_bytes), bucket_name, key, ExtraArgs=extra_args, Config=config
+        )
+    else:
+        s3_client.upload_file(local_path, bucket_name, key, ExtraArgs=extra_args, Config=config)
 
 
 def _parse_metadata(key: str, value: SupportsStr | None) -> S3ObjectMetadata:
@@ -0,0 +1,83 @@
+"""Benchmark for combining the text lines from the overlapping tiles of a large page.
+
+Creates a synthetic dense page (e.g. a geological map) with many text lines, and splits it into a grid of overlapping
+tiles, as for a large page that is sent to AWS Textract in several excerpts. Lines in the overlapping parts of the tiles
+are detected in each of these tiles, with slightly different coordinates. The lines of all tiles are then combined one
+tile after the other, as in ocr.applyocr, both with combine_text_lines() and with
+tests.helpers.pairwise_combine_text_lines(), which compares all pairs of lines. Both must keep exactly the same lines.
+
+Usage (from the root directory of the repository):
+  python -m benchmarks.bench_combine_text_lines --lines 10000 --tiles 6
+"""
+import argparse
+import random
+import time
+
+import pymupdf
+
+from ocr.textline import TextLine
+from ocr.textract.textract import combine_text_lines
+from tests.helpers import pairwise_combine_text_lines
+
+PAGE_SIZE = 4000
+TILE_OVERLAP = 100
+
+
+def create_tiles(line_count: int, tiles_per_side: int, seed: int) -> list[list[TextLine]]:
+    rng = random.Random(seed)
+    page_lines = []
+    for index in range(line_count):
+        x0 = rng.uniform(0, PAGE_SIZE - 100)
+        y0 = rng.uniform(0, PAGE_SIZE - 10)
+        page_lines.append(pymupdf.Rect(x0, y0, x0 + rng.uniform(10, 100), y0 + rng.uniform(4, 10)))
+
+    tile_size = PAGE_SIZE / tiles_per_side
+    tiles = []
+    for tile_x in range(tiles_per_side):
+        for tile_y in range(tiles_per_side):
+            clip = pymupdf.Rect(
+                tile_x * tile_size - TILE_OVERLAP,
+                tile_y * tile_size - TILE_OVERLAP,
+                (tile_x + 1) * tile_size + TILE_OVERLAP,
+                (tile_y + 1) * tile_size + TILE_OVERLAP
+            )
+            tile_lines = []
+            for index, rect in enumerate(page_lines):
+                if rect in clip:
+                    # every detection of the same line has slightly different coordinates
+                    jitter = rng.uniform(-0.5, 0.5)
+                    detected = pymupdf.Rect(rect.x0 + jitter, rect.y0 + jitter, rect.x1 + jitter, rect.y1 + jitter)
+                    tile_lines.append(TextLine(f"line {index}", 0, detected, detected, 1, []))
+            tiles.append(tile_lines)
+    return tiles
+
+
+def run(combine, tiles: list[list[TextLine]]) -> tuple[list[TextLine], float]:
+    start = time.perf_counter()
+    text_lines = []
+    for tile_lines in tiles:
+        text_lines = combine(text_lines, tile_lines)
+    return text_lines, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--tiles", type=int, default=6, help="number of tiles in each direction")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tiles = create_tiles(args.lines, args.tiles, args.seed)
+    print(f"{args.lines} lines, {len(tiles)} tiles, {sum(len(tile) for tile in tiles)} detected lines in total")
+
+    indexed_lines, indexed_seconds = run(combine_text_lines, tiles)
+    print(f"grid index: {indexed_seconds:8.2f} s, {len(indexed_lines)} lines kept")
+    pairwise_lines, pairwise_seconds = run(pairwise_combine_text_lines, tiles)
+    print(f"pairwise:   {pairwise_seconds:8.2f} s, {len(pairwise_lines)} lines kept")
+
+    identical = [id(line) for line in indexed_lines] == [id(line) for line in pairwise_lines]
+    print(f"speedup: {pairwise_seconds / indexed_seconds:.1f}x, identical result: {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark for the mask of the areas of a page where no OCR should be applied.
+
+Creates a large page (e.g. a plan, or a page that has been enlarged by resize_page()), adds many small text rects to
+the mask, interleaved with queries (as in clean_old_ocr_aggressive()), and then checks many text lines against the
+unmodified mask (as in OCR.apply_ocr()). This is done both with Mask and with tests.helpers.ReferenceMask, which
+stores a float64 array and sums a submask for every query. Both must return exactly the same results.
+
+Usage (from the root directory of the repository):
+  python -m benchmarks.bench_mask --width 8000 --height 6000 --rects 20000 --lines 20000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+import pymupdf
+
+from ocr.mask import Mask
+from tests.helpers import ReferenceMask
+
+
+def random_rects(count: int, width: float, height: float, rng: random.Random) -> list[pymupdf.Rect]:
+    rects = []
+    for _ in range(count):
+        x0, y0 = rng.uniform(0, width - 200), rng.uniform(0, height - 40)
+        rects.append(pymupdf.Rect(x0, y0, x0 + rng.uniform(20, 200), y0 + rng.uniform(8, 40)))
+    return rects
+
+
+def run(mask_class, page: pymupdf.Page, text_rects: list[pymupdf.Rect], line_rects: list[pymupdf.Rect]):
+    start = time.perf_counter()
+    mask = mask_class(page)
+    results = []
+    for rect in text_rects:
+        if mask.intersects(rect):
+            results.append(mask.coverage_ratio(rect))
+        mask.add_rect(rect)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results.extend(mask.intersects(rect) for rect in line_rects)
+    query_seconds = time.perf_counter() - start
+    return mask, [float(result) for result in results], build_seconds, query_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=float, default=8000)
+    parser.add_argument("--height", type=float, default=6000)
+    parser.add_argument("--rects", type=int, default=20000, help="number of text rects that are added to the mask")
+    parser.add_argument("--lines", type=int, default=20000, help="number of text lines checked against the mask")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    page = pymupdf.Document().new_page(width=args.width, height=args.height)
+    text_rects = random_rects(args.rects, args.width, args.height, rng)
+    line_rects = random_rects(args.lines, args.width, args.height, rng)
+
+    outputs = {}
+    for name, mask_class in [("compact", Mask), ("original", ReferenceMask)]:
+        mask, results, build_seconds, query_seconds = run(mask_class, page, text_rects, line_rects)
+        memory_mb = (mask.mask.nbytes + getattr(getattr(mask, "_summed_area_table", None), "nbytes", 0)) / 1024 ** 2
+        print(
+            f"{name:>8}: {memory_mb:8.1f} MB, cleaning {build_seconds:6.2f} s, "
+            f"{args.lines} line queries {query_seconds:6.2f} s"
+        )
+        outputs[name] = results
+    print(f"identical results: {outputs['compact'] == outputs['original']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Benchmark for sorting the text lines of a page in reading order.
+
+Creates synthetic pages that resemble map legends and tables: several columns of rows with short text lines, some
+multi-line cells, and a few wide lines (headers) that span all columns. The lines are sorted with sort_lines(), and, up
+to a given number of lines, with the original implementation that scans all lines for every step. Both must return
+exactly the same blocks. The time for the XY-cut fallback engine (see ocr.xycut) is reported for comparison.
+
+All coordinates get a small random jitter, as with real OCR results. Otherwise, many lines would have exactly the same
+coordinates, and the original implementation breaks such ties depending on the iteration order of a set.
+
+Usage (from the root directory of the repository):
+  python -m benchmarks.bench_reading_order --lines 250 500 1000 2000 4000 --reference-max-lines 1000
+"""
+import argparse
+import random
+import time
+
+import pymupdf
+
+from ocr.readingorder import (
+    ReadingOrderBlock, ReadingOrderColumn, TextLineReadingOrder, sort_lines
+)
+from ocr.textline import TextLine
+from ocr.xycut import xy_cut
+
+
+def reference_current_column(
+        current_line: TextLineReadingOrder,
+        preceding_lines: list[TextLineReadingOrder],
+        all_lines: set[TextLineReadingOrder]
+) -> ReadingOrderColumn:
+    """The original implementation of ReadingOrderColumn.current_column()."""
+    other_lines = all_lines.copy()
+    other_lines.remove(current_line)
+    column = ReadingOrderColumn(
+        rect=current_line.geometry.rect,
+        bottom_of_first_line=current_line.geometry.rect.y1,
+        top_of_last_line=current_line.geometry.rect.y0
+    )
+    accurate_extension_count = sum(
+        1 for line in other_lines if column.is_accurately_extended_by(line.geometry)
+    )
+    for line in reversed(preceding_lines):
+        new_column = column.add_line_before(line.line)
+        other_lines.remove(line)
+
+        if any(new_column.is_interrupted_by(other_line.geometry.rect) for other_line in other_lines):
+            break
+
+        new_accurate_extension_count = sum(
+            1 for line in other_lines if new_column.is_accurately_extended_by(line.geometry)
+        )
+        if new_accurate_extension_count < accurate_extension_count:
+            break
+        accurate_extension_count = new_accurate_extension_count
+
+        column = new_column
+
+    return column
+
+
+def reference_starting_line(remaining_lines: set[TextLineReadingOrder]) -> None | TextLineReadingOrder:
+    """The original implementation of starting_line_for_next_block()."""
+    candidate_lines = remaining_lines.copy()
+    selected_line = None
+    while candidate_lines:
+        selected_line = min(candidate_lines, key=lambda line: line.geometry.sort_key)
+        candidate_lines.remove(selected_line)
+        candidate_lines = {
+            line for line in candidate_lines if line.geometry.needs_to_come_before(selected_line.geometry)
+        }
+    return selected_line
+
+
+def reference_sort_lines(text_lines: list[TextLine]) -> list[ReadingOrderBlock]:
+    """The original implementation of sort_lines()."""
+    all_lines = {TextLineReadingOrder(line) for line in text_lines}
+    remaining_lines = all_lines.copy()
+    blocks = []
+
+    while remaining_lines:
+        current_line = reference_starting_line(remaining_lines)
+        remaining_lines.remove(current_line)
+        current_block = [current_line]
+
+        while remaining_lines:
+            next_line = None
+
+            column = reference_current_column(current_line, current_block[:-1], all_lines)
+            in_column_lines = {line for line in remaining_lines if column.can_be_extended_by(line.geometry)}
+            if len(in_column_lines):
+                highest_following = min(in_column_lines, key=lambda line: line.geometry.rect.y0)
+                candidates = {
+                    line for line in in_column_lines
+                    if line.geometry.needs_to_come_before(highest_following.geometry)
+                }
+                candidates.add(highest_following)
+                next_line = min(candidates, key=lambda line: line.geometry.rect.x0)
+
+            if not next_line:
+                following = {line for line in remaining_lines if line.geometry.distance_after(current_line.geometry) < 20}
+                if len(following):
+                    next_line = min(following, key=lambda line: line.geometry.rect.y0)
+
+            if not next_line:
+                break
+
+            current_line = next_line
+            remaining_lines.remove(current_line)
+
+            if any(line.geometry.needs_to_come_before(current_line.geometry) for line in remaining_lines):
+                remaining_lines.add(current_line)
+                break
+
+            current_block.append(current_line)
+
+        blocks.append(ReadingOrderBlock([line.line for line in current_block]))
+    return blocks
+
+
+def create_lines(line_count: int, seed: int) -> list[TextLine]:
+    """Text lines of a legend or table with several columns, until the given number of lines is reached."""
+    rng = random.Random(seed)
+    lines = []
+
+    def add_line(x0: float, y0: float, width: float, height: float):
+        jitter = [rng.uniform(-0.3, 0.3) for _ in range(4)]
+        rect = pymupdf.Rect(x0 + jitter[0], y0 + jitter[1], x0 + width + jitter[2], y0 + height + jitter[3])
+        lines.append(TextLine(f"line {len(lines)}", 0, rect, rect, 1, []))
+
+    columns = 6
+    column_width = 150
+    y = 0
+    while len(lines) < line_count:
+        if rng.random() < 0.05:
+            # header across all columns
+            add_line(0, y, columns * column_width - 10, 14)
+            y += 20
+            continue
+        row_height = 0
+        for column in range(columns):
+            cell_lines = rng.choice([1, 1, 1, 2, 3])
+            for cell_line in range(cell_lines):
+                add_line(column * column_width + rng.choice([0, 5]), y + cell_line * 12, rng.uniform(30, 130), 10)
+            row_height = max(row_height, cell_lines * 12)
+        y += row_height + rng.choice([4, 8, 16])
+    return lines[:line_count]
+
+
+def block_texts(blocks: list[ReadingOrderBlock]) -> list[list[str]]:
+    return [[line.text for line in block.lines] for block in blocks]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000])
+    parser.add_argument("--reference-max-lines", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'lines':>7} {'blocks':>7} {'indexed [s]':>12} {'original [s]':>13} {'speedup':>8} {'identical':>10} "
+        f"{'xy-cut [s]':>11}"
+    )
+    for line_count in args.lines:
+        lines = create_lines(line_count, args.seed)
+        start = time.perf_counter()
+        blocks = sort_lines(lines)
+        indexed_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        xy_cut(lines)
+        xy_cut_seconds = time.perf_counter() - start
+
+        if line_count <= args.reference_max_lines:
+            start = time.perf_counter()
+            reference_blocks = reference_sort_lines(lines)
+            reference_seconds = time.perf_counter() - start
+            identical = block_texts(blocks) == block_texts(reference_blocks)
+            print(
+                f"{line_count:>7} {len(blocks):>7} {indexed_seconds:>12.2f} {reference_seconds:>13.2f} "
+                f"{reference_seconds / indexed_seconds:>7.1f}x {str(identical):>10} {xy_cut_seconds:>11.3f}"
+            )
+        else:
+            print(
+                f"{line_count:>7} {len(blocks):>7} {indexed_seconds:>12.2f} {'-':>13} {'-':>8} {'-':>10} "
+                f"{xy_cut_seconds:>11.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
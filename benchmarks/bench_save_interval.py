@@ -0,0 +1,85 @@
+"""Benchmark for the interval of the incremental saves while processing a document.
+
+Processes a synthetic scanned document with many pages using different values for SAVE_INTERVAL_PAGES, and reports
+the total processing time, the number of incremental saves, the data written by these saves and the size of the output
+file. AWS Textract is replaced by tests.helpers.FakeTextract, which detects 40 lines on every page, so that only the
+local processing is measured.
+
+Usage (from the root directory of the repository):
+  python -m benchmarks.bench_save_interval --pages 400
+"""
+import argparse
+import io
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pymupdf
+from PIL import Image
+
+import ocr
+from tests.helpers import FakeTextract
+
+
+def create_scanned_document(path: Path, pages: int):
+    rng = np.random.default_rng(0)
+    doc = pymupdf.Document()
+    for _ in range(pages):
+        page = doc.new_page(width=595, height=842)
+        pixels = rng.integers(200, 256, (1169, 827), dtype=np.uint8)
+        bytes_io = io.BytesIO()
+        Image.fromarray(pixels).save(bytes_io, "jpeg", quality=50)
+        page.insert_image(page.rect, stream=bytes_io.getvalue())
+    doc.save(path)
+
+
+def run(input_path: Path, tmp_dir: Path, interval_pages: int, interval_seconds: float | None):
+    work_path = tmp_dir / f"input_{interval_pages}.pdf"
+    work_path.write_bytes(input_path.read_bytes())
+    output_path = tmp_dir / f"output_{interval_pages}.pdf"
+
+    processor = ocr.Processor(
+        input_path=work_path,
+        output_path=output_path,
+        debug_page=None,
+        tmp_dir=tmp_dir,
+        textract_client=FakeTextract(lines_per_request=40),
+        confidence_threshold=0.5,
+        use_aggressive_strategy=False,
+        save_interval_pages=interval_pages,
+        save_interval_seconds=interval_seconds,
+    )
+    start = time.perf_counter()
+    processor.process()
+    elapsed = time.perf_counter() - start
+
+    statistics = processor.saver.statistics
+    print(
+        f"{interval_pages:>14} {elapsed:>10.2f} {statistics.saves:>7} {statistics.bytes_written / 1024 / 1024:>14.1f} "
+        f"{statistics.seconds:>11.2f} {output_path.stat().st_size / 1024 / 1024:>15.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--intervals", type=int, nargs="+", default=[1, 20, 0])
+    parser.add_argument("--interval-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        input_path = tmp_dir / "scan.pdf"
+        create_scanned_document(input_path, args.pages)
+        print(f"{args.pages} pages, input {input_path.stat().st_size / 1024 / 1024:.1f} MB")
+        print(f"{'interval_pages':>14} {'total [s]':>10} {'saves':>7} {'written [MB]':>14} {'saving [s]':>11} "
+              f"{'output [MB]':>15}")
+        for interval_pages in args.intervals:
+            run(input_path, tmp_dir, interval_pages, args.interval_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark for parsing the responses from AWS Textract.
+
+Creates a synthetic response for a dense page with the given number of WORD blocks (grouped into LINE blocks of one to
+six words), and parses it with the pydantic models (textract.pydantic_page_lines()) and with the fast parser
+(fastparse.page_lines()). Both must return exactly the same lines. The lines are then converted into TextLine objects,
+one line after the other (TextLine.from_textract()) and with all polygons derotated at once
+(text_lines_from_textract()), which must also return exactly the same result.
+
+Usage (from the root directory of the repository):
+  python -m benchmarks.bench_textract_parse --words 20000
+"""
+import argparse
+import random
+import time
+
+import pymupdf
+
+from ocr.textline import TextLine, text_lines_from_textract
+from ocr.textract.fastparse import page_lines
+from ocr.textract.textract import pydantic_page_lines
+
+
+def geometry(left: float, top: float, width: float, height: float) -> dict:
+    return {
+        "BoundingBox": {"Width": width, "Height": height, "Left": left, "Top": top},
+        "Polygon": [
+            {"X": left, "Y": top}, {"X": left + width, "Y": top},
+            {"X": left + width, "Y": top + height}, {"X": left, "Y": top + height}
+        ]
+    }
+
+
+def create_response(word_count: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    line_blocks = []
+    word_blocks = []
+    while len(word_blocks) < word_count:
+        left, top = rng.uniform(0, 0.7), rng.uniform(0, 0.99)
+        word_ids = []
+        for word_index in range(rng.randint(1, 6)):
+            word_id = f"{len(word_blocks):08x}-0000-4000-8000-000000000000"
+            word_ids.append(word_id)
+            word_geometry = geometry(left + word_index * 0.05, top, 0.045, 0.008)
+            word_geometry["RotationAngle"] = 0.0
+            word_blocks.append({
+                "BlockType": "WORD", "Id": word_id, "Text": "word", "TextType": "PRINTED",
+                "Confidence": rng.uniform(50, 100), "Geometry": word_geometry
+            })
+        line_blocks.append({
+            "BlockType": "LINE", "Id": f"{len(line_blocks):08x}-1111-4000-8000-000000000000",
+            "Text": " ".join("word" for _ in word_ids), "Confidence": rng.uniform(50, 100),
+            "Geometry": geometry(left, top, 0.05 * len(word_ids), 0.008),
+            "Relationships": [{"Type": "CHILD", "Ids": word_ids}]
+        })
+    page_block = {
+        "BlockType": "PAGE", "Id": "ffffffff-2222-4000-8000-000000000000", "Geometry": geometry(0, 0, 1, 1),
+        "Relationships": [{"Type": "CHILD", "Ids": [block["Id"] for block in line_blocks]}]
+    }
+    return {"DocumentMetadata": {"Pages": 1}, "Blocks": [page_block] + line_blocks + word_blocks}
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    response = create_response(args.words, args.seed)
+    print(f"{len(response['Blocks'])} blocks, {args.words} words")
+
+    pydantic_lines, pydantic_seconds = timed(pydantic_page_lines, response)
+    fast_lines, fast_seconds = timed(page_lines, response)
+    transform = pymupdf.Matrix(1000, 0, 0, 1400, 0, 0)
+    text_lines, conversion_seconds = timed(
+        lambda: [TextLine.from_textract(line, 1400, transform) for line in fast_lines]
+    )
+    batch_text_lines, batch_conversion_seconds = timed(text_lines_from_textract, fast_lines, 1400, transform)
+
+    print(f"pydantic parser:           {pydantic_seconds:6.3f} s")
+    print(f"fast parser:               {fast_seconds:6.3f} s ({pydantic_seconds / fast_seconds:.1f}x faster)")
+    print(f"identical result: {fast_lines == pydantic_lines}")
+    print(f"TextLines, line by line:   {conversion_seconds:6.3f} s")
+    print(
+        f"TextLines, vectorized:     {batch_conversion_seconds:6.3f} s "
+        f"({conversion_seconds / batch_conversion_seconds:.1f}x faster)"
+    )
+    print(f"identical result: {batch_text_lines == text_lines}")
+
+
+if __name__ == "__main__":
+    main()
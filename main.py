@@ -1,17 +1,26 @@
+import argparse
 import logging
+import multiprocessing
 import os
 import shutil
 import sys
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, Executor, Future, wait, FIRST_COMPLETED, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
 import boto3
+from aws import aws
 from utils.logging import configure_logging
 
 configure_logging()
 
 import ocr
-from ocr.source import S3AssetSource, FileAssetSource
-from ocr.target import S3AssetTarget, FileAssetTarget, AssetTarget
+from ocr import readingorder
+from ocr.checkpoint import document_checkpoint_dir
+from ocr.textract import ratelimit, cache
+from ocr.source import S3AssetSource, FileAssetSource, AssetSource, AssetItem, PrefetchingAssetSource
+from ocr.target import S3AssetTarget, FileAssetTarget, AssetTarget, BackgroundAssetTarget, IndexedAssetTarget
 from utils.settings import script_settings, ScriptSettings
 
 def load_target(settings: ScriptSettings):
@@ -21,7 +30,8 @@ def load_target(settings: ScriptSettings):
         return S3AssetTarget(
             s3_bucket=s3.Bucket(settings.output_s3_bucket),
             s3_prefix=settings.output_s3_prefix,
-            tmp_dir=Path(settings.tmp_path)
+            tmp_dir=Path(settings.tmp_path),
+            transfer_config=aws.transfer_config(settings.upload_part_mb, settings.upload_concurrency)
         )
     elif settings.output_type == 'path':
         return FileAssetTarget(
@@ -47,7 +57,12 @@ def load_source(settings: ScriptSettings, target: AssetTarget):
             s3_bucket=s3.Bucket(settings.input_s3_bucket),
             s3_prefix=settings.input_s3_prefix,
             skip_filenames=skip_filenames,
-            tmp_dir=Path(settings.tmp_path)
+            tmp_dir=Path(settings.tmp_path),
+            in_memory_max_bytes=settings.input_in_memory_max_mb * aws.MB,
+            transfer_config=aws.transfer_config(settings.download_part_mb, settings.download_concurrency),
+            list_concurrency=settings.input_s3_list_concurrency,
+            manifest_path=Path(settings.input_manifest_path) if settings.input_manifest_path else None,
+            manifest_schema=settings.input_manifest_schema
         )
     elif settings.input_type == "path":
         return FileAssetSource(
@@ -60,34 +75,262 @@ def load_source(settings: ScriptSettings, target: AssetTarget):
         sys.exit(1)
 
 
-def main():
-    settings = script_settings()
+def parse_args(settings: ScriptSettings) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Apply OCR to all PDF files from the configured input source.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.workers,
+        help="number of documents that are processed in parallel worker processes (default: WORKERS or 1)"
+    )
+    return parser.parse_args()
+
+
+def create_processor(
+        settings: ScriptSettings,
+        filename: str,
+        input_path: Path,
+        output_path: Path,
+        tmp_dir: Path,
+        textract_client,
+        input_bytes: bytes | None = None,
+        input_read_only: bool = False
+) -> ocr.Processor:
+    checkpoint_dir = document_checkpoint_dir(settings.checkpoint_path, filename) if settings.checkpoint_path else None
+    return ocr.Processor(
+        input_path,
+        output_path,
+        settings.input_debug_page,
+        tmp_dir,
+        textract_client,
+        settings.confidence_threshold,
+        settings.use_aggressive_strategy,
+        settings.textract_max_concurrency,
+        settings.page_pipeline_depth,
+        checkpoint_dir,
+        settings.save_interval_pages,
+        settings.save_interval_seconds,
+        input_bytes=input_bytes,
+        input_read_only=input_read_only,
+        output_in_memory_max_bytes=settings.output_in_memory_max_mb * aws.MB,
+        output_verification=settings.output_verification
+    )
+
+
+def configure_processing(settings: ScriptSettings):
+    ratelimit.configure(
+        max_rate=settings.textract_max_tps,
+        min_rate=settings.textract_min_tps,
+        state_path=settings.textract_rate_limit_file
+    )
+    cache.configure(path=settings.textract_cache_path, max_mb=settings.textract_cache_max_mb)
+    readingorder.configure(
+        max_lines=settings.reading_order_max_lines or None,
+        time_budget_seconds=settings.reading_order_time_budget_seconds or None
+    )
+
+
+def cleanup(settings: ScriptSettings, asset_item: AssetItem):
+    try:
+        if settings.cleanup_tmp_files:
+            shutil.rmtree(asset_item.tmp_dir)
+    finally:
+        # no longer counts towards INPUT_PREFETCH_MAX_MB
+        asset_item.release()
+
+
+def load_asset(asset_item: AssetItem):
+    os.makedirs(asset_item.tmp_dir, exist_ok=True)
+    asset_item.load()
+
+
+def process_sequentially(settings: ScriptSettings, source: AssetSource, target: AssetTarget) -> list[str]:
+    """Processes the documents one after another, and returns the filenames of the documents that failed."""
     session = boto3.session.Session(profile_name=settings.textract_aws_profile)
     textract_client = session.client("textract")
-
-    target = load_target(settings)
-    source = load_source(settings, target)
+    failed_filenames = []
 
     for asset_item in source.iterator():
-        os.makedirs(asset_item.tmp_dir, exist_ok=True)
-        asset_item.load()
-
         logging.info("")
         logging.info(asset_item.filename)
-        process_result = ocr.Processor(
-            asset_item.tmp_path,
-            asset_item.result_tmp_path,
-            settings.input_debug_page,
-            asset_item.tmp_dir,
-            textract_client,
-            settings.confidence_threshold,
-            settings.use_aggressive_strategy,
+        try:
+            load_asset(asset_item)
+            process_result = create_processor(
+                settings,
+                asset_item.filename,
+                asset_item.input_path,
+                asset_item.result_tmp_path,
+                asset_item.tmp_dir,
+                textract_client,
+                asset_item.data,
+                asset_item.read_only
+            ).process()
+        except Exception:
+            logging.exception(f"Processing of {asset_item.filename} failed")
+            failed_filenames.append(asset_item.filename)
+            cleanup(settings, asset_item)
+            continue
+
+        target.save(asset_item, process_result)
+
+    return failed_filenames
+
+
+# Textract client of the current worker process, see init_worker()
+worker_textract_client = None
+
+
+def init_worker(settings: ScriptSettings):
+    global worker_textract_client
+    configure_logging()
+    configure_processing(settings)
+    session = boto3.session.Session(profile_name=settings.textract_aws_profile)
+    worker_textract_client = session.client("textract")
+
+
+def process_in_worker(
+        settings: ScriptSettings,
+        filename: str,
+        input_path: Path,
+        output_path: Path,
+        tmp_dir: Path,
+        input_bytes: bytes | None,
+        input_read_only: bool
+):
+    logging.info(f"Processing {filename} in worker process {os.getpid()}.")
+    try:
+        return create_processor(
+            settings, filename, input_path, output_path, tmp_dir, worker_textract_client, input_bytes, input_read_only
         ).process()
+    except Exception as e:
+        # Not every exception (e.g. from PyMuPDF) can be pickled, so we only send a description back to the parent.
+        logging.exception(f"Processing of {filename} failed")
+        raise RuntimeError(f"{e.__class__.__name__}: {e}") from None
+
+
+def create_worker_pool(settings: ScriptSettings, workers: int) -> Executor:
+    # Use "spawn" instead of "fork", as the parent process might already be running threads (e.g. from boto3).
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(settings,)
+    )
+
+
+def process_in_parallel(
+        settings: ScriptSettings,
+        source: AssetSource,
+        target: AssetTarget,
+        workers: int,
+        create_executor: Callable[[ScriptSettings, int], Executor] = create_worker_pool,
+        process: Callable[..., ocr.ProcessResult] = process_in_worker
+) -> list[str]:
+    """Processes the documents in worker processes, and returns the filenames of the documents that failed.
+
+    If a worker process dies (e.g. when it runs out of memory), all documents that were being processed at that time
+    fail, and new worker processes are started for the remaining documents.
+    """
+    logging.info(f"Processing documents in {workers} worker processes.")
+    failed_filenames = []
+
+    def handle_failure(asset_item: AssetItem, error: Exception):
+        logging.error(f"Processing of {asset_item.filename} failed: {error}")
+        failed_filenames.append(asset_item.filename)
+        cleanup(settings, asset_item)
 
+    def handle_done(future: Future, asset_item: AssetItem):
+        try:
+            process_result = future.result()
+        except Exception as e:
+            handle_failure(asset_item, e)
+            return
+        logging.info(f"Processing of {asset_item.filename} finished.")
         target.save(asset_item, process_result)
 
-        if settings.cleanup_tmp_files:
-            shutil.rmtree(asset_item.tmp_dir)
+    def submit(asset_item: AssetItem) -> Future:
+        return executor.submit(
+            process,
+            settings,
+            asset_item.filename,
+            asset_item.input_path,
+            asset_item.result_tmp_path,
+            asset_item.tmp_dir,
+            asset_item.data,
+            asset_item.read_only
+        )
+
+    executor = create_executor(settings, workers)
+    in_flight: dict[Future, AssetItem] = {}
+    try:
+        for asset_item in source.iterator():
+            # Only load the next asset once a worker is available, to avoid filling the tmp directory.
+            while len(in_flight) >= workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle_done(future, in_flight.pop(future))
+
+            try:
+                load_asset(asset_item)
+                try:
+                    future = submit(asset_item)
+                except BrokenProcessPool:
+                    # The documents that were in flight when the worker died fail with the same error in handle_done().
+                    logging.error("A worker process has died, starting new worker processes.")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = create_executor(settings, workers)
+                    future = submit(asset_item)
+            except Exception as e:
+                handle_failure(asset_item, e)
+                continue
+            in_flight[future] = asset_item
+
+        for future in as_completed(list(in_flight)):
+            handle_done(future, in_flight.pop(future))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return failed_filenames
+
+
+def main():
+    settings = script_settings()
+    args = parse_args(settings)
+    configure_processing(settings)
+
+    target = load_target(settings)
+    if settings.output_index_path:
+        target = IndexedAssetTarget(
+            target,
+            Path(settings.output_index_path),
+            full_refresh_seconds=settings.output_index_full_refresh_hours * 3600
+        )
+    # The tmp files of an asset are only cleaned up after its result has been saved, which might happen in the
+    # background while the next asset is already being processed.
+    target = BackgroundAssetTarget(
+        target,
+        max_pending=settings.output_upload_queue,
+        after_save=lambda asset_item: cleanup(settings, asset_item)
+    )
+    source = load_source(settings, target)
+    if settings.input_prefetch_count > 0:
+        source = PrefetchingAssetSource(
+            source=source,
+            prefetch_count=settings.input_prefetch_count,
+            max_bytes=settings.input_prefetch_max_mb * 1024 * 1024 if settings.input_prefetch_max_mb else None
+        )
+
+    # Leaving the context waits for all pending results to be saved, also when an error occurred.
+    with target:
+        if args.workers > 1:
+            failed_filenames = process_in_parallel(settings, source, target, args.workers)
+        else:
+            failed_filenames = process_sequentially(settings, source, target)
+
+    # A failed document does not stop the processing of the remaining documents, but the exit code signals it.
+    if failed_filenames:
+        logging.error("Processing failed for {} files: {}".format(len(failed_filenames), ", ".join(failed_filenames)))
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -1,21 +1,31 @@
 import dataclasses
+import io
 import logging
 import os
+import shutil
 import subprocess
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, Executor
 from pathlib import Path
 
 import pymupdf
 from mypy_boto3_textract import TextractClient
 from pymupdf import mupdf
 
+from ocr import readingorder
 from ocr.mask import Mask
-from ocr.applyocr import process_page
+from ocr.pageanalysis import PageAnalysis
+from ocr.applyocr import OCR, start_page_ocr, finish_page_ocr
+from ocr.checkpoint import CheckpointStore, PageCheckpoint, STATUS_DONE, STATUS_SKIPPED
 from ocr.preprocess.clean import clean_old_ocr, clean_old_ocr_aggressive
 from ocr.preprocess.crop import crop_images, replace_jpx_images
-from ocr.draw import draw_ocr_text_page
+from ocr.draw import draw_ocr_text_page, TextLayerResources
+from ocr.incrementalsave import IncrementalSaver
 from ocr.preprocess.preprocess_doc import preprocess
 from ocr.preprocess.resize import resize_page
+from ocr.textline import TextLine
 from ocr.util import is_digitally_born
+from ocr.verification import verify_pdf_structure, verify_page_tree_count, VERIFICATION_FULL, VERIFICATION_LIGHT
 from PIL import Image
 
 
@@ -25,6 +35,19 @@ Image.MAX_IMAGE_PIXELS = None
 @dataclasses.dataclass
 class ProcessResult:
     number_of_pages: int | None
+    # content of the output file, if it has been written to memory instead of to the output path
+    output_bytes: bytes | None = dataclasses.field(default=None, repr=False)
+    # number of pages for which each reading order engine was used, see ocr.readingorder.sort_lines_with_fallback()
+    reading_order_engines: dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass
+class PendingPage:
+    """A page that has been preprocessed, and for which the requests to AWS Textract might still be in flight."""
+    page_index: int
+    page_ocr: OCR | None
+    # final lines from a checkpoint, if the OCR for this page has already been done in a previous run
+    lines: list[TextLine] | None = None
 
 
 @dataclasses.dataclass
@@ -36,13 +59,43 @@ class Processor:
     textract_client: TextractClient
     confidence_threshold: float
     use_aggressive_strategy: bool
+    # maximal number of concurrent requests to AWS Textract (for the different excerpts of a large page)
+    textract_max_concurrency: int = 1
+    # number of subsequent pages that are already preprocessed and sent to AWS Textract, while the current page is
+    # finished; 0 processes the pages strictly one after another
+    page_pipeline_depth: int = 0
+    # directory for per-page checkpoints; when set, pages that were completed in a previous run are not sent to AWS
+    # Textract again
+    checkpoint_dir: Path | None = None
+    # the modified document is saved incrementally after this number of pages (never based on the number of pages if 0)
+    save_interval_pages: int = 1
+    # the modified document is saved incrementally when the last save is at least this many seconds ago
+    save_interval_seconds: float | None = None
+    # content of the input file, if it has already been loaded into memory; input_path does not need to exist then
+    input_bytes: bytes | None = dataclasses.field(default=None, repr=False)
+    # if True, the file at input_path is never modified (e.g. when it is the original input file and not a copy)
+    input_read_only: bool = False
+    # the output is written to memory instead of to output_path, if the input file is not larger than this
+    output_in_memory_max_bytes: int = 0
+    # how the written output is verified, see ocr.verification
+    output_verification: str = VERIFICATION_FULL
+    output_bytes: bytes | None = dataclasses.field(default=None, init=False, repr=False)
+    checkpoints: CheckpointStore | None = dataclasses.field(default=None, init=False)
+    text_layer_resources: TextLayerResources | None = dataclasses.field(default=None, init=False)
+    saver: IncrementalSaver | None = dataclasses.field(default=None, init=False)
+    reading_order_engines: Counter = dataclasses.field(default_factory=Counter, init=False)
 
     def process(self):
         try:
-            number_of_pages = self.process_pdf(self.input_path)
+            number_of_pages = self.process_pdf(self.input_path, self.input_bytes)
         except (ValueError, mupdf.FzErrorArgument, mupdf.FzErrorFormat) as e:
             gs_preprocess_path = self.tmp_dir / "gs.pdf"
             logging.info(f"Encountered {e.__class__.__name__}: {e}. Trying Ghostscript preprocessing.")
+            if self.input_bytes is not None and not os.path.exists(self.input_path):
+                # Ghostscript can only read the input from a file.
+                os.makedirs(os.path.dirname(self.input_path), exist_ok=True)
+                with open(self.input_path, "wb") as file:
+                    file.write(self.input_bytes)
             subprocess.call([
                 "gs",
                 "-sDEVICE=pdfwrite",
@@ -56,90 +109,224 @@ class Processor:
             ])
             number_of_pages = self.process_pdf(gs_preprocess_path)
 
-        return ProcessResult(number_of_pages)
+        if self.checkpoints:
+            self.checkpoints.clear()
+        if self.reading_order_engines:
+            logging.info("Reading order engines: {}".format(", ".join(
+                f"{engine} ({count} pages)" for engine, count in sorted(self.reading_order_engines.items())
+            )))
+        return ProcessResult(number_of_pages, self.output_bytes, dict(self.reading_order_engines))
 
-    def process_pdf(self, in_path: Path) -> int | None:
+    def process_pdf(self, in_path: Path, in_bytes: bytes | None = None) -> int | None:
         """
-        Processes a given PDF
+        Processes a given PDF, which is read from in_bytes if available, and from in_path otherwise.
 
         Returns:
             int|None: number of pages in the output document if possible
         """
-        doc = pymupdf.open(in_path)
+        self.reading_order_engines = Counter()
+        if self.checkpoint_dir:
+            self.checkpoints = CheckpointStore(self.checkpoint_dir, in_bytes or in_path, settings={
+                "confidence_threshold": self.confidence_threshold,
+                "use_aggressive_strategy": self.use_aggressive_strategy,
+                "debug_page": self.debug_page,
+                # the reading order of completed pages must not differ from the reading order of the remaining pages
+                "reading_order": readingorder.configuration(),
+            })
+
+        # Incremental saves are only possible for a document that was opened from a file that we are allowed to modify.
+        save_path = self.incremental_save_path(in_path, in_bytes)
+        if in_bytes is not None:
+            doc = pymupdf.open(stream=in_bytes)
+        else:
+            doc = pymupdf.open(save_path or in_path)
         in_page_count = doc.page_count
+        self.text_layer_resources = TextLayerResources(doc)
+        self.saver = IncrementalSaver(doc, save_path, self.save_interval_pages, self.save_interval_seconds)
 
         preprocess(doc)
 
-        for page_index, _ in enumerate(iter(doc)):
-            page_number = page_index + 1
-            if not self.debug_page or page_number == self.debug_page:
-                logging.info(f"{os.path.basename(in_path)}, page {page_number}/{in_page_count}")
-                self.process_page(page_index, doc, add_debug_page=bool(self.debug_page))
-                pymupdf.TOOLS.store_shrink(100)
+        # The debug page is inserted right after the processed page, which would shift the indices of pages that are
+        # still in the pipeline.
+        pipeline_depth = 0 if self.debug_page else max(self.page_pipeline_depth, 0)
+        pending_pages: deque[PendingPage] = deque()
+
+        with ThreadPoolExecutor(max_workers=max(self.textract_max_concurrency, 1)) as executor:
+            try:
+                for page_index, _ in enumerate(iter(doc)):
+                    page_number = page_index + 1
+                    if not self.debug_page or page_number == self.debug_page:
+                        logging.info(f"{os.path.basename(in_path)}, page {page_number}/{in_page_count}")
+                        pending_page = self.start_page(page_index, doc, executor)
+                        if pending_page is not None:
+                            pending_pages.append(pending_page)
+                        while len(pending_pages) > pipeline_depth:
+                            self.finish_page(pending_pages.popleft(), doc, add_debug_page=bool(self.debug_page))
+                        pymupdf.TOOLS.store_shrink(100)
+
+                while pending_pages:
+                    self.finish_page(pending_pages.popleft(), doc)
+            except Exception:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+        self.saver.log_statistics()
 
         if self.debug_page:
             # only keep the debug page in its two versions (original + text-only)
             doc.delete_pages(range(0, self.debug_page - 1))
             doc.delete_pages(range(2, doc.page_count))
 
-        doc.ez_save(self.output_path)
+        light_verification = self.output_verification == VERIFICATION_LIGHT
+        if light_verification and not self.debug_page:
+            self.verify_page_count(in_page_count, doc.page_count)
+
+        input_size = len(in_bytes) if in_bytes is not None else os.path.getsize(in_path)
+        if input_size <= self.output_in_memory_max_bytes:
+            # Serialize into memory, so that the output can be uploaded directly without a tmp file.
+            buffer = io.BytesIO()
+            doc.ez_save(buffer)
+            self.output_bytes = buffer.getvalue()
+        else:
+            doc.ez_save(self.output_path)
+            self.output_bytes = None
         doc.close()
 
         # Verify that we can read the written document, and that it still has the same number of pages. Some corrupt input
         # documents might lead to an empty or to a corrupt output document, sometimes even without throwing an error. (See
         # LGD-283.) This check should detect such cases.
-        doc = pymupdf.open(self.output_path)
-        if not self.debug_page:
-            out_page_count = doc.page_count
-            if in_page_count != out_page_count:
-                raise ValueError(
-                    "Output document contains {} pages instead of {}".format(out_page_count, in_page_count)
-                )
-        doc.close()
+        if light_verification:
+            # The number of pages has already been checked on the document in memory. Of the written document, only the
+            # structure and the root of the page tree are checked, without loading the pages.
+            with io.BytesIO(self.output_bytes) if self.output_bytes is not None else open(self.output_path, "rb") as file:
+                verify_pdf_structure(file)
+            if not self.debug_page:
+                if self.output_bytes is not None:
+                    doc = pymupdf.open(stream=self.output_bytes)
+                else:
+                    doc = pymupdf.open(self.output_path)
+                with doc:
+                    verify_page_tree_count(doc, in_page_count)
+        else:
+            if self.output_bytes is not None:
+                doc = pymupdf.open(stream=self.output_bytes)
+            else:
+                doc = pymupdf.open(self.output_path)
+            if not self.debug_page:
+                self.verify_page_count(in_page_count, doc.page_count)
+            doc.close()
 
         return in_page_count if in_page_count > 0 else None
 
+    def incremental_save_path(self, in_path: Path, in_bytes: bytes | None) -> Path | None:
+        """File to which the modifications are saved incrementally, or None if the document is not saved incrementally.
+
+        A read-only input file is copied to tmp_dir when incremental saves are configured, as otherwise all
+        modifications of a possibly large document would be kept in memory until the output is written. Inputs that are
+        processed in memory are small enough to keep their modifications in memory as well.
+        """
+        saves_configured = self.save_interval_pages > 0 or self.save_interval_seconds is not None
+        if not saves_configured:
+            return None
+        if in_bytes is not None:
+            logging.info("  Input is processed in memory, so no incremental saves are made.")
+            return None
+        if self.input_read_only and in_path == self.input_path:
+            copy_path = self.tmp_dir / os.path.basename(in_path)
+            logging.info(f"  Input file is read-only, copying it to {copy_path} for incremental saves.")
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            shutil.copyfile(in_path, copy_path)
+            return copy_path
+        return in_path
+
+    @staticmethod
+    def verify_page_count(in_page_count: int, out_page_count: int):
+        if in_page_count != out_page_count:
+            raise ValueError(
+                "Output document contains {} pages instead of {}".format(out_page_count, in_page_count)
+            )
+
     def process_page(
         self,
         page_index: int,
         doc: pymupdf.Document,
+        executor: Executor | None = None,
         add_debug_page: bool = False
     ):
-        page_number = page_index + 1
-        digitally_born = is_digitally_born(doc[page_index])
+        pending_page = self.start_page(page_index, doc, executor)
+        if pending_page is not None:
+            self.finish_page(pending_page, doc, add_debug_page)
+
+    def start_page(
+        self,
+        page_index: int,
+        doc: pymupdf.Document,
+        executor: Executor | None = None
+    ) -> PendingPage | None:
+        """Preprocesses the page and starts the OCR. Returns None if the page is skipped."""
+        checkpoint = self.checkpoints.load(page_index) if self.checkpoints else None
+        if checkpoint and checkpoint.status == STATUS_SKIPPED:
+            logging.info(" Skipping digitally-born page (from checkpoint).")
+            return None
+
+        # The bbox log and the image info of the page are only computed once for every state of the page. The analysis
+        # must be invalidated after every modification of the page; this also reloads the page object, see PageAnalysis.
+        analysis = PageAnalysis(doc[page_index])
+        digitally_born = is_digitally_born(analysis.page, analysis)
 
         if not digitally_born:
-            # We reload the page using doc[page_index] every time before calling page.get_image_info(), instead of
-            # re-using the same page object, as the latter can lead to strange behaviour (xref=0 and outdated values
-            # from the second page.get_image_info() call). This is because the result of the page.get_image_info()
-            # call is cached on the Page object, and this cache is not autmoatically cleared when modifying some of the
-            # images (e.g. calling page.replace_image()). This has been reported as a bug on the PyMuPDF GitHub repo:
-            # https://github.com/pymupdf/PyMuPDF/issues/4303
-            resize_page(doc, page_index)
-            replace_jpx_images(doc, page_index)
-            crop_images(doc, page_index)
-
-        new_page = doc[page_index]
+            if resize_page(doc, page_index):
+                analysis.invalidate()
+            if replace_jpx_images(doc, page_index, analysis):
+                analysis.invalidate()
+            if crop_images(doc, page_index, analysis):
+                analysis.invalidate()
+
+        new_page = analysis.page
 
         mask = Mask(new_page)
         if self.use_aggressive_strategy:
-            mask = clean_old_ocr_aggressive(new_page)
+            mask = clean_old_ocr_aggressive(new_page, analysis)
         else:
             if not digitally_born:
-                clean_old_ocr(new_page)
+                clean_old_ocr(new_page, analysis)
             else:
                 logging.info(" Skipping digitally-born page.")
-                return
-        tmp_path_prefix = os.path.join(self.tmp_dir, f"page{page_number}")
-        lines_to_draw = process_page(doc, new_page, self.textract_client, tmp_path_prefix,
-                                     self.confidence_threshold, mask)
+                if self.checkpoints:
+                    self.checkpoints.save(page_index, PageCheckpoint(status=STATUS_SKIPPED, lines=[]))
+                return None
+
+        if checkpoint and checkpoint.status == STATUS_DONE:
+            logging.info(f"  Using {len(checkpoint.lines)} lines from checkpoint.")
+            # same modification as in start_page_ocr(), so that the output does not depend on the checkpoint
+            new_page.clean_contents()
+            return PendingPage(page_index=page_index, page_ocr=None, lines=checkpoint.lines)
 
-        text_layer_path = os.path.join(self.tmp_dir, f"page{page_number}.pdf")
-        draw_ocr_text_page(new_page, text_layer_path, lines_to_draw)
+        page_ocr = start_page_ocr(doc, new_page, self.textract_client, self.confidence_threshold, mask, executor)
+        return PendingPage(page_index=page_index, page_ocr=page_ocr)
+
+    def finish_page(
+        self,
+        pending_page: PendingPage,
+        doc: pymupdf.Document,
+        add_debug_page: bool = False
+    ):
+        """Waits for the OCR results of the page and draws the new text layer."""
+        if pending_page.lines is not None:
+            lines_to_draw = pending_page.lines
+        else:
+            lines_to_draw = finish_page_ocr(pending_page.page_ocr)
+            if pending_page.page_ocr is not None:
+                self.reading_order_engines[pending_page.page_ocr.reading_order_engine] += 1
+
+        # Reload the page, as later pages in the pipeline might have been modified in the meantime.
+        new_page = doc[pending_page.page_index]
+        draw_ocr_text_page(new_page, lines_to_draw, resources=self.text_layer_resources)
         if add_debug_page:
             debug_page = doc.new_page(new_page.number + 1, new_page.rect.width, new_page.rect.height)
-            draw_ocr_text_page(debug_page, text_layer_path, lines_to_draw, visible=True)
+            draw_ocr_text_page(debug_page, lines_to_draw, visible=True, resources=self.text_layer_resources)
+
+        self.saver.page_modified()
 
-        # Only call saveIncr() when something actually changed, not for digitally-born pages. Otherwise, files like
-        # Asset 39713.pdf cause problems.
-        doc.saveIncr()
+        if self.checkpoints and pending_page.lines is None:
+            self.checkpoints.save(pending_page.page_index, PageCheckpoint(status=STATUS_DONE, lines=lines_to_draw))
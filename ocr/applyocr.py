@@ -1,26 +1,43 @@
 import logging
+from concurrent.futures import Executor, Future, wait
 
 import pymupdf
 
 from ocr import Mask
 from ocr.preprocess.crop import downscale_images_x2
-from ocr.readingorder import sort_lines
+from ocr.readingorder import sort_lines_with_fallback
 from ocr.textline import TextLine
-from ocr.textract.textract import combine_text_lines, textract, clip_rects
+from ocr.textract.textract import (
+    combine_text_lines, clip_rects, prepare_tiles, call_textract_for_tile, text_lines_from_tile, TextractTile,
+    pdf_bytes, MAX_PAYLOAD_BYTES, TILE_UPDATE_HEADROOM_BYTES
+)
 from mypy_boto3_textract import TextractClient as Textractor
-from uuid import uuid4
-from pathlib import Path
-import os
 
 
 def process_page(
         doc: pymupdf.Document,
         page: pymupdf.Page,
         extractor: Textractor,
-        tmp_path_prefix: str,
         confidence_threshold: float,
-        mask: Mask | None = None
+        mask: Mask | None = None,
+        executor: Executor | None = None
 ):
+    page_ocr = start_page_ocr(doc, page, extractor, confidence_threshold, mask, executor)
+    return finish_page_ocr(page_ocr)
+
+
+def start_page_ocr(
+        doc: pymupdf.Document,
+        page: pymupdf.Page,
+        extractor: Textractor,
+        confidence_threshold: float,
+        mask: Mask | None = None,
+        executor: Executor | None = None
+) -> "OCR | None":
+    """Prepares the Textract payloads for the page and, if an executor is given, already starts the requests.
+
+    Returns None if the page cannot be sent to AWS Textract. The resulting lines are obtained using finish_page_ocr().
+    """
     if mask is None:
         mask = Mask(page)
 
@@ -29,70 +46,80 @@ def process_page(
     # create a single-page PDF document that can be modified if necessary, before being sent to AWS Textract
     textract_doc = pymupdf.Document()
     textract_doc.insert_pdf(doc, from_page=page.number, to_page=page.number)
-    textract_doc_path = OCR.tmp_file_path(tmp_path_prefix, "pdf")
-
-    ten_mb = 10 * 1024 * 1024  # 10 MB
-    textract_doc.save(textract_doc_path, deflate=True, garbage=3, use_objstms=1)
+    # The document is only serialized in memory, and never written to disk.
+    textract_doc_bytes = pdf_bytes(textract_doc)
+    # Every excerpt of the page is sent as textract_doc_bytes followed by a small incremental update.
+    max_page_size = MAX_PAYLOAD_BYTES - TILE_UPDATE_HEADROOM_BYTES
 
     for iteration in range(10):
-        page_size = os.path.getsize(textract_doc_path)
-        if page_size < ten_mb:
+        page_size = len(textract_doc_bytes)
+        if page_size < max_page_size:
             break
         logging.info(f"  Page size is {page_size / 1024 / 1024:.2f} MB, trying to downscale images.")
         # We only reduce the image resolution in the temporary PDF file that is used for AWS Textact, not in the
         # original PDF file.
         downscale_successful = downscale_images_x2(textract_doc, page_index=0)
         if downscale_successful:
-            textract_doc.save(textract_doc_path, deflate=True, garbage=3, use_objstms=1)
+            textract_doc_bytes = pdf_bytes(textract_doc)
         else:
             logging.info(f"  Downscale images was unsuccessful.")
             break
 
-    if os.path.getsize(textract_doc_path) < ten_mb:
+    if len(textract_doc_bytes) < max_page_size:
         page_ocr = OCR(
             textractor=extractor,
             confidence_threshold=confidence_threshold,
-            textract_doc_path=textract_doc_path,
+            textract_doc_bytes=textract_doc_bytes,
+            page_rect=textract_doc[0].rect,
             mask=mask,
-            tmp_path_prefix=tmp_path_prefix
+            executor=executor
         )
-        lines_to_draw = page_ocr.apply_ocr()
-        os.remove(textract_doc_path)
-        logging.info("  {} new lines found".format(len(lines_to_draw)))
-        return lines_to_draw
+        page_ocr.start()
+        return page_ocr
     else:
         logging.info("  Could not reduce page size to below 10MB. Skipping page.")
+        return None
+
+
+def finish_page_ocr(page_ocr: "OCR | None") -> list[TextLine]:
+    if page_ocr is None:
         return []
 
+    lines_to_draw = page_ocr.apply_ocr()
+    logging.info("  {} new lines found ({} reading order)".format(len(lines_to_draw), page_ocr.reading_order_engine))
+    return lines_to_draw
+
 
 class OCR:
     def __init__(
             self,
             textractor: Textractor,
             confidence_threshold: float,
-            textract_doc_path: Path,
+            textract_doc_bytes: bytes,
+            page_rect: pymupdf.Rect,
             mask: Mask,
-            tmp_path_prefix: str
+            executor: Executor | None = None
     ):
         self.textractor = textractor
         self.confidence_threshold = confidence_threshold
-        # single-page PDF document that will be sent to AWS Textract
-        self.textract_doc_path = textract_doc_path
-        with pymupdf.Document(textract_doc_path) as doc:
-            self.page_rect = doc[0].rect
+        # serialized single-page PDF document that will be sent to AWS Textract
+        self.textract_doc_bytes = textract_doc_bytes
+        self.page_rect = page_rect
         self.mask = mask
-        self.tmp_path_prefix = tmp_path_prefix
-
-    @staticmethod
-    def tmp_file_path(tmp_path_prefix, extension: str) -> Path:
-        return Path("{}_{}.{}".format(tmp_path_prefix, uuid4(), extension))
+        # executor for sending the requests for the different clip rects concurrently; sequential if None
+        self.executor = executor
+        self.tiles: list[TextractTile] | None = None
+        self.responses: list[Future] | None = None
+        # engine that determined the reading order of the lines, see ocr.readingorder.sort_lines_with_fallback()
+        self.reading_order_engine: str | None = None
 
     def apply_ocr(self):
         """Apply OCR."""
         text_lines = self._ocr_text_lines()
 
+        reading_order_blocks, self.reading_order_engine = sort_lines_with_fallback(text_lines)
         draw_lines = []
-        for reading_order_block in sort_lines(text_lines):
+        for reading_order_block in reading_order_blocks:
             lines = reading_order_block.lines
 
             line_confidence_values = [line.confidence for line in lines]
@@ -112,15 +139,40 @@ class OCR:
 
         return draw_lines
 
+    def start(self):
+        """Prepares the excerpts of the page and, if an executor is available, submits the Textract requests."""
+        if self.tiles is not None:
+            return
+
+        self.tiles = prepare_tiles(self.textract_doc_bytes, clip_rects(self.page_rect))
+
+        # Only the requests to AWS Textract run concurrently. The tiles are prepared and the results are combined
+        # on the current thread, as PyMuPDF is not thread-safe.
+        if self.executor:
+            self.responses = [
+                self.executor.submit(call_textract_for_tile, self.textractor, tile)
+                for tile in self.tiles
+            ]
+
     def _ocr_text_lines(self) -> list[TextLine]:
-        text_lines = []
-        final_clip_rects = clip_rects(self.page_rect)
-        for final_clip_rect in final_clip_rects:
-            new_lines = textract(
-                self.textract_doc_path,
-                self.textractor,
-                self.tmp_file_path(self.tmp_path_prefix, "pdf"),
-                final_clip_rect
-            )
-            text_lines = combine_text_lines(text_lines, new_lines)
-        return text_lines
+        self.start()
+        try:
+            # The responses are consumed in the order of the tiles, so the combined result does not depend on which
+            # request finishes first.
+            if self.responses is not None:
+                responses = (future.result() for future in self.responses)
+            else:
+                responses = (call_textract_for_tile(self.textractor, tile) for tile in self.tiles)
+
+            text_lines = []
+            for tile, response in zip(self.tiles, responses):
+                text_lines = combine_text_lines(text_lines, text_lines_from_tile(tile, response))
+            return text_lines
+        finally:
+            if self.responses is not None:
+                for future in self.responses:
+                    future.cancel()
+                wait(self.responses)
+            # release the payloads as soon as possible
+            self.tiles = []
+            self.responses = None
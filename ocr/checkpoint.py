@@ -0,0 +1,135 @@
+"""Per-page checkpoints, that allow resuming the processing of a document after a failure.
+
+After a page has been finished, the final text lines for that page are written to a small JSON file. When the same
+document is processed again with the same settings, these pages do not need to be sent to AWS Textract again.
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import pymupdf
+
+from ocr.textline import TextLine, TextWord
+
+STATUS_DONE = "done"
+STATUS_SKIPPED = "skipped"
+
+
+@dataclasses.dataclass
+class PageCheckpoint:
+    status: str
+    lines: list[TextLine]
+
+
+def document_checkpoint_dir(checkpoint_path: str, name: str) -> Path:
+    """
+    Directory for the checkpoints of a single document, inside the configured CHECKPOINT_PATH.
+
+    The directory is named after a hash of the name of the document (e.g. the S3 key), so that names containing path
+    separators or ".." can never point to a location outside of checkpoint_path.
+    """
+    return Path(checkpoint_path) / hashlib.sha256(name.encode("utf-8")).hexdigest()[:32]
+
+
+class CheckpointStore:
+    def __init__(self, checkpoint_dir: Path, document: Path | bytes, settings: dict):
+        """
+        :param checkpoint_dir: directory in which the checkpoints are stored
+        :param document: path or content of the document that is processed; checkpoints are only re-used for the exact
+            same file
+        :param settings: all settings that influence the result; checkpoints are only re-used for the same settings
+        """
+        self.checkpoint_dir = checkpoint_dir
+        fingerprint = hashlib.sha256()
+        if isinstance(document, bytes):
+            fingerprint.update(document)
+        else:
+            with open(document, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    fingerprint.update(chunk)
+        fingerprint.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+        self.path = checkpoint_dir / fingerprint.hexdigest()[:16]
+        os.makedirs(self.path, exist_ok=True)
+
+        completed = len(list(self.path.glob("page*.json")))
+        if completed:
+            logging.info(f"Found checkpoints for {completed} pages in '{self.path}'.")
+
+    def load(self, page_index: int) -> PageCheckpoint | None:
+        try:
+            with open(self._page_path(page_index)) as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return PageCheckpoint(
+            status=data["status"],
+            lines=[_line_from_dict(line) for line in data["lines"]]
+        )
+
+    def save(self, page_index: int, checkpoint: PageCheckpoint):
+        data = {
+            "status": checkpoint.status,
+            "lines": [_line_to_dict(line) for line in checkpoint.lines]
+        }
+        page_path = self._page_path(page_index)
+        tmp_path = page_path.with_name(f"{page_path.name}.{uuid.uuid4()}.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, page_path)
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        try:
+            # only removes the directory of the document if no other checkpoints are left in it
+            os.rmdir(self.checkpoint_dir)
+        except OSError:
+            pass
+
+    def _page_path(self, page_index: int) -> Path:
+        return self.path / f"page{page_index + 1}.json"
+
+
+def _rect_to_list(rect: pymupdf.Rect) -> list[float]:
+    return [rect.x0, rect.y0, rect.x1, rect.y1]
+
+
+def _line_to_dict(line: TextLine) -> dict:
+    return {
+        "text": line.text,
+        "orientation": line.orientation,
+        "derotated_rect": _rect_to_list(line.derotated_rect),
+        "rect": _rect_to_list(line.rect),
+        "confidence": line.confidence,
+        "words": [
+            {
+                "text": word.text,
+                "derotated_rect": _rect_to_list(word.derotated_rect),
+                "orientation": word.orientation
+            }
+            for word in line.words
+        ]
+    }
+
+
+def _line_from_dict(data: dict) -> TextLine:
+    return TextLine(
+        text=data["text"],
+        orientation=data["orientation"],
+        derotated_rect=pymupdf.Rect(data["derotated_rect"]),
+        rect=pymupdf.Rect(data["rect"]),
+        confidence=data["confidence"],
+        words=[
+            TextWord(
+                text=word["text"],
+                derotated_rect=pymupdf.Rect(word["derotated_rect"]),
+                orientation=word["orientation"]
+            )
+            for word in data["words"]
+        ]
+    )
@@ -1,5 +1,6 @@
+import io
+
 import pymupdf
-import os
 
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfgen import canvas
@@ -48,12 +49,52 @@ def draw_ocr_word(
     text.textOut(wordText)
 
 
+class TextLayerResources:
+    """Keeps track of the font resources of all text layers that have been drawn in a document.
+
+    Every text layer is created as a separate reportlab document, so show_pdf_page() copies its font resources into the
+    document again for every page. With share_fonts(), all text layers use a single copy of these resources instead.
+
+    The final output does not get any smaller by this, as ez_save() removes the duplicate fonts anyway. The benefit is
+    that the incremental saves while the document is processed (see IncrementalSaver) only contain the font resources
+    once, instead of a new copy for every page.
+    """
+
+    def __init__(self, doc: pymupdf.Document):
+        self.doc = doc
+        # content of a font resource dictionary -> xref of the first copy of this dictionary in the document
+        self.font_dicts: dict[tuple[tuple[str, str], ...], int] = {}
+
+    def share_fonts(self, xobject_xref: int):
+        value_type, value = self.doc.xref_get_key(xobject_xref, "Resources/Font")
+        if value_type != "xref":
+            return
+        font_dict_xref = int(value.split()[0])
+
+        fonts = {}
+        for name in self.doc.xref_get_keys(font_dict_xref):
+            font_type, font_ref = self.doc.xref_get_key(font_dict_xref, name)
+            if font_type != "xref":
+                return
+            fonts[name] = int(font_ref.split()[0])
+        content = tuple(sorted(
+            (name, self.doc.xref_object(font_xref, compressed=True)) for name, font_xref in fonts.items()
+        ))
+
+        shared_xref = self.font_dicts.setdefault(content, font_dict_xref)
+        if shared_xref != font_dict_xref:
+            self.doc.xref_set_key(xobject_xref, "Resources/Font", f"{shared_xref} 0 R")
+            # The copies were only referenced by this text layer, and can be removed.
+            for font_xref in fonts.values():
+                self.doc.update_object(font_xref, "null")
+            self.doc.update_object(font_dict_xref, "null")
+
 
 def draw_ocr_text_page(
         page: pymupdf.Page,
-        text_layer_path: str,
         lines: list[TextLine],
-        visible: bool=False
+        visible: bool = False,
+        resources: TextLayerResources | None = None
 ):
     """
     Draw hidden OCR text on the page.
@@ -64,13 +105,15 @@ def draw_ocr_text_page(
 
     The text layer is first created as a separate PDF page using reportlab (as here we have better control over
     text attributed such as horizontal spacing, compared to PyMuPDF), and afterwards overlayed onto the original PDF
-    page using the PyMuPDF show_pdf_page method.
+    page using the PyMuPDF show_pdf_page method. The text layer is only created in memory. When resources are given,
+    the font resources are shared with the text layers on all other pages of the document.
     """
     font_name = "Helvetica"
 
     width = page.rect.width
     height = page.rect.height
-    c = canvas.Canvas(text_layer_path, pagesize=(width, height))
+    text_layer = io.BytesIO()
+    c = canvas.Canvas(text_layer, pagesize=(width, height))
     c.saveState()
     current_orientation = 0
     text = c.beginText(0, 0)
@@ -136,12 +179,9 @@ def draw_ocr_text_page(
 
     original_rotation = page.rotation
     page.set_rotation(0)
-    with open(text_layer_path, 'rb') as text_layer_file:
-        data = text_layer_file.read()
-    # For some reason, a PyMuPDF document is not correctly closed after calling show_pdf_page with it. To avoid a
-    # "too many open files" error, we first load the text layer into memory, and only then create a PyMuPDF doc from it.
-    with pymupdf.Document(stream=data) as text_layer_doc:
-        page.show_pdf_page(page.rect, text_layer_doc, rotate=original_rotation)
+    with pymupdf.Document(stream=text_layer.getvalue()) as text_layer_doc:
+        xobject_xref = page.show_pdf_page(page.rect, text_layer_doc, rotate=original_rotation)
     page.set_rotation(original_rotation)
-    os.remove(text_layer_path)
+    if resources is not None:
+        resources.share_fonts(xobject_xref)
     return
@@ -0,0 +1,75 @@
+import logging
+import os
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+import pymupdf
+
+
+@dataclass
+class SaveStatistics:
+    saves: int = 0
+    bytes_written: int = 0
+    seconds: float = 0.0
+
+
+class IncrementalSaver:
+    """Decides when the modifications of a document are written back to its file using doc.saveIncr().
+
+    Every incremental save appends the modified objects and a new cross-reference section to the file. Saving after
+    every page keeps the amount of unsaved modifications small, but for large documents, the file grows with every
+    page, and the final garbage collection has to deal with all these sections. Therefore, the document can also be
+    saved only every few pages, every few seconds, or not at all before the final output is written.
+    """
+
+    def __init__(
+            self,
+            doc: pymupdf.Document,
+            path: Path | None,
+            interval_pages: int = 1,
+            interval_seconds: float | None = None,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        :param path: the file from which the document was opened; the document is never saved if None
+        :param interval_pages: save after this number of modified pages; never save based on the number of pages if 0
+        :param interval_seconds: save when the last save is at least this long ago; never save based on time if None
+        """
+        self.doc = doc
+        self.path = path
+        self.interval_pages = interval_pages
+        self.interval_seconds = interval_seconds
+        self.clock = clock
+        self.unsaved_pages = 0
+        self.last_save = clock()
+        self.statistics = SaveStatistics()
+
+    def page_modified(self):
+        self.unsaved_pages += 1
+        if self.interval_pages > 0 and self.unsaved_pages >= self.interval_pages:
+            self.save()
+        elif self.interval_seconds is not None and self.clock() - self.last_save >= self.interval_seconds:
+            self.save()
+
+    def save(self):
+        # Only call saveIncr() when something actually changed, not for digitally-born pages. Otherwise, files like
+        # Asset 39713.pdf cause problems.
+        if self.path is None or self.unsaved_pages == 0:
+            return
+
+        start = self.clock()
+        size_before = os.path.getsize(self.path)
+        self.doc.saveIncr()
+        self.statistics.saves += 1
+        self.statistics.bytes_written += os.path.getsize(self.path) - size_before
+        self.unsaved_pages = 0
+        self.last_save = self.clock()
+        self.statistics.seconds += self.last_save - start
+
+    def log_statistics(self):
+        logging.info(
+            f"{self.statistics.saves} incremental saves, {self.statistics.bytes_written / 1024 / 1024:.2f} MB written "
+            f"in {self.statistics.seconds:.2f} seconds."
+        )
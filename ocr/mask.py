@@ -1,23 +1,88 @@
 import numpy as np
 import pymupdf
 
+# Building the summed-area table costs about as much as counting the entries of submasks with this many times the size
+# of the mask directly.
+SUMMED_AREA_TABLE_COST = 8
+
+
 class Mask:
+    """Marks the areas of a page (with a resolution of one point) where no OCR should be applied.
+
+    The mask is stored as a boolean array. Queries are answered in constant time from a summed-area table. As the table
+    must be rebuilt after every modification of the mask, it is only built lazily: queries on a modified mask count the
+    entries of the submask directly, until that has cost as much as building the table. This way, interleaved
+    modifications and queries (as in clean_old_ocr_aggressive()) never cost more than twice as much as counting
+    directly, and repeated queries on a mask that is no longer modified (as in OCR.apply_ocr()) take constant time.
+    """
+
     def __init__(self, page: pymupdf.Page):
         mask_dimensions = (round(page.rect.width), round(page.rect.height))
-        self.mask = np.zeros(mask_dimensions)
+        self.mask = np.zeros(mask_dimensions, dtype=bool)
+        # summed-area table with an additional leading row and column of zeros; None if outdated
+        self._summed_area_table: np.ndarray | None = None
+        # total size of the submasks that were counted directly since the last modification
+        self._direct_query_cost = 0
+
+    def _ranges(self, rect: pymupdf.Rect) -> tuple[range, range]:
+        """Indices of the submask for the rect, with the same semantics as slicing the NumPy array."""
+        width, height = self.mask.shape
+        return (
+            range(*slice(round(rect.x0), round(rect.x1) + 1).indices(width)),
+            range(*slice(round(rect.y0), round(rect.y1) + 1).indices(height))
+        )
 
     def _submask(self, rect: pymupdf.Rect) -> np.ndarray:
         return self.mask[round(rect.x0):round(rect.x1) + 1, round(rect.y0):round(rect.y1) + 1]
 
+    def _modified(self):
+        self._summed_area_table = None
+        self._direct_query_cost = 0
+
     def add_rect(self, rect: pymupdf.Rect):
-        self._submask(rect).fill(1)
+        self._submask(rect).fill(True)
+        self._modified()
 
     def remove_rect(self, rect: pymupdf.Rect):
-        self._submask(rect).fill(0)
+        self._submask(rect).fill(False)
+        self._modified()
+
+    def _count(self, rect: pymupdf.Rect) -> tuple[int, int]:
+        """Number of masked entries in the submask for the rect, and the size of the submask."""
+        x_range, y_range = self._ranges(rect)
+        size = len(x_range) * len(y_range)
+        if size == 0:
+            return 0, 0
+
+        if (
+            self._summed_area_table is None and
+            self._direct_query_cost + size > SUMMED_AREA_TABLE_COST * self.mask.size
+        ):
+            self._build_summed_area_table()
+        if self._summed_area_table is None:
+            self._direct_query_cost += size
+            return int(np.count_nonzero(self._submask(rect))), size
+
+        table = self._summed_area_table
+        x0, x1 = x_range.start, x_range.stop
+        y0, y1 = y_range.start, y_range.stop
+        count = int(table[x1, y1]) - int(table[x0, y1]) - int(table[x1, y0]) + int(table[x0, y0])
+        return count, size
+
+    def _build_summed_area_table(self):
+        width, height = self.mask.shape
+        # uint32 is enough for any realistic page (up to 65535 x 65535 points)
+        dtype = np.uint32 if self.mask.size < 2 ** 32 else np.uint64
+        table = np.zeros((width + 1, height + 1), dtype=dtype)
+        np.cumsum(self.mask, axis=0, dtype=dtype, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+        self._summed_area_table = table
 
     def intersects(self, rect: pymupdf.Rect) -> bool:
-        return np.any(self._submask(rect))
+        count, _ = self._count(rect)
+        return count > 0
 
     def coverage_ratio(self, rect: pymupdf.Rect) -> float:
-        submask = self._submask(rect)
-        return np.sum(submask) / np.size(submask)
+        count, size = self._count(rect)
+        # NaN for an empty submask, as before
+        return np.float64(count) / size
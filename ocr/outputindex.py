@@ -0,0 +1,163 @@
+"""Persistent index of the output files that already exist in an output target.
+
+Listing a large output target (e.g. an S3 prefix with hundreds of thousands of objects) on every start of a batch run
+is slow. Instead, the filenames are stored in a local SQLite database. On most starts, only the outputs that have been
+added since the last refresh are listed (see AssetTarget.list_new_filenames()), and the outputs that are saved during
+the run are added right away. Checking whether a file exists is a single primary-key lookup.
+
+The incremental refresh is not exact: for S3, outputs that other processes add with a key that sorts before the last
+listed key are missed, and outputs that are removed from the target are never noticed. Therefore, the whole target is
+listed again regularly (see IndexedAssetTarget), and the index is reconciled with that listing.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+# number of filenames that are inserted per transaction during a refresh
+BATCH_SIZE = 10000
+
+
+class OutputIndex:
+    def __init__(self, path: Path, target_id: str):
+        """
+        :param path: location of the SQLite database; the same database can be shared by several targets
+        :param target_id: identifies the target (e.g. its S3 bucket and prefix) within the database
+        """
+        self.target_id = target_id
+        self.lock = threading.Lock()
+        os.makedirs(path.parent, exist_ok=True)
+        # Outputs are added from the thread that saves the results (see BackgroundAssetTarget).
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS outputs (target TEXT, filename TEXT, PRIMARY KEY (target, filename))"
+                " WITHOUT ROWID"
+            )
+            self.connection.execute("CREATE TABLE IF NOT EXISTS markers (target TEXT PRIMARY KEY, marker TEXT)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS full_refreshes (target TEXT PRIMARY KEY, refreshed REAL)"
+            )
+            # filenames of the current full listing, see reconcile()
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS listed (filename TEXT PRIMARY KEY)")
+
+    @property
+    def marker(self) -> str | None:
+        """Position up to which the target has been listed, see AssetTarget.list_new_filenames()."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT marker FROM markers WHERE target = ?", (self.target_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, new_filenames: Iterable[tuple[str, str]]):
+        """Adds the newly listed outputs, given as (filename, marker) pairs, and stores the last marker."""
+        batch = []
+        count = 0
+        for filename, marker in new_filenames:
+            batch.append((filename, marker))
+            if len(batch) >= BATCH_SIZE:
+                count += self._insert(batch)
+                batch = []
+        count += self._insert(batch)
+        logging.info(f"Added {count} new outputs to the output index ({len(self)} outputs in total).")
+
+    @property
+    def last_full_refresh(self) -> float | None:
+        """Time (as from time.time()) of the last call to reconcile(), or None if the target has never been listed."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT refreshed FROM full_refreshes WHERE target = ?", (self.target_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def reconcile(self, filenames: Iterable[tuple[str, str]], now: float | None = None):
+        """Replaces the outputs with a full listing of the target, given as (filename, marker) pairs.
+
+        Outputs that are not listed anymore are removed from the index, so that they are processed again.
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM listed")
+        batch = []
+        marker = None
+        for filename, marker in filenames:
+            batch.append((filename,))
+            if len(batch) >= BATCH_SIZE:
+                self._insert_listed(batch)
+                batch = []
+        self._insert_listed(batch)
+
+        with self.lock, self.connection:
+            removed = self.connection.execute(
+                "DELETE FROM outputs WHERE target = ? AND filename NOT IN (SELECT filename FROM listed)",
+                (self.target_id,)
+            ).rowcount
+            added = self.connection.execute(
+                "INSERT OR IGNORE INTO outputs (target, filename) SELECT ?, filename FROM listed", (self.target_id,)
+            ).rowcount
+            if marker is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO markers (target, marker) VALUES (?, ?)", (self.target_id, marker)
+                )
+            else:
+                self.connection.execute("DELETE FROM markers WHERE target = ?", (self.target_id,))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO full_refreshes (target, refreshed) VALUES (?, ?)",
+                (self.target_id, time.time() if now is None else now)
+            )
+            self.connection.execute("DELETE FROM listed")
+        logging.info(
+            f"Listed the complete output target: added {added} and removed {removed} outputs in the output index "
+            f"({len(self)} outputs in total)."
+        )
+
+    def _insert_listed(self, batch: list[tuple[str]]):
+        if not batch:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO listed (filename) VALUES (?)", batch)
+
+    def set_marker(self, marker: str):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO markers (target, marker) VALUES (?, ?)", (self.target_id, marker)
+            )
+
+    def add(self, filename: str):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO outputs (target, filename) VALUES (?, ?)", (self.target_id, filename)
+            )
+
+    def _insert(self, batch: list[tuple[str, str]]) -> int:
+        if not batch:
+            return 0
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO outputs (target, filename) VALUES (?, ?)",
+                [(self.target_id, filename) for filename, _ in batch]
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO markers (target, marker) VALUES (?, ?)", (self.target_id, batch[-1][1])
+            )
+        return len(batch)
+
+    def __contains__(self, filename: object) -> bool:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT 1 FROM outputs WHERE target = ? AND filename = ?", (self.target_id, filename)
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM outputs WHERE target = ?", (self.target_id,)
+            ).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,103 @@
+import dataclasses
+
+import pymupdf
+
+TEXT_BOX_TYPES = ("fill-text", "stroke-text")
+IMAGE_BOX_TYPES = ("fill-image", "fill-imgmask")
+
+
+@dataclasses.dataclass
+class BboxSummary:
+    """Everything that is derived from a single walk over the bbox log of a page."""
+    text_bbox_union: pymupdf.Rect
+    all_text_covered: bool
+    has_image: bool
+    visible_text_rects: list[pymupdf.Rect]
+    ignore_text_rects: list[pymupdf.Rect]
+
+
+class PageAnalysis:
+    """Lazily computed information about the current state of a page.
+
+    Walking the bbox log of a page is expensive for pages with lots of vector text, so it is done at most once for every
+    state of the page, and the result is shared by the classification (digitally-born or not) and by the cleaning of
+    old OCR text. The same goes for page.get_image_info().
+
+    After every modification of the page (e.g. resizing the page, or replacing or cropping images), invalidate() must be
+    called. This also reloads the page object using doc[page_index], as the result of page.get_image_info() is cached on
+    the Page object, and this cache is not automatically cleared when modifying some of the images (e.g. calling
+    page.replace_image()). This has been reported as a bug on the PyMuPDF GitHub repo:
+    https://github.com/pymupdf/PyMuPDF/issues/4303
+    """
+
+    def __init__(self, page: pymupdf.Page):
+        self.doc = page.parent
+        self.page_index = page.number
+        self._page: pymupdf.Page | None = page
+        self._bboxlog: list[tuple[str, pymupdf.Rect]] | None = None
+        self._summary: BboxSummary | None = None
+        self._image_info: list[dict] | None = None
+
+    def invalidate(self):
+        self._page = None
+        self._bboxlog = None
+        self._summary = None
+        self._image_info = None
+
+    @property
+    def page(self) -> pymupdf.Page:
+        if self._page is None:
+            self._page = self.doc[self.page_index]
+        return self._page
+
+    @property
+    def bboxlog(self) -> list[tuple[str, pymupdf.Rect]]:
+        if self._bboxlog is None:
+            self._bboxlog = [(box_type, pymupdf.Rect(coordinates)) for box_type, coordinates in self.page.get_bboxlog()]
+        return self._bboxlog
+
+    @property
+    def image_info(self) -> list[dict]:
+        if self._image_info is None:
+            self._image_info = self.page.get_image_info(xrefs=True)
+        return self._image_info
+
+    @property
+    def summary(self) -> BboxSummary:
+        if self._summary is None:
+            self._summary = self._summarize()
+        return self._summary
+
+    @property
+    def digitally_born(self) -> bool:
+        """See ocr.util.is_digitally_born()."""
+        summary = self.summary
+        return not (summary.has_image and (summary.text_bbox_union.is_empty or summary.all_text_covered))
+
+    def _summarize(self) -> BboxSummary:
+        text_bbox_union = pymupdf.Rect()
+        all_text_covered = False
+        has_image = False
+        visible_text_rects = []
+        ignore_text_rects = []
+
+        for box_type, rectangle in self.bboxlog:
+            # Empty rectangle that should be ignored occurs sometimes, e.g. SwissGeol 44191 page 37.
+            if box_type in TEXT_BOX_TYPES and not rectangle.is_empty:
+                all_text_covered = False
+                text_bbox_union = text_bbox_union | rectangle
+                visible_text_rects.append(rectangle)
+            if box_type in IMAGE_BOX_TYPES:
+                has_image = True
+                if rectangle.contains(text_bbox_union):
+                    all_text_covered = True
+            if box_type == "ignore-text":
+                ignore_text_rects.append(rectangle)
+
+        return BboxSummary(
+            text_bbox_union=text_bbox_union,
+            all_text_covered=all_text_covered,
+            has_image=has_image,
+            visible_text_rects=visible_text_rects,
+            ignore_text_rects=ignore_text_rects
+        )
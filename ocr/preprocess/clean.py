@@ -2,10 +2,10 @@ import logging
 
 import pymupdf
 from ocr.mask import Mask
+from ocr.pageanalysis import PageAnalysis
 
 
-def find_old_ocr_rects(page: pymupdf.Page) -> list[pymupdf.Rect]:
-    bboxes = page.get_bboxlog()
+def find_old_ocr_rects(page: pymupdf.Page, analysis: PageAnalysis | None = None) -> list[pymupdf.Rect]:
     """Return a list of bounding boxes for existing OCR text.
 
     This includes bounding boxes of type "ignore-text", as well as bounding boxes of type 
@@ -18,31 +18,18 @@ def find_old_ocr_rects(page: pymupdf.Page) -> list[pymupdf.Rect]:
     - XWQE17I800_bp_19851224_Tiefenbrunnen-2.pdf (deep wells), page 2
     - MTPE17I800_bp_19770101_Lostorf-3.pdf (deep wells), pages 1-8
     """
-    ignore_text_rects = []
-    visible_text_rects = []
-    text_bbox_union = pymupdf.Rect()
-    all_text_covered = False
+    if analysis is None:
+        analysis = PageAnalysis(page)
+    summary = analysis.summary
 
-    for boxType, coordinates in bboxes:
-        rectangle = pymupdf.Rect(coordinates)
-        # Empty rectangle that should be ignored occurs sometimes, e.g. SwissGeol 44191 page 37.
-        if (boxType == "fill-text" or boxType == "stroke-text") and not rectangle.is_empty:
-            all_text_covered = False
-            text_bbox_union = text_bbox_union | rectangle
-            visible_text_rects.append(rectangle)
-        if boxType == "fill-image" or boxType == "fill-imgmask":
-            if rectangle.contains(text_bbox_union):
-                all_text_covered = True
-        if boxType == "ignore-text":
-            ignore_text_rects.append(rectangle)
-
-    if all_text_covered:
-        return visible_text_rects + ignore_text_rects
+    if summary.all_text_covered:
+        return summary.visible_text_rects + summary.ignore_text_rects
     else:
-        return ignore_text_rects
+        return list(summary.ignore_text_rects)
 
-def clean_old_ocr(page: pymupdf.Page):
-    rects = find_old_ocr_rects(page)
+def clean_old_ocr(page: pymupdf.Page, analysis: PageAnalysis | None = None) -> bool:
+    """Removes existing OCR text from the page. Returns whether the page has been modified."""
+    rects = find_old_ocr_rects(page, analysis)
     if rects:
         for rectangle in rects:
             page.add_redact_annot(rectangle)
@@ -52,9 +39,11 @@ def clean_old_ocr(page: pymupdf.Page):
         # position on the page.
         page.apply_redactions(images=pymupdf.PDF_REDACT_IMAGE_NONE)
         logging.info("  {} boxes removed".format(len(rects)))
+        return True
+    return False
 
 
-def clean_old_ocr_aggressive(page: pymupdf.Page) -> Mask:
+def clean_old_ocr_aggressive(page: pymupdf.Page, analysis: PageAnalysis | None = None) -> Mask:
     """
     Also cleans "fill-text" and "stroke-text" areas that are completely covered by some image.
 
@@ -62,14 +51,14 @@ def clean_old_ocr_aggressive(page: pymupdf.Page) -> Mask:
     the mask equals 1 if on that location on the page there is text that is still (potentially partially) visible, and
     where no OCR should be applied. Otherwise, the value will be 0, and OCR can be (re)applied here.
     """
-    bboxes = page.get_bboxlog()
+    if analysis is None:
+        analysis = PageAnalysis(page)
 
     mask = Mask(page)
     possibly_visible_text = set()
     invisible_text = set()
 
-    for boxType, rectangle in bboxes:
-        rect = pymupdf.Rect(rectangle)
+    for boxType, rect in analysis.bboxlog:
         if boxType == "ignore-text":
             # Some digitally-born documents (e.g. ZH 267124198-bp.pdf) draw the text using fill-path elements and then
             # add `ignore-text` to make the text searchable/selectable. We don't want to remove these.
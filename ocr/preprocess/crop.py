@@ -5,6 +5,8 @@ from pymupdf.mupdf import FzErrorFormat
 from PIL import Image
 import logging
 
+from ocr.pageanalysis import PageAnalysis
+
 
 def rotation_from_transform_matrix(transform: pymupdf.Matrix) -> int | None:
     epsilon = 1e-4
@@ -22,19 +24,22 @@ def rotation_from_transform_matrix(transform: pymupdf.Matrix) -> int | None:
                 return 270
 
 
-def crop_images(out_doc: pymupdf.Document, page_index: int):
-    page = out_doc[page_index]
+def crop_images(out_doc: pymupdf.Document, page_index: int, analysis: PageAnalysis | None = None) -> bool:
+    """Crops images that extend beyond the visible part of the page. Returns whether the page has been modified."""
+    if analysis is None:
+        analysis = PageAnalysis(out_doc[page_index])
+    page = analysis.page
 
     if page.rotation != 0:
         # We had some issues with misplacement of the cropped image on pages with a non-trivial rotation, so to be on
         # the safe side, we enforce rotation=0. The preceding resize step should normally have reset the page rotation
         # already.
         logging.info("  Skipping page because rotation is not 0 but {}.".format(page.rotation))
-        return
+        return False
 
     images = [
         dict
-        for dict in page.get_image_info(xrefs=True)
+        for dict in analysis.image_info
         # Ignore the 1x1 dummy image that is added by the PyMuPDF Page.delete_image method; see LGD-579
         if dict["width"] > 1 or dict["height"] > 1
     ]
@@ -43,8 +48,9 @@ def crop_images(out_doc: pymupdf.Document, page_index: int):
         # Skip because we cannot reliably deal with overlapping images (e.g. their order might change if we crop and
         # replace one image but not the other, e.g. CHA0ECFE2F3FFE47728C76619E_01_profil.pdf).
         logging.info("  More than one image on the page, skipping image crop.")
-        return
+        return False
 
+    modified = False
     for dict in images:
         xref = dict["xref"]
         try:
@@ -119,13 +125,19 @@ def crop_images(out_doc: pymupdf.Document, page_index: int):
                     stream=img_byte_arr,
                     rotate=-rotation
                 )
+                modified = True
         except ValueError:
             logging.info("  Encountered ValueError, skipping image crop.")
+    return modified
 
 
-def replace_jpx_images(doc: pymupdf.Document, page_index: int):
-    page = doc[page_index]
-    for dict in page.get_image_info(xrefs=True):
+def replace_jpx_images(doc: pymupdf.Document, page_index: int, analysis: PageAnalysis | None = None) -> bool:
+    """Converts JPX images on the page to JPG. Returns whether the page has been modified."""
+    if analysis is None:
+        analysis = PageAnalysis(doc[page_index])
+    page = analysis.page
+    modified = False
+    for dict in analysis.image_info:
         xref = dict['xref']
         try:
             extracted_img = doc.extract_image(xref)
@@ -138,8 +150,10 @@ def replace_jpx_images(doc: pymupdf.Document, page_index: int):
                 img = _pixmap_from_xref(doc, xref)
                 if img:
                     page.replace_image(xref, stream=img.tobytes('jpg', jpg_quality=85))
+                    modified = True
         except ValueError:
             logging.info(f"  Encountered ValueError for xref {xref}, skipping replace_jpx_images.")
+    return modified
 
 
 def downscale_images_x2(doc: pymupdf.Document, page_index: int) -> bool:
@@ -3,7 +3,8 @@ import logging
 import pymupdf
 
 
-def resize_page(doc: pymupdf.Document, page_index: int):
+def resize_page(doc: pymupdf.Document, page_index: int) -> bool:
+    """Enlarges narrow pages and resets the page rotation to 0. Returns whether the page has been replaced."""
     src_page = doc[page_index]
     page_rect = src_page.rect
     src_page_rotation = src_page.rotation
@@ -28,3 +29,5 @@ def resize_page(doc: pymupdf.Document, page_index: int):
         # We first insert the new page and only then delete the old one; this fixes an issue with 28957.pdf, where
         # we encountered the error "pymupdf.mupdf.FzErrorFormat: code=7: kid not found in parent's kids array".
         doc.delete_page(page_index + 1)
+        return True
+    return False
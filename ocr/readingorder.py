@@ -1,9 +1,23 @@
+import logging
+import math
+import time
 from dataclasses import dataclass
 
+import numpy as np
 import pymupdf
 
 from ocr.textline import TextLine
 from ocr.util import x_overlap, fast_intersection
+from ocr.xycut import xy_cut
+
+# Margin for the horizontal bands in which ReadingOrderIndex looks for candidates, so that rounding errors in the
+# conditions that are evaluated on the candidates never exclude a line that satisfies them.
+QUERY_MARGIN = 1.0
+# see sort_lines()
+FOLLOWING_DISTANCE = 20
+
+ENGINE_HEURISTIC = "heuristic"
+ENGINE_XY_CUT = "xy-cut"
 
 
 class ReadingOrderBlock:
@@ -128,30 +142,26 @@ class ReadingOrderColumn:
             cls,
             current_line: TextLineReadingOrder,
             preceding_lines: list[TextLineReadingOrder],
-            all_lines: set[TextLineReadingOrder]
+            index: "ReadingOrderIndex"
     ) -> "ReadingOrderColumn":
-        other_lines = all_lines.copy()
-        other_lines.remove(current_line)
+        excluded = np.zeros(len(index.lines), dtype=bool)
+        excluded[index.positions[current_line]] = True
         column = ReadingOrderColumn(
             rect=current_line.geometry.rect,
             bottom_of_first_line=current_line.geometry.rect.y1,
             top_of_last_line=current_line.geometry.rect.y0
         )
-        accurate_extension_count = sum(
-            1 for line in other_lines if column.is_accurately_extended_by(line.geometry)
-        )
+        accurate_extension_count = index.count_accurate_extensions(column, excluded)
         # Follow the preceding lines, in the reverse order of the reading order that was established so far.
         for line in reversed(preceding_lines):
             new_column = column.add_line_before(line.line)
-            other_lines.remove(line)
+            excluded[index.positions[line]] = True
 
-            if any(new_column.is_interrupted_by(other_line.geometry.rect) for other_line in other_lines):
+            if index.is_interrupted(new_column, excluded):
                 # No other lines that don't belong to the column are allowed to be significantly within the column.
                 break
 
-            new_accurate_extension_count = sum(
-                1 for line in other_lines if new_column.is_accurately_extended_by(line.geometry)
-            )
+            new_accurate_extension_count = index.count_accurate_extensions(new_column, excluded)
             if new_accurate_extension_count < accurate_extension_count:
                 # If we have fewer lines down below that accurately extend the current column, then we stop the loop
                 # and return the last column (with more lines down below that accurately extend).
@@ -163,47 +173,196 @@ class ReadingOrderColumn:
         return column
 
 
-def starting_line_for_next_block(remaining_lines: set[TextLineReadingOrder]) -> None | TextLineReadingOrder:
-    candidate_lines = remaining_lines.copy()
+class ReadingOrderIndex:
+    """Index over all lines of a page, for the queries in sort_lines().
+
+    The coordinates of the lines are kept in NumPy arrays, and every condition is evaluated on all candidate lines at
+    once, with the same floating point operations as the scalar implementation. Conditions that only concern lines in
+    the neighbourhood of a column or of a line are only evaluated on the lines in the corresponding horizontal band of
+    the page, which is found by binary search in the lines sorted by their top coordinate. Lines with degenerate
+    coordinates (non-finite or inverted) are always checked one by one with the scalar implementation. In all cases,
+    the result is exactly the same as when the condition is checked for every line.
+    """
+
+    def __init__(self, lines: list[TextLineReadingOrder]):
+        self.lines = lines
+        self.positions = {line: position for position, line in enumerate(lines)}
+        self.remaining = np.ones(len(lines), dtype=bool)
+        self.remaining_count = len(lines)
+
+        coordinates = np.array([tuple(line.geometry.rect) for line in lines], dtype=np.float64).reshape(-1, 4)
+        self.x0, self.y0, self.x1, self.y1 = coordinates.T
+        # same formulas as in ReadingOrderGeometry and pymupdf.Rect
+        self.x_middle = (self.x0 + self.x1) / 2
+        self.y_middle = (self.y0 + self.y1) / 2
+        self.width = self.x1 - self.x0
+        self.height = self.y1 - self.y0
+        self.sort_key = self.x0 + 2 * self.y0
+
+        regular = np.all(np.isfinite(coordinates), axis=1) & (self.width >= 0) & (self.height >= 0)
+        self.irregular_positions = np.flatnonzero(~regular)
+        regular_positions = np.flatnonzero(regular)
+        # stable sort, so that lines with the same top coordinate stay in their input order
+        self.by_y0 = regular_positions[np.argsort(self.y0[regular_positions], kind="stable")]
+        self.sorted_y0 = self.y0[self.by_y0]
+        self.max_line_height = float(self.height[regular_positions].max()) if len(regular_positions) else 0.0
+
+    def remove(self, line: TextLineReadingOrder):
+        self.remaining[self.positions[line]] = False
+        self.remaining_count -= 1
+
+    def add(self, line: TextLineReadingOrder):
+        self.remaining[self.positions[line]] = True
+        self.remaining_count += 1
+
+    def band(self, top: float, bottom: float) -> np.ndarray:
+        """Positions of the regular lines that might vertically overlap the range between top and bottom."""
+        if math.isnan(top) or math.isnan(bottom):
+            return self.by_y0
+        start = np.searchsorted(self.sorted_y0, top - self.max_line_height - QUERY_MARGIN, side="left")
+        end = np.searchsorted(self.sorted_y0, bottom + QUERY_MARGIN, side="right")
+        return self.by_y0[start:end]
+
+    def is_interrupted(self, column: ReadingOrderColumn, excluded: np.ndarray) -> bool:
+        """Whether column.is_interrupted_by() is True for any line that is not excluded."""
+        if any(
+            not excluded[position] and column.is_interrupted_by(self.lines[position].geometry.rect)
+            for position in self.irregular_positions
+        ):
+            return True
+        rect = column.rect
+        if not _is_regular(rect):
+            return any(
+                not excluded[position] and column.is_interrupted_by(line.geometry.rect)
+                for position, line in enumerate(self.lines)
+            )
+        p = self.band(max(rect.y0, column.bottom_of_first_line), min(rect.y1, column.top_of_last_line))
+        y_middle = self.y_middle[p]
+        return bool(np.any(
+            ~excluded[p] &
+            (self.x0[p] < rect.x1) & (rect.x0 < self.x1[p]) & (self.y0[p] < rect.y1) & (rect.y0 < self.y1[p]) &
+            (column.bottom_of_first_line < y_middle) & (y_middle < column.top_of_last_line)
+        ))
+
+    def extensions(self, column: ReadingOrderColumn, accurately: bool) -> np.ndarray:
+        """Positions (in input order) of all lines for which column.can_be_extended_by() or, if accurately is True,
+        column.is_accurately_extended_by() is True."""
+        def check(line: TextLineReadingOrder) -> bool:
+            if accurately:
+                return column.is_accurately_extended_by(line.geometry)
+            return column.can_be_extended_by(line.geometry)
+
+        rect = column.rect
+        if not _is_regular(rect):
+            return np.array([position for position, line in enumerate(self.lines) if check(line)], dtype=np.intp)
+
+        p = self.band(column.top_of_last_line, rect.y1 + rect.height + self.max_line_height)
+        x0, x1, width = self.x0[p], self.x1[p], self.width[p]
+        x_overlap = np.where((rect.x0 < x1) & (x0 < rect.x1), np.minimum(rect.x1, x1) - np.maximum(rect.x0, x0), 0)
+        matches = (
+            (self.y_middle[p] > column.top_of_last_line) &
+            (self.y0[p] - rect.y1 < (rect.height + self.height[p])) &
+            ((x_overlap > 0.8 * width) | (x_overlap > 0.9 * rect.width))
+        )
+        if accurately:
+            matches &= (x_overlap > 0.6 * np.maximum(rect.width, width)) & (rect.y1 < self.y1[p])
+        irregular = [position for position in self.irregular_positions if check(self.lines[position])]
+        return np.sort(np.concatenate([p[matches], np.array(irregular, dtype=np.intp)]))
+
+    def count_accurate_extensions(self, column: ReadingOrderColumn, excluded: np.ndarray) -> int:
+        positions = self.extensions(column, accurately=True)
+        return int(np.count_nonzero(~excluded[positions]))
+
+    def following(self, geometry: ReadingOrderGeometry) -> list[TextLineReadingOrder]:
+        """Remaining lines for which line.geometry.distance_after(geometry) < FOLLOWING_DISTANCE, in input order."""
+        rect = geometry.rect
+        if _is_regular(rect):
+            margin = FOLLOWING_DISTANCE + QUERY_MARGIN
+            # every such line has its top edge within this distance from the bottom edge of the given line
+            p = self.band(rect.y1 - margin, rect.y1 + margin)
+            p = p[(self.y0[p] > rect.y1 - margin) & (self.y0[p] < rect.y1 + margin)]
+            candidates = np.sort(np.concatenate([p, self.irregular_positions]))
+        else:
+            candidates = np.arange(len(self.lines))
+        return [
+            self.lines[position] for position in candidates
+            if self.remaining[position]
+            and self.lines[position].geometry.distance_after(geometry) < FOLLOWING_DISTANCE
+        ]
+
+    def needs_to_come_before(self, other: ReadingOrderGeometry) -> np.ndarray:
+        """ReadingOrderGeometry.needs_to_come_before(other) for all lines, as a boolean array."""
+        top_left_condition = ((self.x_middle < other.x_middle) & (self.y_middle <= other.y_middle)) | (
+            (self.x_middle <= other.x_middle) & (self.y_middle < other.y_middle)
+        )
+        left_condition = (self.x_middle < other.rect.x0) & (
+            (self.y_middle < other.rect.y1) | (self.y0 < other.y_middle)
+        )
+        top_condition = (self.y_middle < other.rect.y0) & (
+            (self.x_middle < other.rect.x1) | (self.x0 < other.x_middle)
+        )
+        return top_left_condition | left_condition | top_condition
+
+    def any_remaining_needs_to_come_before(self, other: ReadingOrderGeometry) -> bool:
+        return bool(np.any(self.remaining & self.needs_to_come_before(other)))
+
+
+def _is_regular(rect: pymupdf.Rect) -> bool:
+    return all(math.isfinite(coordinate) for coordinate in rect) and rect.x0 <= rect.x1 and rect.y0 <= rect.y1
+
+
+def starting_line_for_next_block(index: ReadingOrderIndex) -> None | TextLineReadingOrder:
+    candidates = index.remaining.copy()
     selected_line = None
-    while candidate_lines:
-        selected_line = min(candidate_lines, key=lambda line: line.geometry.sort_key)
-        candidate_lines.remove(selected_line)
-        candidate_lines = {
-            line for line in candidate_lines if line.geometry.needs_to_come_before(selected_line.geometry)
-        }
+    while np.any(candidates):
+        positions = np.flatnonzero(candidates)
+        selected_position = positions[np.argmin(index.sort_key[positions])]
+        selected_line = index.lines[selected_position]
+        candidates[selected_position] = False
+        candidates &= index.needs_to_come_before(selected_line.geometry)
     return selected_line
 
 
-def sort_lines(text_lines: list[TextLine]) -> list[ReadingOrderBlock]:
-    all_lines = {TextLineReadingOrder(line) for line in text_lines}
-    remaining_lines = all_lines.copy()
+class TimeBudgetExceeded(Exception):
+    pass
+
+
+def sort_lines(text_lines: list[TextLine], deadline: float | None = None) -> list[ReadingOrderBlock]:
+    """Sorts the lines in reading order, using the heuristic.
+
+    :param deadline: value of time.monotonic() after which TimeBudgetExceeded is raised
+    """
+    index = ReadingOrderIndex([TextLineReadingOrder(line) for line in text_lines])
     blocks = []
 
-    while remaining_lines:
-        current_line = starting_line_for_next_block(remaining_lines)
-        remaining_lines.remove(current_line)
+    while index.remaining_count:
+        current_line = starting_line_for_next_block(index)
+        index.remove(current_line)
         current_block = [current_line]
 
-        while remaining_lines:
+        while index.remaining_count:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeBudgetExceeded
             next_line = None
 
             # add text lines that seem to continue the current column, even if they are further down (but not futher
             # down than the current height of the column)
-            column = ReadingOrderColumn.current_column(current_line, current_block[:-1], all_lines)
-            in_column_lines = {line for line in remaining_lines if column.can_be_extended_by(line.geometry)}
+            column = ReadingOrderColumn.current_column(current_line, current_block[:-1], index)
+            in_column_lines = [
+                index.lines[position] for position in index.extensions(column, accurately=False)
+                if index.remaining[position]
+            ]
             if len(in_column_lines):
                 highest_following = min(in_column_lines, key=lambda line: line.geometry.rect.y0)
-                candidates = {
+                candidates = [
                     line for line in in_column_lines
-                    if line.geometry.needs_to_come_before(highest_following.geometry)
-                }
-                candidates.add(highest_following)
+                    if line is highest_following or line.geometry.needs_to_come_before(highest_following.geometry)
+                ]
                 next_line = min(candidates, key=lambda line: line.geometry.rect.x0)
 
             if not next_line:
                 # lines that are directly below the last line, either left-aligned, right-aligned or centered
-                following = {line for line in remaining_lines if line.geometry.distance_after(current_line.geometry) < 20}
+                following = index.following(current_line.geometry)
                 if len(following):
                     next_line = min(following, key=lambda line: line.geometry.rect.y0)
 
@@ -211,10 +370,10 @@ def sort_lines(text_lines: list[TextLine]) -> list[ReadingOrderBlock]:
                 break
 
             current_line = next_line
-            remaining_lines.remove(current_line)
+            index.remove(current_line)
 
-            if any(line.geometry.needs_to_come_before(current_line.geometry) for line in remaining_lines):
-                remaining_lines.add(current_line)
+            if index.any_remaining_needs_to_come_before(current_line.geometry):
+                index.add(current_line)
                 break
 
             current_block.append(current_line)
@@ -222,3 +381,39 @@ def sort_lines(text_lines: list[TextLine]) -> list[ReadingOrderBlock]:
         blocks.append(ReadingOrderBlock([line.line for line in current_block]))
     return blocks
 
+
+_max_lines: int | None = None
+_time_budget_seconds: float | None = None
+
+
+def configure(max_lines: int | None, time_budget_seconds: float | None):
+    """Configures when sort_lines_with_fallback() uses the XY-cut engine instead of the heuristic in this process.
+
+    :param max_lines: pages with more lines are always sorted with the XY-cut engine; no limit if None
+    :param time_budget_seconds: if the heuristic takes longer on a page, it is aborted and the page is sorted with the
+                                XY-cut engine instead; no limit if None
+    """
+    global _max_lines, _time_budget_seconds
+    _max_lines = max_lines
+    _time_budget_seconds = time_budget_seconds
+
+
+def configuration() -> dict:
+    """The current configuration, e.g. for detecting checkpoints that were written with a different configuration."""
+    return {"max_lines": _max_lines, "time_budget_seconds": _time_budget_seconds}
+
+
+def sort_lines_with_fallback(text_lines: list[TextLine]) -> tuple[list[ReadingOrderBlock], str]:
+    """Sorts the lines in reading order, and returns the blocks together with the engine that was used."""
+    if _max_lines is not None and len(text_lines) > _max_lines:
+        logging.info(f"  {len(text_lines)} lines exceed {_max_lines} lines, using the {ENGINE_XY_CUT} reading order.")
+    else:
+        deadline = time.monotonic() + _time_budget_seconds if _time_budget_seconds is not None else None
+        try:
+            return sort_lines(text_lines, deadline), ENGINE_HEURISTIC
+        except TimeBudgetExceeded:
+            logging.info(
+                f"  Reading order for {len(text_lines)} lines took more than {_time_budget_seconds} seconds, "
+                f"using the {ENGINE_XY_CUT} reading order."
+            )
+    return [ReadingOrderBlock(lines) for lines in xy_cut(text_lines)], ENGINE_XY_CUT
@@ -1,19 +1,41 @@
+import csv
+import gzip
+import logging
 import os
-import shutil
-from collections.abc import Iterator
+import threading
+from collections import deque
+from collections.abc import Callable, Collection, Iterator
 from abc import abstractmethod
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
 from pathlib import Path
+from urllib.parse import unquote_plus
+
+from boto3.s3.transfer import TransferConfig
+
+from aws import aws
 
 
 class AssetItem:
     tmp_dir: Path
     filename: str
+    size: int | None = None  # size of the input file in bytes, if known before loading
+    data: bytes | None = None  # content of the input file, if it was loaded into memory instead of into tmp_path
+    read_only: bool = False  # whether the file at input_path must not be modified
 
     @abstractmethod
     def load(self):
         pass
 
+    def release(self):
+        """Called once the result has been saved (or the processing has failed) and the tmp files are cleaned up."""
+        pass
+
+    @property
+    def input_path(self) -> Path:
+        """Location of the input file for processing (unless it was loaded into memory)."""
+        return self.tmp_path
+
     @property
     def tmp_path(self):
         return self.tmp_dir / self.filename
@@ -24,24 +46,54 @@ class AssetItem:
 
 
 class FileAssetItem(AssetItem):
+    """A local file, which is opened in place instead of being copied into the tmp dir, and therefore read-only.
+
+    The processor only copies it into the tmp dir if incremental saves are configured, see
+    Processor.incremental_save_path().
+    """
+    read_only = True
+
     def __init__(self, in_path: Path, tmp_dir: Path):
         self.in_path = in_path
         self.filename = os.path.basename(in_path)
         self.tmp_dir = tmp_dir / self.filename  # separate tmp dir per file
+        self.size = os.path.getsize(in_path)
 
     def load(self):
-        shutil.copy(self.in_path, self.tmp_path)
+        pass
+
+    @property
+    def input_path(self) -> Path:
+        return self.in_path
 
 
 class S3AssetItem(AssetItem):
-    def __init__(self, s3_bucket: any, s3_key: str, tmp_dir: Path):
+    def __init__(
+            self,
+            s3_bucket: any,
+            s3_key: str,
+            tmp_dir: Path,
+            size: int | None = None,
+            in_memory_max_bytes: int = 0,
+            transfer_config: TransferConfig | None = None
+    ):
+        """
+        :param in_memory_max_bytes: files up to this size are loaded into memory instead of into the tmp dir
+        :param transfer_config: configuration of the download, e.g. of the parallel ranged GET requests for large files
+        """
         self.s3_bucket = s3_bucket
         self.s3_key = s3_key
         self.filename = S3AssetItem.key_to_filename(self.s3_key)
         self.tmp_dir = tmp_dir / self.filename  # separate tmp dir per file
+        self.size = size
+        self.in_memory_max_bytes = in_memory_max_bytes
+        self.transfer_config = transfer_config
 
     def load(self):
-        self.s3_bucket.download_file(self.s3_key, self.tmp_path)
+        if self.size is not None and self.size <= self.in_memory_max_bytes:
+            self.data = aws.load_bytes(self.s3_bucket, self.s3_key, self.transfer_config)
+        else:
+            aws.load_file(self.s3_bucket, self.s3_key, str(self.tmp_path), self.transfer_config)
 
     @staticmethod
     def key_to_filename(key):
@@ -57,7 +109,7 @@ class AssetSource:
 @dataclass
 class FileAssetSource(AssetSource):
     in_path: Path
-    skip_filenames: set[str]
+    skip_filenames: Collection[str]
     tmp_dir: Path
 
     def iterator(self) -> Iterator[AssetItem]:
@@ -79,22 +131,165 @@ class FileAssetSource(AssetSource):
 
 @dataclass
 class S3AssetSource(AssetSource):
+    """All PDF files with the given prefix in an S3 bucket.
+
+    The objects are listed lazily, so that processing can start as soon as the first page of the listing has arrived.
+    With list_concurrency > 1, the sub-prefixes are listed in parallel (see aws.list_objects_parallel()). If a manifest
+    (e.g. from S3 Inventory) is given, then the objects are read from this local file instead of listing the bucket.
+    """
     s3_bucket: any
     s3_prefix: str
-    skip_filenames: set[str]
+    skip_filenames: Collection[str]
     tmp_dir: Path
+    in_memory_max_bytes: int = 0
+    transfer_config: TransferConfig | None = None
+    list_concurrency: int = 1
+    manifest_path: Path | None = None
+    manifest_schema: str = "Bucket, Key, Size"
 
     def iterator(self) -> Iterator[AssetItem]:
-        objs = list(self.s3_bucket.objects.filter(Prefix=self.s3_prefix))
-
         return (
             S3AssetItem(
                 s3_bucket=self.s3_bucket,
-                s3_key=obj.key,
-                tmp_dir=self.tmp_dir
+                s3_key=key,
+                tmp_dir=self.tmp_dir,
+                size=size,
+                in_memory_max_bytes=self.in_memory_max_bytes,
+                transfer_config=self.transfer_config
             )
-            for obj in objs
-            if obj.size
-            if obj.key.lower().endswith(".pdf")
-            if S3AssetItem.key_to_filename(obj.key) not in self.skip_filenames
+            for key, size in self._list_objects()
+            if size != 0
+            if key.lower().endswith(".pdf")
+            if S3AssetItem.key_to_filename(key) not in self.skip_filenames
         )
+
+    def _list_objects(self) -> Iterator[tuple[str, int | None]]:
+        if self.manifest_path:
+            return (
+                (key, size)
+                for key, size in read_manifest(self.manifest_path, self.manifest_schema, self.s3_bucket.name)
+                if key.startswith(self.s3_prefix)
+            )
+        if self.list_concurrency > 1:
+            return aws.list_objects_parallel(self.s3_bucket, self.s3_prefix, self.list_concurrency)
+        return aws.list_objects(self.s3_bucket, self.s3_prefix)
+
+
+def read_manifest(path: Path, schema: str, bucket_name: str) -> Iterator[tuple[str, int | None]]:
+    """Reads the keys and (if available) the sizes of the objects in an S3 Inventory CSV file (optionally gzipped).
+
+    S3 Inventory CSV files have no header row; the columns are given by the schema (the "fileSchema" from the
+    manifest.json of the inventory, e.g. "Bucket, Key, Size, LastModifiedDate"). Only the "Key" column is required.
+    Rows for other buckets than bucket_name are ignored. The keys are URL-encoded, as in S3 Inventory reports.
+    """
+    columns = [column.strip() for column in schema.split(",")]
+    key_index = columns.index("Key")
+    bucket_index = columns.index("Bucket") if "Bucket" in columns else None
+    size_index = columns.index("Size") if "Size" in columns else None
+
+    open_file = gzip.open if path.suffix == ".gz" else open
+    with open_file(path, "rt", newline="", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if not row:
+                continue
+            if bucket_index is not None and row[bucket_index] != bucket_name:
+                continue
+            size = row[size_index] if size_index is not None else ""
+            yield unquote_plus(row[key_index]), int(size) if size else None
+
+
+class PrefetchedAssetItem(AssetItem):
+    """An asset item that is (being) loaded in the background. Calling load() waits until loading has finished."""
+    def __init__(self, item: AssetItem, future: Future, on_release: Callable[["PrefetchedAssetItem"], None]):
+        self.item = item
+        self.future = future
+        self.on_release = on_release
+        self.filename = item.filename
+        self.tmp_dir = item.tmp_dir
+        self.size = item.size
+
+    def load(self):
+        self.future.result()
+
+    def release(self):
+        self.item.release()
+        self.on_release(self)
+
+    @property
+    def data(self) -> bytes | None:
+        return self.item.data
+
+    @property
+    def read_only(self) -> bool:
+        return self.item.read_only
+
+    @property
+    def input_path(self) -> Path:
+        return self.item.input_path
+
+    def __getattr__(self, name):
+        if name == "item":
+            raise AttributeError(name)
+        return getattr(self.item, name)
+
+
+@dataclass
+class PrefetchingAssetSource(AssetSource):
+    """Wraps another source, and already loads the next assets in the background while the current one is processed.
+
+    At most prefetch_count assets are loaded ahead. If max_bytes is set, then assets are only loaded ahead as long as
+    the total size of the prefetched assets, together with the assets that have been handed out but not yet released
+    (i.e. that are still being processed, or whose results are still waiting to be saved, see AssetItem.release()),
+    stays within this budget. Assets with an unknown size are not counted. The next asset is always loaded when it is
+    requested, even if the budget is exhausted.
+    """
+    source: AssetSource
+    prefetch_count: int
+    max_bytes: int | None = None
+    # assets that have been handed out but not yet released; updated from other threads (e.g. the save thread)
+    in_use: set[PrefetchedAssetItem] = field(default_factory=set, init=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def iterator(self) -> Iterator[AssetItem]:
+        items = iter(self.source.iterator())
+        prefetched: deque[PrefetchedAssetItem] = deque()
+        upcoming: AssetItem | None = None
+
+        with ThreadPoolExecutor(max_workers=max(self.prefetch_count, 1), thread_name_prefix="prefetch") as executor:
+            while True:
+                # Start loading further assets, as long as the limits allow it.
+                while len(prefetched) < max(self.prefetch_count, 1):
+                    if upcoming is None:
+                        upcoming = next(items, None)
+                        if upcoming is None:
+                            break
+                    prefetched_size = self.in_use_size() + sum(item.size or 0 for item in prefetched)
+                    if prefetched and not self._fits_budget(prefetched_size, upcoming):
+                        break
+                    prefetched.append(PrefetchedAssetItem(upcoming, executor.submit(_load, upcoming), self._released))
+                    upcoming = None
+
+                if not prefetched:
+                    return
+
+                item = prefetched.popleft()
+                with self.lock:
+                    self.in_use.add(item)
+                yield item
+
+    def in_use_size(self) -> int:
+        with self.lock:
+            return sum(item.size or 0 for item in self.in_use)
+
+    def _released(self, item: PrefetchedAssetItem):
+        with self.lock:
+            self.in_use.discard(item)
+
+    def _fits_budget(self, prefetched_size: int, item: AssetItem) -> bool:
+        return self.max_bytes is None or prefetched_size + (item.size or 0) <= self.max_bytes
+
+
+def _load(item: AssetItem):
+    os.makedirs(item.tmp_dir, exist_ok=True)
+    logging.info(f"Loading {item.filename} in the background.")
+    item.load()
@@ -0,0 +1,85 @@
+import math
+import statistics
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from typing import Generic, TypeVar
+
+import pymupdf
+
+T = TypeVar("T")
+
+# Rectangles that would be added to more grid cells than this are kept in a separate list that is always checked.
+MAX_CELLS_PER_RECT = 256
+
+
+class GridIndex(Generic[T]):
+    """Uniform grid over axis-aligned rectangles, to quickly find the items whose rectangle overlaps a given rectangle.
+
+    Every item is added to all grid cells that its rectangle touches. overlapping() returns all items whose rectangle
+    intersects the given rectangle in an area with positive width and height, and possibly some more items close by, so
+    callers must still apply their exact geometric condition to the returned candidates.
+    """
+
+    def __init__(self, cell_width: float, cell_height: float):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cells: dict[tuple[int, int], list[tuple[pymupdf.Rect, T]]] = defaultdict(list)
+        self.large: list[tuple[pymupdf.Rect, T]] = []
+
+    @staticmethod
+    def for_rects(rects: Iterable[pymupdf.Rect]) -> "GridIndex":
+        """Creates an empty index whose cells have the median width and height of the given rectangles."""
+        rects = list(rects)
+        if not rects:
+            return GridIndex(1.0, 1.0)
+        cell_width = statistics.median(rect.width for rect in rects)
+        cell_height = statistics.median(rect.height for rect in rects)
+        return GridIndex(cell_width if cell_width > 0 else 1.0, cell_height if cell_height > 0 else 1.0)
+
+    def add(self, rect: pymupdf.Rect, item: T):
+        entry = (rect, item)
+        cell_range = self._cell_range(rect)
+        if cell_range is None:
+            self.large.append(entry)
+            return
+        ix0, iy0, ix1, iy1 = cell_range
+        for ix in range(ix0, ix1 + 1):
+            for iy in range(iy0, iy1 + 1):
+                self.cells[(ix, iy)].append(entry)
+
+    def overlapping(self, rect: pymupdf.Rect) -> Iterator[T]:
+        """Items whose rectangle overlaps the given rectangle with a positive area, each item at most once."""
+        x0, y0, x1, y1 = rect
+        seen = set()
+        cell_range = self._cell_range(rect)
+        if cell_range is None:
+            entry_lists = [entries for entries in self.cells.values()]
+        else:
+            ix0, iy0, ix1, iy1 = cell_range
+            entry_lists = [
+                self.cells[cell]
+                for ix in range(ix0, ix1 + 1)
+                for iy in range(iy0, iy1 + 1)
+                if (cell := (ix, iy)) in self.cells
+            ]
+        entry_lists.append(self.large)
+
+        for entries in entry_lists:
+            for other, item in entries:
+                if other.x0 < x1 and x0 < other.x1 and other.y0 < y1 and y0 < other.y1 and id(item) not in seen:
+                    seen.add(id(item))
+                    yield item
+
+    def _cell_range(self, rect: pymupdf.Rect) -> tuple[int, int, int, int] | None:
+        """Indices of the first and last cell in both directions, or None if the rectangle touches too many cells."""
+        try:
+            ix0 = math.floor(rect.x0 / self.cell_width)
+            iy0 = math.floor(rect.y0 / self.cell_height)
+            ix1 = math.floor(rect.x1 / self.cell_width)
+            iy1 = math.floor(rect.y1 / self.cell_height)
+        except (ValueError, OverflowError):
+            # NaN or infinite coordinates
+            return None
+        if ix1 < ix0 or iy1 < iy0 or (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > MAX_CELLS_PER_RECT:
+            return None
+        return ix0, iy0, ix1, iy1
@@ -1,11 +1,19 @@
+import logging
 import os
 import shutil
+import threading
+import time
 from abc import abstractmethod
+from collections.abc import Callable, Collection, Iterator
+from concurrent.futures import ThreadPoolExecutor, Future
 from dataclasses import dataclass
 from pathlib import Path
 
+from boto3.s3.transfer import TransferConfig
+
 from aws import aws
 from ocr import ProcessResult
+from ocr.outputindex import OutputIndex
 from ocr.source import AssetItem, S3AssetItem
 
 
@@ -15,16 +23,41 @@ class AssetTarget:
         pass
 
     @abstractmethod
-    def existing_filenames(self) -> set[str]:
+    def existing_filenames(self) -> Collection[str]:
+        pass
+
+    @abstractmethod
+    def index_id(self) -> str:
+        """Identifies this target in an OutputIndex."""
         pass
 
+    @abstractmethod
+    def list_new_filenames(self, marker: str | None) -> Iterator[tuple[str, str]]:
+        """Lists the outputs that have (potentially) been added since the given marker, as (filename, marker) pairs.
+
+        The marker of the last pair is passed to the next call. Without a marker, all outputs are listed.
+        """
+        pass
+
+    def current_marker(self) -> str | None:
+        """The marker that list_new_filenames() would return for the current state of the target, if it is known.
+
+        Used to update the marker after saving an output, so that the target's own outputs do not cause the whole target
+        to be listed again (see IndexedAssetTarget.save()).
+        """
+        return None
+
 
 @dataclass
 class FileAssetTarget(AssetTarget):
     out_path: Path
 
     def save(self, item: AssetItem, process_result: ProcessResult):
-        shutil.move(item.result_tmp_path, Path(self.out_path, item.filename))
+        out_path = Path(self.out_path, item.filename)
+        if process_result.output_bytes is not None:
+            out_path.write_bytes(process_result.output_bytes)
+        else:
+            shutil.move(item.result_tmp_path, out_path)
 
     def existing_filenames(self) -> set[str]:
         return {
@@ -32,19 +65,37 @@ class FileAssetTarget(AssetTarget):
             for path in sorted(self.out_path.glob("*"))
         }
 
+    def index_id(self) -> str:
+        return str(self.out_path.resolve())
+
+    def list_new_filenames(self, marker: str | None) -> Iterator[tuple[str, str]]:
+        # The modification time of a directory changes whenever a file is added to (or removed from) it, so the
+        # directory only needs to be listed again when its modification time has changed since the last listing.
+        mtime = self.current_marker()
+        if mtime == marker:
+            return
+        with os.scandir(self.out_path) as entries:
+            for entry in entries:
+                yield entry.name, mtime
+
+    def current_marker(self) -> str:
+        return str(os.stat(self.out_path).st_mtime_ns)
+
 
 @dataclass
 class S3AssetTarget(AssetTarget):
     s3_bucket: any
     s3_prefix: str
     tmp_dir: Path
+    transfer_config: TransferConfig | None = None
 
     def save(self, item: AssetItem, process_result: ProcessResult):
         aws.store_file(
             bucket=self.s3_bucket,
             key=self.s3_prefix + item.filename,
             local_path=str(item.result_tmp_path),
-            process_result=process_result
+            process_result=process_result,
+            config=self.transfer_config
         )
 
     def existing_filenames(self) -> set[str]:
@@ -52,3 +103,163 @@ class S3AssetTarget(AssetTarget):
             S3AssetItem.key_to_filename(obj.key)
             for obj in self.s3_bucket.objects.filter(Prefix=self.s3_prefix)
         }
+
+    def index_id(self) -> str:
+        return f"s3://{self.s3_bucket.name}/{self.s3_prefix}"
+
+    def list_new_filenames(self, marker: str | None) -> Iterator[tuple[str, str]]:
+        # S3 lists objects in the lexicographical order of their keys, so only the keys after the last listed key are
+        # listed again. Outputs with smaller keys that were added by other processes in the meantime are missed until
+        # the next full listing (see IndexedAssetTarget). For the same reason, there is no current_marker(): the key of
+        # a saved output cannot become the marker, as other outputs with smaller keys might not have been listed yet.
+        if marker:
+            objs = self.s3_bucket.objects.filter(Prefix=self.s3_prefix, Marker=marker)
+        else:
+            objs = self.s3_bucket.objects.filter(Prefix=self.s3_prefix)
+        for obj in objs:
+            yield S3AssetItem.key_to_filename(obj.key), obj.key
+
+
+class IndexedAssetTarget(AssetTarget):
+    """Wraps another target, and keeps track of its outputs in a persistent OutputIndex.
+
+    existing_filenames() returns the index itself, which supports fast membership checks. Usually, only the outputs
+    that have been added since the last run are listed. If the last full listing of the target is more than
+    full_refresh_seconds ago (or if there has never been one), the whole target is listed and the index is reconciled
+    with it, which also finds the outputs that the incremental listing misses and forgets removed outputs. Every saved
+    output is added to the index.
+    """
+    def __init__(
+            self,
+            target: AssetTarget,
+            index_path: Path,
+            full_refresh_seconds: float = 24 * 3600,
+            clock: Callable[[], float] = time.time
+    ):
+        self.target = target
+        self.index = OutputIndex(index_path, target.index_id())
+        self.full_refresh_seconds = full_refresh_seconds
+        self.clock = clock
+
+    def save(self, item: AssetItem, process_result: ProcessResult):
+        marker_before = self.target.current_marker()
+        self.target.save(item, process_result)
+        self.index.add(item.filename)
+        # If the target has not been changed from outside since it was last listed, only this output has changed its
+        # marker, and the next start does not need to list the target again. Otherwise, the old marker is kept, so that
+        # the outside changes are listed on the next start.
+        if marker_before is not None and marker_before == self.index.marker:
+            self.index.set_marker(self.target.current_marker())
+
+    def existing_filenames(self) -> Collection[str]:
+        now = self.clock()
+        last_full_refresh = self.index.last_full_refresh
+        if last_full_refresh is None or now - last_full_refresh >= self.full_refresh_seconds:
+            self.index.reconcile(self.target.list_new_filenames(None), now)
+        else:
+            self.index.refresh(self.target.list_new_filenames(self.index.marker))
+        return self.index
+
+    def index_id(self) -> str:
+        return self.target.index_id()
+
+    def list_new_filenames(self, marker: str | None) -> Iterator[tuple[str, str]]:
+        return self.target.list_new_filenames(marker)
+
+    def current_marker(self) -> str | None:
+        return self.target.current_marker()
+
+
+class BackgroundAssetTarget(AssetTarget):
+    """Wraps another target, and saves the results in a background thread while the next asset is processed.
+
+    At most max_pending results are waiting to be saved; further calls to save() block until a slot is free. With
+    max_pending=0, results are saved synchronously. The after_save callback (e.g. for cleaning up the tmp files) is
+    called once a result has been saved successfully.
+
+    Errors from the background thread are raised on the next call to save() or close(). close() must be called before
+    the program exits, to make sure that all pending results are saved. When used as a context manager, pending errors
+    are only raised on exit if no other exception is propagating, so that the original error is not hidden.
+    """
+    def __init__(
+            self,
+            target: AssetTarget,
+            max_pending: int,
+            after_save: Callable[[AssetItem], None] | None = None
+    ):
+        self.target = target
+        self.max_pending = max_pending
+        self.after_save = after_save
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save") if max_pending > 0 else None
+        self.slots = threading.Semaphore(max_pending)
+        self.pending: set[Future] = set()
+        self.errors: list[Exception] = []
+        self.lock = threading.Lock()
+
+    def save(self, item: AssetItem, process_result: ProcessResult):
+        self._raise_errors()
+        if self.executor is None:
+            self._save(item, process_result)
+            return
+
+        self.slots.acquire()
+        future = self.executor.submit(self._save_in_background, item, process_result)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+
+    def existing_filenames(self) -> Collection[str]:
+        return self.target.existing_filenames()
+
+    def index_id(self) -> str:
+        return self.target.index_id()
+
+    def list_new_filenames(self, marker: str | None) -> Iterator[tuple[str, str]]:
+        return self.target.list_new_filenames(marker)
+
+    def current_marker(self) -> str | None:
+        return self.target.current_marker()
+
+    def close(self, raise_errors: bool = True):
+        """Waits until all pending results have been saved."""
+        if self.executor is not None:
+            with self.lock:
+                pending = len(self.pending)
+            if pending:
+                logging.info(f"Waiting for {pending} results to be saved.")
+            self.executor.shutdown(wait=True)
+        if raise_errors:
+            self._raise_errors()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The errors from the background thread have already been logged in _save_in_background().
+        self.close(raise_errors=exc_type is None)
+
+    def _save(self, item: AssetItem, process_result: ProcessResult):
+        self.target.save(item, process_result)
+        if self.after_save:
+            self.after_save(item)
+
+    def _save_in_background(self, item: AssetItem, process_result: ProcessResult):
+        try:
+            self._save(item, process_result)
+            logging.info(f"Saved result for {item.filename}.")
+        except Exception as e:
+            logging.exception(f"Saving the result for {item.filename} failed")
+            with self.lock:
+                self.errors.append(e)
+
+    def _done(self, future: Future):
+        with self.lock:
+            self.pending.discard(future)
+        self.slots.release()
+
+    def _raise_errors(self):
+        with self.lock:
+            if self.errors:
+                error = self.errors[0]
+                self.errors = []
+                raise error
@@ -1,8 +1,12 @@
 from dataclasses import dataclass
 
+import numpy as np
 import pymupdf
 from ocr.textract.textract_schema import Line, Polygon
 
+# same tolerance as in pymupdf.Matrix.prerotate()
+ROTATION_EPSILON = 1e-5
+
 
 @dataclass
 class TextWord:
@@ -96,3 +100,123 @@ class GeometryDerotator:
             derotated_rect = pymupdf.Rect(left_x, middle_y - line_height / 2, right_x, middle_y + line_height / 2)
 
         return derotated_rect, orientation
+
+
+def text_lines_from_textract(lines: list[Line], page_height: float, transform: pymupdf.Matrix) -> list[TextLine]:
+    """Same as TextLine.from_textract() for every line, but derotating all polygons of all lines at once.
+
+    As for TextLine.from_textract(), the result contains an empty list instead of a TextLine for lines without words.
+    """
+    polygons = []
+    orientations = []
+    for line in lines:
+        if not line.words:
+            continue
+        # assume rotation of first word applies to all words in the line
+        rotate = round(line.words[0].geometry.polygon.rotation_degrees)
+        for polygon in [line.geometry.polygon] + [word.geometry.polygon for word in line.words]:
+            points = polygon.points
+            polygons.append([
+                (points[0].x, points[0].y), (points[1].x, points[1].y),
+                (points[-1].x, points[-1].y), (points[-2].x, points[-2].y)
+            ])
+            orientations.append(rotate)
+
+    derotated_rects, derotated_orientations = derotate_polygons(
+        np.array(polygons, dtype=np.float64).reshape(-1, 4, 2),
+        np.array(orientations, dtype=np.int64),
+        transform,
+        page_height
+    )
+    derotated_rects = derotated_rects.tolist()
+    derotated_orientations = derotated_orientations.tolist()
+
+    text_lines = []
+    index = 0
+    for line in lines:
+        if not line.words:
+            text_lines.append([])
+            continue
+
+        bbox = line.geometry.bounding_box
+        textract_rect = pymupdf.Rect(bbox.left, bbox.top, bbox.left + bbox.width, bbox.top + bbox.height)
+        words = [
+            TextWord(word.text, pymupdf.Rect(derotated_rects[index + 1 + word_index]),
+                     derotated_orientations[index + 1 + word_index])
+            for word_index, word in enumerate(line.words)
+        ]
+        text_lines.append(TextLine(
+            line.text,
+            derotated_orientations[index],
+            pymupdf.Rect(derotated_rects[index]),
+            textract_rect * transform,
+            line.confidence / 100,
+            words
+        ))
+        index += 1 + len(line.words)
+    return text_lines
+
+
+def derotate_polygons(
+        points: np.ndarray,
+        orientations: np.ndarray,
+        transform: pymupdf.Matrix,
+        page_height: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorized GeometryDerotator.derotate() for many polygons, each with its own orientation.
+
+    :param points: array of shape (n, 4, 2) with the Textract coordinates of the top left, top right, bottom left and
+                   bottom right point of every polygon
+    :param orientations: array of shape (n,) with the (integer) orientation of every polygon, in degrees
+    :return: derotated rects as an array of shape (n, 4) and the (possibly snapped) orientations
+
+    PyMuPDF transforms points with MuPDF, in single precision. The same float32 operations are applied here, in the
+    same order, so that the result is exactly the same as with GeometryDerotator.
+    """
+    f32 = np.float32
+    a, b, c, d, e, f = (f32(value) for value in transform)
+    x = points[:, :, 0].astype(f32)
+    y = points[:, :, 1].astype(f32)
+    x, y = x * a + y * c + e, x * b + y * d + f
+
+    # snap small deviations from a multiple of 90 degrees, see GeometryDerotator.derotate()
+    closest_multiple_of_90_deg = np.round(orientations / 90).astype(np.int64) * 90
+    snapped = np.abs(orientations - closest_multiple_of_90_deg) < 25
+    orientations = np.where(snapped, closest_multiple_of_90_deg, orientations)
+
+    # rotation matrix, as computed by pymupdf.Matrix(1, 1).prerotate(-orientation)
+    theta = -orientations.astype(np.float64)
+    theta = np.where(theta < 0, theta + 360, theta)
+    theta = np.where(theta >= 360, theta - 360, theta)
+    sin = np.sin(np.radians(theta))
+    cos = np.cos(np.radians(theta))
+    rotation = [cos, sin, -sin, cos]
+    for angle, exact in [(0, (1.0, 0.0, 0.0, 1.0)), (90, (0.0, 1.0, -1.0, -0.0)),
+                         (180, (-1.0, -0.0, -0.0, -1.0)), (270, (-0.0, -1.0, 1.0, 0.0))]:
+        is_angle = np.abs(angle - theta) < ROTATION_EPSILON
+        rotation = [np.where(is_angle, exact_value, value) for exact_value, value in zip(exact, rotation)]
+    ra, rb, rc, rd = (value.astype(f32)[:, np.newaxis] for value in rotation)
+
+    # pymupdf.Quad.morph() around the bottom-left corner of the page: translate, rotate and translate back, each as a
+    # separate point transformation
+    zero, one, height = f32(0), f32(1), f32(page_height)
+    rotated_x, rotated_y = x * one + y * zero + f32(-0.0), x * zero + y * one + -height
+    rotated_x, rotated_y = rotated_x * ra + rotated_y * rc + zero, rotated_x * rb + rotated_y * rd + zero
+    rotated_x, rotated_y = rotated_x * one + rotated_y * zero + zero, rotated_x * zero + rotated_y * one + height
+
+    rotated_x = rotated_x.astype(np.float64)
+    rotated_y = rotated_y.astype(np.float64)
+    x0, x1 = rotated_x.min(axis=1), rotated_x.max(axis=1)
+    y0, y1 = rotated_y.min(axis=1), rotated_y.max(axis=1)
+
+    # "straightened" rects, see GeometryDerotator.derotate()
+    middle_y = (y0 + y1) / 2
+    delta_x = x[:, 0].astype(np.float64) - x[:, 2].astype(np.float64)
+    delta_y = y[:, 0].astype(np.float64) - y[:, 2].astype(np.float64)
+    line_height = np.sqrt(delta_x * delta_x + delta_y * delta_y)
+    rects = np.where(
+        snapped[:, np.newaxis],
+        np.stack([x0, middle_y - line_height / 2, x1, middle_y + line_height / 2], axis=1),
+        np.stack([x0, y0, x1, y1], axis=1)
+    )
+    return rects, orientations
@@ -0,0 +1,139 @@
+"""Content-addressed on-disk cache for AWS Textract responses.
+
+Responses are stored under the SHA-256 hash of the exact payload bytes that were sent to AWS Textract, as gzipped JSON
+files. When the total size of the cache exceeds the configured maximum, the least recently used entries are removed.
+
+Several processes (e.g. the worker processes of main.py) can share the same cache directory. As every process only knows
+about its own writes, the size of the cache is recomputed from the directory whenever a process has written a fraction
+RESCAN_FRACTION of the maximum size since its last scan, and before entries are evicted. The cache can therefore exceed
+its maximum size by at most RESCAN_FRACTION times the maximum size per process.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+
+FILE_EXTENSION = ".json.gz"
+
+RESCAN_FRACTION = 0.02
+
+
+class ResponseCache:
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # key -> (size in bytes, last access timestamp), for the LRU eviction
+        self.entries: dict[str, tuple[int, float]] = {}
+        self.total_bytes = 0
+        # bytes written by this process since the last scan of the directory
+        self.written_since_scan = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def key(payload: bytes) -> str:
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        entry_path = self._entry_path(key)
+        try:
+            with gzip.open(entry_path, "rb") as file:
+                response = json.loads(file.read())
+            # mark as recently used
+            os.utime(entry_path)
+        except (FileNotFoundError, EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+            size = self.entries.get(key, (entry_path.stat().st_size, 0))[0]
+            self.entries[key] = (size, entry_path.stat().st_mtime)
+        return response
+
+    def put(self, key: str, response: dict):
+        # The response metadata (request id, HTTP headers) is specific to the original request.
+        content = {name: value for name, value in response.items() if name != "ResponseMetadata"}
+        data = gzip.compress(json.dumps(content, separators=(",", ":")).encode("utf-8"))
+
+        entry_path = self._entry_path(key)
+        os.makedirs(entry_path.parent, exist_ok=True)
+        # write to a temporary file first, so that other threads/processes never read a partially written entry
+        tmp_path = entry_path.with_name(f"{entry_path.name}.{uuid.uuid4()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, entry_path)
+
+        with self.lock:
+            old_size = self.entries.get(key, (0, 0))[0]
+            self.entries[key] = (len(data), entry_path.stat().st_mtime)
+            self.total_bytes += len(data) - old_size
+            self.written_since_scan += len(data)
+            if self.total_bytes > self.max_bytes or self.written_since_scan >= RESCAN_FRACTION * self.max_bytes:
+                # also count the entries that other processes have written (or removed) in the meantime
+                self._scan()
+                if self.total_bytes > self.max_bytes:
+                    self._evict()
+
+    def _scan(self):
+        entries = {}
+        for entry_path in self.path.glob(f"*/*{FILE_EXTENSION}"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                # removed by another process in the meantime
+                continue
+            entries[entry_path.name.removesuffix(FILE_EXTENSION)] = (stat.st_size, stat.st_mtime)
+        self.entries = entries
+        self.total_bytes = sum(size for size, _ in entries.values())
+        self.written_since_scan = 0
+
+    def _evict(self):
+        # Remove the least recently used entries, until the cache only uses 90% of its maximum size.
+        target_bytes = 0.9 * self.max_bytes
+        removed = 0
+        for key, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                # already removed by another process
+                pass
+            del self.entries[key]
+            self.total_bytes -= size
+            removed += 1
+        logging.info(f"  Removed {removed} entries from the Textract response cache.")
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}{FILE_EXTENSION}"
+
+
+_cache: ResponseCache | None = None
+
+
+def configure(path: str | None, max_mb: int):
+    """Configures the cache that is used for all requests to AWS Textract in this process.
+
+    No responses are cached if path is None.
+    """
+    global _cache
+    if path is None:
+        _cache = None
+        return
+
+    _cache = ResponseCache(Path(path), max_mb * 1024 * 1024)
+    logging.info(f"Caching Textract responses in '{path}' ({len(_cache.entries)} cached responses).")
+
+
+def response_cache() -> ResponseCache | None:
+    return _cache
@@ -0,0 +1,118 @@
+"""Fast conversion of responses from the AWS Textract API into the rich schema from textract_schema.
+
+Validating a whole response with the pydantic models from textract_api_schema is slow for dense pages, as every block is
+validated against every member of the (non-discriminated) TBlock union. Instead, the blocks are indexed by their id
+once, and only the blocks of the first page are converted, based on their BlockType. Every value that is used is
+checked to have exactly the type that the pydantic models expect.
+
+For responses with any unexpected structure or type, UnsupportedResponse is raised, and the response should be parsed
+with the pydantic models instead (see textract.text_lines_from_response()). Those might still accept the response (e.g.
+by coercing a numeric string to a float, or by treating a LINE block without relationships as an unknown block type),
+or raise a proper validation error. For all other responses, the result is exactly the same as with the pydantic
+models.
+"""
+
+from ocr.textract.textract_schema import BoundingBox, Geometry, Line, Point, Polygon, Word
+
+
+class UnsupportedResponse(Exception):
+    pass
+
+
+def page_lines(response: dict) -> list[Line]:
+    """Lines of the first page of the response, or an empty list if the response does not contain any page."""
+    try:
+        return _page_lines(response)
+    except (KeyError, TypeError, AttributeError):
+        # missing fields, or values that are not a dict or a list where one is expected
+        raise UnsupportedResponse
+
+
+def _page_lines(response: dict) -> list[Line]:
+    id_to_block = {}
+    first_page = None
+    for block in _list(response["Blocks"]):
+        block_type = _str(block["BlockType"])
+        id_to_block[_str(block["Id"])] = block
+        if first_page is None and block_type == "PAGE":
+            first_page = block
+
+    if first_page is None:
+        return []
+    return [
+        _line(child, id_to_block)
+        for child in _children(first_page, id_to_block)
+        if child["BlockType"] == "LINE"
+    ]
+
+
+def _line(block: dict, id_to_block: dict[str, dict]) -> Line:
+    return Line(
+        _optional_str(block.get("Text")),
+        [_word(child) for child in _children(block, id_to_block) if child["BlockType"] == "WORD"],
+        _optional_float(block.get("Confidence")),
+        _geometry(block["Geometry"])
+    )
+
+
+def _word(block: dict) -> Word:
+    geometry = block["Geometry"]
+    return Word(
+        _optional_str(block.get("Text")),
+        _optional_float(block.get("Confidence")),
+        _geometry(geometry),
+        _float(geometry["RotationAngle"])
+    )
+
+
+def _geometry(geometry: dict) -> Geometry:
+    bounding_box = geometry["BoundingBox"]
+    return Geometry(
+        BoundingBox(
+            _float(bounding_box["Left"]),
+            _float(bounding_box["Top"]),
+            _float(bounding_box["Width"]),
+            _float(bounding_box["Height"])
+        ),
+        Polygon([Point(_float(point["X"]), _float(point["Y"])) for point in _list(geometry["Polygon"])])
+    )
+
+
+def _children(block: dict, id_to_block: dict[str, dict]) -> list[dict]:
+    """Blocks with the CHILD relationship that exist in the response, as in BlockModelWithRelationships.child_ids."""
+    children = []
+    for relationship in _list(block["Relationships"]):
+        relationship_type = _str(relationship["Type"])
+        ids = [_str(child_id) for child_id in _list(relationship["Ids"])]
+        if relationship_type == "CHILD":
+            children.extend(id_to_block[child_id] for child_id in ids if child_id in id_to_block)
+    return children
+
+
+def _list(value) -> list:
+    if type(value) is not list:
+        raise UnsupportedResponse
+    return value
+
+
+def _str(value) -> str:
+    if type(value) is not str:
+        raise UnsupportedResponse
+    return value
+
+
+def _optional_str(value) -> str | None:
+    return None if value is None else _str(value)
+
+
+def _float(value) -> float:
+    value_type = type(value)
+    if value_type is float:
+        return value
+    if value_type is int:
+        return float(value)
+    raise UnsupportedResponse
+
+
+def _optional_float(value) -> float | None:
+    return None if value is None else _float(value)
@@ -0,0 +1,137 @@
+"""Adaptive rate limiting for requests to AWS Textract.
+
+All requests go through a single token bucket. The rate of the bucket is adjusted in an AIMD (additive increase,
+multiplicative decrease) fashion: every successful request slightly increases the rate (up to the configured maximum),
+while every throttling response from AWS halves the rate (down to the configured minimum).
+
+By default, the state of the bucket is shared between all threads of the current process. When a state file is
+configured, the state is stored in that file (protected by a file lock) and shared between all processes that use the
+same file, e.g. the worker processes of main.py.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+
+@dataclass
+class RateLimiterState:
+    rate: float  # current number of requests per second
+    tokens: float
+    updated: float  # timestamp of the last update of the tokens
+    last_decrease: float = 0.0  # timestamp of the last multiplicative decrease
+
+
+class RateLimiter:
+    def __init__(
+            self,
+            max_rate: float,
+            min_rate: float = 0.5,
+            burst: float | None = None,
+            state_path: Path | None = None,
+            clock: Callable[[], float] = time.time,
+            sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        :param max_rate: maximal number of requests per second, e.g. the TPS quota of the AWS account
+        :param min_rate: the rate is never decreased below this value
+        :param burst: maximal number of requests that can be sent at once after an idle period (defaults to max_rate)
+        :param state_path: optional file for sharing the state between several processes
+        """
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.burst = max(burst if burst is not None else max_rate, 1)
+        # Reach the maximal rate again after ca. 50 successful requests.
+        self.increase = max_rate / 50
+        # Several requests that were sent at the same time are likely to be throttled together; this should only count
+        # as a single decrease.
+        self.decrease_cooldown = 1.0
+        self.state_path = state_path
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.state = RateLimiterState(rate=max_rate, tokens=self.burst, updated=clock())
+
+    @property
+    def rate(self) -> float:
+        with self._state() as state:
+            return state.rate
+
+    def acquire(self):
+        """Blocks until a request can be sent."""
+        while True:
+            with self._state() as state:
+                now = self.clock()
+                state.tokens = min(self.burst, state.tokens + max(now - state.updated, 0) * state.rate)
+                state.updated = now
+                if state.tokens >= 1:
+                    state.tokens -= 1
+                    return
+                wait = (1 - state.tokens) / state.rate
+            self.sleep(wait)
+
+    def on_success(self):
+        with self._state() as state:
+            state.rate = min(self.max_rate, state.rate + self.increase)
+
+    def on_throttle(self):
+        with self._state() as state:
+            now = self.clock()
+            if now - state.last_decrease < self.decrease_cooldown:
+                return
+            state.rate = max(self.min_rate, state.rate / 2)
+            state.tokens = min(state.tokens, 0)
+            state.last_decrease = now
+            logging.info(f"  Textract request was throttled, reducing rate to {state.rate:.2f} requests per second.")
+
+    @contextmanager
+    def _state(self):
+        with self.lock:
+            if self.state_path is None:
+                yield self.state
+                return
+
+            with open(self.state_path, "a+") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    file.seek(0)
+                    content = file.read()
+                    state = RateLimiterState(**json.loads(content)) if content else self.state
+                    yield state
+                    file.seek(0)
+                    file.truncate()
+                    file.write(json.dumps(asdict(state)))
+                    file.flush()
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+
+_limiter: RateLimiter | None = None
+
+
+def configure(max_rate: float | None, min_rate: float = 0.5, state_path: str | None = None):
+    """Configures the rate limiter that is used for all requests to AWS Textract in this process.
+
+    No rate limiting is applied if max_rate is None.
+    """
+    global _limiter
+    if max_rate is None:
+        _limiter = None
+        return
+
+    path = Path(state_path) if state_path else None
+    if path is not None:
+        os.makedirs(path.parent, exist_ok=True)
+    _limiter = RateLimiter(max_rate=max_rate, min_rate=min_rate, state_path=path)
+    logging.info(f"Limiting requests to AWS Textract to {max_rate} per second.")
+
+
+def limiter() -> RateLimiter | None:
+    return _limiter
@@ -1,23 +1,38 @@
 from __future__ import annotations
 
+import itertools
 import logging
-from pathlib import Path
+from collections.abc import Iterable
+from dataclasses import dataclass, field
 
 import botocore.exceptions
 import pymupdf
-import os
 import backoff
 from botocore.exceptions import ClientError
 from mypy_boto3_textract import TextractClient as Textractor
 import textractcaller.t_call as t_call
 
+from ocr.textract import ratelimit, cache
+from ocr.textract.fastparse import UnsupportedResponse, page_lines
 from ocr.textract.textract_api_schema import TDocument
-from ocr.textract.textract_schema import Document
+from ocr.textract.textract_schema import Document, Line
 from ocr.readingorder import TextLine
+from ocr.textline import text_lines_from_textract
+from ocr.spatialindex import GridIndex
 
 
 MAX_DIMENSION_POINTS = 2000
 
+# Maximal size of a document that is sent to AWS Textract.
+MAX_PAYLOAD_BYTES = 10 * 1024 * 1024  # 10 MB
+
+# Space that is reserved for the incremental update of every tile (see prepare_tiles()) when checking the size of the
+# serialized page. The update only contains the page object, which is usually far smaller than this.
+TILE_UPDATE_HEADROOM_BYTES = 64 * 1024
+
+# Error codes with which AWS Textract signals that the request rate is too high.
+THROTTLING_ERROR_CODES = {"ProvisionedThroughputExceededException", "ThrottlingException", "LimitExceededException"}
+
 
 def textract_coordinate_transform(clip_rect: pymupdf.Rect) -> pymupdf.Matrix:
     # Matrix to transform the Textract coordinates to the rotated PyMuPDF coordinates
@@ -29,59 +44,196 @@ def text_lines_from_response(
         transform: pymupdf.Matrix,
         page_height: float
 ) -> list[TextLine]:
+    try:
+        lines = page_lines(response)
+    except UnsupportedResponse:
+        lines = pydantic_page_lines(response)
+    return text_lines_from_textract(lines, page_height, transform)
+
+
+def pydantic_page_lines(response: dict) -> list[Line]:
+    """Same as fastparse.page_lines(), but with a full validation of the response using the pydantic models."""
     parsed_response = TDocument.model_validate(response)
     document = Document.from_api_response(parsed_response)
     if not len(document.pages):
         return []
+    return document.pages[0].lines
+
+
+def pdf_bytes(doc: pymupdf.Document) -> bytes:
+    """Serializes a document that is sent to AWS Textract.
+
+    no_new_id=True makes the result deterministic, which is required for caching the Textract responses. Object streams
+    are not used, so that the result has a classic cross-reference table, which can be extended by the incremental
+    updates from prepare_tiles().
+    """
+    return doc.tobytes(deflate=True, garbage=3, use_objstms=0, no_new_id=True)
+
+
+@dataclass
+class TextractTile:
+    """A clipped excerpt of a single-page document, serialized as a separate PDF document for AWS Textract."""
+    clip_rect: pymupdf.Rect
+    page_height: float  # height of the original, unrotated page, for computing the derotated_rect
+    doc_bytes: bytes = field(repr=False)  # serialized page, shared by all tiles of the page
+    update: bytes = field(repr=False)  # incremental update of doc_bytes with the cropbox of this tile
 
-    return [TextLine.from_textract(line, page_height, transform) for line in document.pages[0].lines]
+    @property
+    def payload(self) -> bytes:
+        """The document that is sent to AWS Textract.
 
+        Only joined when the request is sent (see call_textract_for_tile()), so that the tiles of a page do not each
+        hold their own copy of doc_bytes.
+        """
+        return self.doc_bytes + self.update
 
-def textract(doc_path: Path, extractor: Textractor, tmp_file_path: Path, clip_rect: pymupdf.Rect) -> list[TextLine]:
-    with pymupdf.Document(doc_path) as doc:
+    @property
+    def payload_size(self) -> int:
+        return len(self.doc_bytes) + len(self.update)
+
+
+def prepare_tiles(doc_bytes: bytes, clip_rects: list[pymupdf.Rect]) -> list[TextractTile]:
+    """Creates the payloads for all excerpts of a single-page document that was serialized with pdf_bytes().
+
+    The document is only parsed once. Every payload consists of the unchanged doc_bytes, followed by an incremental
+    update that only contains a new version of the page object with a different cropbox. The image streams are thus
+    shared with the original document, instead of being garbage-collected and compressed again for every excerpt.
+
+    Callers should make sure that doc_bytes leaves TILE_UPDATE_HEADROOM_BYTES below MAX_PAYLOAD_BYTES. Tiles that are
+    still too large are logged, and skipped by call_textract().
+    """
+    with pymupdf.Document(stream=doc_bytes) as doc:
         page = doc[0]
-        page_height = page.rect.height  # height of the original, unrotated page, for computing the derotated_rect
-        clip_transformed = clip_rect * page.rect.torect(page.cropbox)
+        # Changing the cropbox also changes page.rect, so everything that depends on the original page geometry is
+        # computed upfront.
+        page_height = page.rect.height
+        to_cropbox = page.rect.torect(page.cropbox)
+        mediabox = page.mediabox
+        update = _IncrementalUpdate(doc, doc_bytes)
+
+        tiles = []
+        for clip_rect in clip_rects:
+            clip_transformed = clip_rect * to_cropbox
+            # Even thought the documentation says that the cropbox is always contained in the mediabox, this is not
+            # always the case, e.g. 267123080-bp.pdf. The discrepancies are usually very small (floating point accuracy
+            # errors?). Even so, a trivial call such as page.set_cropbox(page.cropbox) will fail with an "CropBox not in
+            # MediaBox" error, if this is the case. To avoid such errors, we take an explicit intersection with the
+            # mediabox whenever we call page.set_cropbox(). Possibly related to:
+            # https://github.com/pymupdf/PyMuPDF/issues/1615
+            page.set_cropbox(clip_transformed.intersect(mediabox))
+            tile = TextractTile(
+                clip_rect=clip_rect,
+                page_height=page_height,
+                doc_bytes=doc_bytes,
+                update=update.encode(page.xref, doc.xref_object(page.xref, compressed=True))
+            )
+            if tile.payload_size >= MAX_PAYLOAD_BYTES:
+                logging.warning(
+                    f"  Excerpt {clip_rect} is {tile.payload_size / 1024 / 1024:.2f} MB, including an incremental "
+                    f"update of {len(tile.update)} bytes, and will be skipped."
+                )
+            tiles.append(tile)
+
+    return tiles
+
+
+def prepare_tile(doc_bytes: bytes, clip_rect: pymupdf.Rect) -> TextractTile:
+    return prepare_tiles(doc_bytes, [clip_rect])[0]
+
+
+class _IncrementalUpdate:
+    """Encodes an incremental update (see section 7.5.6 of the PDF specification) that replaces a single object."""
+
+    def __init__(self, doc: pymupdf.Document, doc_bytes: bytes):
+        self.offset = len(doc_bytes)
+        self.prev_startxref = int(doc_bytes[doc_bytes.rindex(b"startxref") + len(b"startxref"):].split()[0])
+        trailer = {"Size": str(doc.xref_length())}
+        for key in ("Root", "Info", "ID"):
+            value_type, value = doc.xref_get_key(-1, key)
+            if value_type != "null":
+                trailer[key] = value
+        trailer["Prev"] = str(self.prev_startxref)
+        self.trailer = "".join(f"/{key} {value}" for key, value in trailer.items())
 
-        # Even thought the documentation says that the cropbox is always contained in the mediabox, this is not always the
-        # case, e.g. 267123080-bp.pdf. The discrepancies are usually very small (floating point accuracy errors?). Even so,
-        # a trivial call such as page.set_cropbox(page.cropbox) will fail with an "CropBox not in MediaBox" error, if this
-        # is the case. To avoid such errors, we take an explicit intersection with the mediabox whenever we call
-        # page.set_cropbox(). Possibly related to: https://github.com/pymupdf/PyMuPDF/issues/1615
-        page.set_cropbox(clip_transformed.intersect(page.mediabox))
-        doc.save(tmp_file_path, deflate=True, garbage=3, use_objstms=1)
-        response = call_textract(extractor, tmp_file_path)
-        os.remove(tmp_file_path)
+    def encode(self, xref: int, object_source: str) -> bytes:
+        # All objects have generation number 0, as the document was saved with garbage collection.
+        body = f"\n{xref} 0 obj\n{object_source}\nendobj\n".encode("latin-1")
+        object_offset = self.offset + 1
+        xref_offset = self.offset + len(body)
+        # Every entry in the cross-reference table must be exactly 20 bytes long, including the end-of-line marker. The
+        # entry for object 0 (head of the list of free objects) is repeated, as some readers expect every section of
+        # the cross-reference table to start with it.
+        xref_table = (
+            f"xref\n0 1\n0000000000 65535 f\r\n{xref} 1\n{object_offset:010d} 00000 n\r\n".encode("latin-1")
+        )
+        trailer = f"trailer\n<<{self.trailer}>>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+        return body + xref_table + trailer
+
+
+def text_lines_from_tile(tile: TextractTile, response: dict | None) -> list[TextLine]:
+    if response is None:
+        return []
+
+    # Matrix to transform Textract coordinates back to PyMuPDF coordinates
+    transform = textract_coordinate_transform(clip_rect=tile.clip_rect)
+
+    return text_lines_from_response(response, transform, tile.page_height)
 
-        if response is None:
-            return []
 
-        # Matrix to transform Textract coordinates back to PyMuPDF coordinates
-        transform = textract_coordinate_transform(clip_rect=clip_rect)
+def textract(doc_bytes: bytes, extractor: Textractor, clip_rect: pymupdf.Rect) -> list[TextLine]:
+    tile = prepare_tile(doc_bytes, clip_rect)
+    response = call_textract_for_tile(extractor, tile)
+    return text_lines_from_tile(tile, response)
 
-        return text_lines_from_response(response, transform, page_height)
+
+def call_textract_for_tile(extractor: Textractor, tile: TextractTile) -> dict | None:
+    # The payload only exists while this request is running.
+    return call_textract(extractor, tile.payload)
 
 
 def backoff_hdlr(details):
     logging.info("Backing off {wait:0.1f} seconds after {tries} tries.".format(**details))
 
 
+def is_throttling_error(e: Exception) -> bool:
+    return isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+# Throttling errors are retried more often than other errors, as they are expected when running close to the TPS quota
+# of the AWS account. The shared rate limiter makes sure that the request rate is reduced in the meantime.
+@backoff.on_exception(backoff.expo,
+                      ClientError,
+                      on_backoff=backoff_hdlr,
+                      base=2,
+                      max_tries=3,
+                      giveup=is_throttling_error)
 @backoff.on_exception(backoff.expo,
                       ClientError,
                       on_backoff=backoff_hdlr,
                       base=2,
-                      max_tries=3)
-def call_textract(extractor: Textractor, tmp_file_path: Path) -> dict | None:
-    if os.path.getsize(tmp_file_path) >= 10 * 1024 * 1024:  # 10 MB
+                      max_tries=10,
+                      giveup=lambda e: not is_throttling_error(e))
+def call_textract(extractor: Textractor, payload: bytes) -> dict | None:
+    if len(payload) >= MAX_PAYLOAD_BYTES:
         logging.info("Page larger than 10MB. Skipping page.")
         return None
+
+    response_cache = cache.response_cache()
+    if response_cache:
+        cache_key = response_cache.key(payload)
+        response = response_cache.get(cache_key)
+        if response is not None:
+            return response
+
+    limiter = ratelimit.limiter()
+    if limiter:
+        limiter.acquire()
     try:
         response = t_call.call_textract(
-            input_document=str(tmp_file_path),
+            input_document=payload,
             boto3_textract_client=extractor,
             call_mode=t_call.Textract_Call_Mode.FORCE_SYNC
         )
-
     except extractor.exceptions.InvalidParameterException:
         logging.info("Encountered InvalidParameterException from Textract. Page might require more than 10MB memory. Skipping page.")
         return None
@@ -91,7 +243,15 @@ def call_textract(extractor: Textractor, tmp_file_path: Path) -> dict | None:
     except extractor.exceptions.UnsupportedDocumentException:  # 1430.pdf page 18
         logging.info("Encountered UnsupportedDocumentException from Textract. Page might have excessive width or height. Skipping page.")
         return None
+    except ClientError as e:
+        if limiter and is_throttling_error(e):
+            limiter.on_throttle()
+        raise
 
+    if limiter:
+        limiter.on_success()
+    if response_cache:
+        response_cache.put(cache_key, response)
     return response
 
 
@@ -118,12 +278,45 @@ def clip_rects(main_rect: pymupdf.Rect) -> list[pymupdf.Rect]:
 
 
 def combine_text_lines(lines1: list[TextLine], lines2: list[TextLine]) -> list[TextLine]:
-    keep_lines = [line for line in lines1 if not_covered_in(line, lines2)]
-    keep_lines.extend([line for line in lines2 if not_covered_in(line, keep_lines)])
+    """Keeps the lines from lines1 that are not covered by any line from lines2, followed by the lines from lines2 that
+    are not covered by any of the kept lines from lines1.
+
+    Grid indexes make sure that each line is only compared to the lines around it, instead of to all other lines. As
+    the lines are combined one tile after the other, most lines from lines1 are outside the bounding box of lines2, and
+    these lines are kept without any further checks.
+    """
+    if not lines2:
+        return list(lines1)
+    bbox = pymupdf.Rect(
+        min(line.rect.x0 for line in lines2),
+        min(line.rect.y0 for line in lines2),
+        max(line.rect.x1 for line in lines2),
+        max(line.rect.y1 for line in lines2)
+    )
+    nearby_lines1 = [line for line in lines1 if _overlaps(line.rect, bbox)]
+
+    lines2_index = GridIndex.for_rects(line.rect for line in itertools.chain(nearby_lines1, lines2))
+    for line in lines2:
+        lines2_index.add(line.rect, line)
+    keep_index = GridIndex(lines2_index.cell_width, lines2_index.cell_height)
+    covered_ids = set()
+    for line in nearby_lines1:
+        if not_covered_in(line, lines2_index.overlapping(line.rect)):
+            keep_index.add(line.rect, line)
+        else:
+            covered_ids.add(id(line))
+
+    keep_lines = [line for line in lines1 if id(line) not in covered_ids]
+    keep_lines.extend([line for line in lines2 if not_covered_in(line, keep_index.overlapping(line.rect))])
     return keep_lines
 
 
-def not_covered_in(line: TextLine, other_lines: list[TextLine]) -> bool:
+def _overlaps(rect1: pymupdf.Rect, rect2: pymupdf.Rect) -> bool:
+    """Whether the intersection of the two rectangles has a positive width and height."""
+    return rect1.x0 < rect2.x1 and rect2.x0 < rect1.x1 and rect1.y0 < rect2.y1 and rect2.y0 < rect1.y1
+
+
+def not_covered_in(line: TextLine, other_lines: Iterable[TextLine]) -> bool:
     return not any(
         True
         for other_line in other_lines
@@ -1,7 +1,9 @@
 import pymupdf
 
+from ocr.pageanalysis import PageAnalysis
 
-def is_digitally_born(page: pymupdf.Page) -> bool:
+
+def is_digitally_born(page: pymupdf.Page, analysis: PageAnalysis | None = None) -> bool:
     """Returns whether the page is identified as digitally born.
     
     A page is digitally born as soon as it has a bounding boxes of type "fill-text" or "stroke-text"
@@ -14,25 +16,12 @@ def is_digitally_born(page: pymupdf.Page) -> bool:
     by the image.
     
     Additionally, a page that does not have any image, is always identified as digitally born. 
-    """
-    bboxes = page.get_bboxlog()
-
-    text_bbox_union = pymupdf.Rect()
-    all_text_covered = False
-    has_image = False
 
-    for boxType, coordinates in bboxes:
-        rectangle = pymupdf.Rect(coordinates)
-        # Empty rectangle that should be ignored occurs sometimes, e.g. SwissGeol 44191 page 37.
-        if (boxType == "fill-text" or boxType == "stroke-text") and not rectangle.is_empty:
-            all_text_covered = False
-            text_bbox_union = text_bbox_union | rectangle
-        if boxType == "fill-image" or boxType == "fill-imgmask":
-            has_image = True
-            if rectangle.contains(text_bbox_union):
-                all_text_covered = True
-
-    return not (has_image and (text_bbox_union.is_empty or all_text_covered))
+    An existing PageAnalysis for the page can be passed, to avoid walking the bbox log of the page again.
+    """
+    if analysis is None:
+        analysis = PageAnalysis(page)
+    return analysis.digitally_born
 
 
 def x_overlap(rect1: pymupdf.Rect, rect2: pymupdf.Rect) -> float:  # noqa: D103
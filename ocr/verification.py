@@ -0,0 +1,62 @@
+import os
+import re
+from typing import BinaryIO
+
+import pymupdf
+
+# Reopen the written document with PyMuPDF and compare the number of pages.
+VERIFICATION_FULL = "full"
+# Compare the number of pages of the document in memory before it is written, check the structure of the written file
+# (header, trailer and the location of the cross-reference section), and compare the /Count of its page tree.
+VERIFICATION_LIGHT = "light"
+
+# The "startxref" keyword must be located within the last 1024 bytes of a PDF file.
+TAIL_BYTES = 1024
+
+STARTXREF_PATTERN = re.compile(rb"startxref\s+(\d+)\s+%%EOF\s*$")
+# Either a classic cross-reference table or a cross-reference stream object.
+XREF_PATTERN = re.compile(rb"xref\s|\d+\s+\d+\s+obj\b")
+
+
+def verify_pdf_structure(file: BinaryIO):
+    """Checks that a written PDF file is complete, by only reading its first and last bytes.
+
+    This detects empty and truncated files, as well as files in which the trailer does not point to the cross-reference
+    section, without parsing the document. Raises a ValueError if the check fails.
+    """
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    if size == 0:
+        raise ValueError("Output document is empty")
+
+    file.seek(0)
+    if not file.read(5) == b"%PDF-":
+        raise ValueError("Output document does not start with a PDF header")
+
+    file.seek(max(size - TAIL_BYTES, 0))
+    match = STARTXREF_PATTERN.search(file.read())
+    if match is None:
+        raise ValueError("Output document does not end with a PDF trailer")
+
+    xref_offset = int(match.group(1))
+    if xref_offset >= size:
+        raise ValueError(f"Cross-reference offset {xref_offset} is outside of the output document")
+    file.seek(xref_offset)
+    if not XREF_PATTERN.match(file.read(32)):
+        raise ValueError(f"No cross-reference section at offset {xref_offset} of the output document")
+
+
+def verify_page_tree_count(doc: pymupdf.Document, expected_page_count: int):
+    """Checks the /Count of the root of the page tree (trailer /Root -> /Pages) of a written PDF file.
+
+    Only the cross-reference section, the catalog and the root of the page tree are read, not the pages themselves.
+    Raises a ValueError if the document had to be repaired when it was opened, or if the count is wrong.
+    """
+    if doc.is_repaired:
+        raise ValueError("Output document had to be repaired when it was opened")
+    value_type, pages = doc.xref_get_key(doc.pdf_catalog(), "Pages")
+    if value_type != "xref":
+        raise ValueError("Output document has no page tree")
+    value_type, count = doc.xref_get_key(int(pages.split()[0]), "Count")
+    if value_type != "int" or int(count) != expected_page_count:
+        raise ValueError("Output document contains {} pages instead of {}".format(count, expected_page_count))
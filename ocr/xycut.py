@@ -0,0 +1,83 @@
+"""Recursive XY-cut, a simple and fast reading order for pages with very many text lines.
+
+The lines are recursively split into groups along the widest empty horizontal or vertical gaps between them. A group
+that cannot be split any further becomes a block, in which the lines are read from top to bottom. Every split sorts the
+lines of the group once, so for typical layouts the total cost is O(n log n).
+
+This is less accurate than the heuristic in ocr.readingorder, and is only used for pages on which the heuristic would
+be too slow, see ocr.readingorder.sort_lines_with_fallback().
+"""
+import math
+import statistics
+from collections.abc import Callable
+
+import pymupdf
+
+from ocr.textline import TextLine
+
+# Minimal gap for a split, relative to the median line height. Lines of the same paragraph are usually closer than this
+# (vertically), and words of the same line are merged into a single TextLine by AWS Textract (horizontally).
+MIN_VERTICAL_GAP = 0.5
+MIN_HORIZONTAL_GAP = 1.0
+
+
+def xy_cut(text_lines: list[TextLine]) -> list[list[TextLine]]:
+    """Groups the lines into blocks, and returns the blocks in reading order.
+
+    Lines with degenerate coordinates (non-finite or inverted) are returned in a final block, in their input order.
+    """
+    regular = [line for line in text_lines if _is_regular(line)]
+    irregular = [line for line in text_lines if not _is_regular(line)]
+    if not regular:
+        return [irregular] if irregular else []
+
+    line_height = statistics.median(line.rect.height for line in regular)
+    min_vertical_gap = max(MIN_VERTICAL_GAP * line_height, 0)
+    min_horizontal_gap = max(MIN_HORIZONTAL_GAP * line_height, 0)
+
+    blocks = []
+    # explicit stack instead of recursion, as pathological layouts can be split very deeply
+    stack = [regular]
+    while stack:
+        group = stack.pop()
+        vertical_groups, vertical_gap = _split(group, lambda rect: (rect.y0, rect.y1), min_vertical_gap)
+        horizontal_groups, horizontal_gap = _split(group, lambda rect: (rect.x0, rect.x1), min_horizontal_gap)
+        if len(vertical_groups) > 1 and (len(horizontal_groups) == 1 or vertical_gap >= horizontal_gap):
+            stack.extend(reversed(vertical_groups))
+        elif len(horizontal_groups) > 1:
+            stack.extend(reversed(horizontal_groups))
+        else:
+            blocks.append(sorted(group, key=lambda line: (line.rect.y0, line.rect.x0)))
+
+    if irregular:
+        blocks.append(irregular)
+    return blocks
+
+
+def _split(
+        lines: list[TextLine],
+        interval: Callable[[pymupdf.Rect], tuple[float, float]],
+        min_gap: float
+) -> tuple[list[list[TextLine]], float]:
+    """Splits the lines at all gaps of at least min_gap between their projections on one axis.
+
+    Returns the groups (from the top or left to the bottom or right) and the widest gap.
+    """
+    lines = sorted(lines, key=lambda line: interval(line.rect)[0])
+    groups = [[lines[0]]]
+    end = interval(lines[0].rect)[1]
+    widest_gap = 0
+    for line in lines[1:]:
+        start, line_end = interval(line.rect)
+        gap = start - end
+        if gap > 0 and gap >= min_gap:
+            groups.append([])
+            widest_gap = max(widest_gap, gap)
+        groups[-1].append(line)
+        end = max(end, line_end)
+    return groups, widest_gap
+
+
+def _is_regular(line: TextLine) -> bool:
+    rect = line.rect
+    return all(math.isfinite(coordinate) for coordinate in rect) and rect.x0 <= rect.x1 and rect.y0 <= rect.y1
@@ -0,0 +1,121 @@
+"""Helpers that are shared by several test modules and by the benchmarks."""
+from pathlib import Path
+
+import numpy as np
+import pymupdf
+
+from ocr.source import AssetItem
+from ocr.textline import TextLine
+from ocr.textract.textract import not_covered_in
+
+
+class FakeClock:
+    """A clock that only advances when told to, for use instead of time.monotonic() or time.time() and time.sleep()."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class FakeAssetItem(AssetItem):
+    """An input file that is never downloaded. Loading fails if the filename starts with "load-error"."""
+
+    def __init__(self, filename: str, tmp_dir: Path, size: int = 10):
+        self.filename = filename
+        self.tmp_dir = tmp_dir
+        self.size = size
+        self.released = False
+
+    def load(self):
+        if self.filename.startswith("load-error"):
+            raise OSError(f"Cannot download {self.filename}")
+
+    def release(self):
+        self.released = True
+
+
+class FakeTextractExceptions:
+    class InvalidParameterException(Exception):
+        pass
+
+    class UnsupportedDocumentException(Exception):
+        pass
+
+
+class FakeTextract:
+    """Stand-in for the AWS Textract client, that detects the given number of lines on every page.
+
+    All lines contain the number of the request, and the client fails after the given number of requests.
+    """
+    exceptions = FakeTextractExceptions
+
+    def __init__(self, fail_after: int | None = None, lines_per_request: int = 1):
+        self.fail_after = fail_after
+        self.lines_per_request = lines_per_request
+        self.calls = 0
+
+    def detect_document_text(self, Document):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError("Simulated crash")
+        spacing = 0.8 / self.lines_per_request
+        height = min(0.05, spacing / 2)
+        page = {"BlockType": "PAGE", "Id": "page", "Relationships": [{"Type": "CHILD", "Ids": []}]}
+        blocks = [page]
+        for index in range(self.lines_per_request):
+            top = 0.1 + index * spacing
+            geometry = {
+                "BoundingBox": {"Width": 0.4, "Height": height, "Left": 0.1, "Top": top},
+                "Polygon": [
+                    {"X": 0.1, "Y": top}, {"X": 0.5, "Y": top},
+                    {"X": 0.5, "Y": top + height}, {"X": 0.1, "Y": top + height}
+                ]
+            }
+            page["Relationships"][0]["Ids"].append(f"line{index}")
+            blocks.append({
+                "BlockType": "LINE", "Id": f"line{index}", "Text": f"Request {self.calls}", "Confidence": 99.0,
+                "Geometry": geometry, "Relationships": [{"Type": "CHILD", "Ids": [f"word{index}"]}]
+            })
+            blocks.append({
+                "BlockType": "WORD", "Id": f"word{index}", "Text": f"Request{self.calls}", "Confidence": 99.0,
+                "Geometry": {**geometry, "RotationAngle": 0.0}
+            })
+        return {"DocumentMetadata": {"Pages": 1}, "Blocks": blocks}
+
+
+class ReferenceMask:
+    """Mask without any index: a float64 array, in which the submask is summed for every query.
+
+    Mask must give exactly the same answers; tests.test_mask and benchmarks.bench_mask compare the two.
+    """
+
+    def __init__(self, page: pymupdf.Page):
+        self.mask = np.zeros((round(page.rect.width), round(page.rect.height)))
+
+    def _submask(self, rect: pymupdf.Rect) -> np.ndarray:
+        return self.mask[round(rect.x0):round(rect.x1) + 1, round(rect.y0):round(rect.y1) + 1]
+
+    def add_rect(self, rect: pymupdf.Rect):
+        self._submask(rect).fill(1)
+
+    def remove_rect(self, rect: pymupdf.Rect):
+        self._submask(rect).fill(0)
+
+    def intersects(self, rect: pymupdf.Rect) -> bool:
+        return np.any(self._submask(rect))
+
+    def coverage_ratio(self, rect: pymupdf.Rect) -> float:
+        submask = self._submask(rect)
+        return np.sum(submask) / np.size(submask)
+
+
+def pairwise_combine_text_lines(lines1: list[TextLine], lines2: list[TextLine]) -> list[TextLine]:
+    """Same as combine_text_lines(), but compares every pair of lines, without a grid index."""
+    keep_lines = [line for line in lines1 if not_covered_in(line, lines2)]
+    keep_lines.extend([line for line in lines2 if not_covered_in(line, keep_lines)])
+    return keep_lines
@@ -0,0 +1,81 @@
+"""Tests for the HTTP endpoints of the API, without connecting to AWS."""
+import importlib
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from aws import aws
+from utils import settings, task
+
+
+class FakeAwsClient:
+    def input_file_size(self, bucket_name: str, key: str) -> int | None:
+        return 1024
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        return {}
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    for name, value in {
+        "TMP_PATH": str(tmp_path),
+        "CONFIDENCE_THRESHOLD": "0.45",
+        "S3_INPUT_BUCKET": "input-bucket",
+        "S3_INPUT_FOLDER": "input/",
+        "S3_OUTPUT_BUCKET": "output-bucket",
+        "S3_OUTPUT_FOLDER": "output/",
+        "QUEUE_RETRY_AFTER_SECONDS": "30",
+        # same as the defaults of the reading order, which is configured for the whole process when the API is loaded
+        "READING_ORDER_MAX_LINES": "0",
+        "READING_ORDER_TIME_BUDGET_SECONDS": "0",
+        "AWS_DEFAULT_REGION": "eu-central-1",
+    }.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(task, "active_tasks", {})
+    monkeypatch.setattr(aws, "_shared_client", None)
+    settings.api_settings.cache_clear()
+    try:
+        module = importlib.import_module("api")
+        # The module is only loaded once per process, so the queue is configured here instead of through the settings.
+        monkeypatch.setattr(task, "scheduler", task.Scheduler(workers=1, queue_limit=1))
+        monkeypatch.setattr(aws, "shared_client", lambda: FakeAwsClient())
+        yield module
+    finally:
+        settings.api_settings.cache_clear()
+
+
+def test_queue_full(api, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def process(payload, aws_client, settings, file_size):
+        started.set()
+        assert release.wait(timeout=10)
+        return {"number_of_pages": 1}
+
+    monkeypatch.setattr(api, "process", process)
+    client = TestClient(api.app)
+
+    assert client.post("/", json={"file": "running.pdf"}).status_code == 204
+    assert started.wait(timeout=10)
+    assert client.post("/", json={"file": "queued.pdf"}).status_code == 204
+
+    response = client.post("/", json={"file": "rejected.pdf"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+
+    response = client.get("/status")
+    assert response.status_code == 200
+    assert response.json() == {
+        "queue": {"queued": 1, "running": 1, "workers": 1, "queue_limit": 1},
+        "connections": {}
+    }
+
+    release.set()
+    task.scheduler.queue.join()
+    response = client.post("/collect", json={"file": "queued.pdf"})
+    assert response.json() == {"has_finished": True, "data": {"number_of_pages": 1}}
+    response = client.post("/collect", json={"file": "rejected.pdf"})
+    assert response.status_code == 422
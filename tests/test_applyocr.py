@@ -0,0 +1,95 @@
+"""Unit tests for sending the excerpts of a page to AWS Textract concurrently."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pymupdf
+
+from ocr import Mask
+from ocr.applyocr import OCR
+from ocr.textract.textract import pdf_bytes
+from tests.helpers import FakeTextractExceptions
+
+
+class FakeTileTextract:
+    """Returns a line covering the whole excerpt and a small line in its center, labelled with the tile index.
+
+    If complete_in_reverse is set, every request waits until the requests for all later tiles have completed.
+    """
+    exceptions = FakeTextractExceptions
+
+    def __init__(self, complete_in_reverse: bool = False):
+        self.complete_in_reverse = complete_in_reverse
+        self.payloads: list[bytes] | None = None
+        self.completed: list[int] = []
+        self.condition = threading.Condition()
+
+    def set_tiles(self, ocr: OCR):
+        with self.condition:
+            self.payloads = [tile.payload for tile in ocr.tiles]
+            self.condition.notify_all()
+
+    def detect_document_text(self, Document):
+        with self.condition:
+            # the requests are already submitted before the test knows the payloads of the tiles
+            assert self.condition.wait_for(lambda: self.payloads is not None, timeout=10)
+            tile_index = self.payloads.index(Document["Bytes"])
+            if self.complete_in_reverse:
+                assert self.condition.wait_for(
+                    lambda: all(index in self.completed for index in range(tile_index + 1, len(self.payloads))),
+                    timeout=10
+                )
+            self.completed.append(tile_index)
+            self.condition.notify_all()
+
+        blocks = [{"BlockType": "PAGE", "Id": "page", "Relationships": [{"Type": "CHILD", "Ids": ["line0", "line1"]}],
+                   "Geometry": _geometry(0, 0, 1, 1)}]
+        for line_index, (text, geometry) in enumerate([
+            (f"Excerpt{tile_index}", _geometry(0, 0, 1, 1)),
+            (f"Center{tile_index}", _geometry(0.45, 0.45, 0.1, 0.05))
+        ]):
+            blocks.append({"BlockType": "LINE", "Id": f"line{line_index}", "Text": text, "Confidence": 99.0,
+                           "Geometry": geometry, "Relationships": [{"Type": "CHILD", "Ids": [f"word{line_index}"]}]})
+            blocks.append({"BlockType": "WORD", "Id": f"word{line_index}", "Text": text, "Confidence": 99.0,
+                           "Geometry": {**geometry, "RotationAngle": 0.0}})
+        return {"DocumentMetadata": {"Pages": 1}, "Blocks": blocks}
+
+
+def _geometry(left: float, top: float, width: float, height: float) -> dict:
+    return {
+        "BoundingBox": {"Width": width, "Height": height, "Left": left, "Top": top},
+        "Polygon": [
+            {"X": left, "Y": top},
+            {"X": left + width, "Y": top},
+            {"X": left + width, "Y": top + height},
+            {"X": left, "Y": top + height}
+        ]
+    }
+
+
+def _apply_ocr(client: FakeTileTextract, max_workers: int) -> list[str]:
+    doc = pymupdf.Document()
+    page = doc.new_page(width=3000, height=3000)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        ocr = OCR(
+            textractor=client,
+            confidence_threshold=0.5,
+            textract_doc_bytes=pdf_bytes(doc),
+            page_rect=page.rect,
+            mask=Mask(page),
+            executor=executor
+        )
+        ocr.start()
+        client.set_tiles(ocr)
+        return [line.text for line in ocr.apply_ocr()]
+
+
+def test_tiles_completing_in_reverse_order():
+    # the page is split into the full page and 4 excerpts
+    expected = _apply_ocr(FakeTileTextract(), max_workers=1)
+
+    client = FakeTileTextract(complete_in_reverse=True)
+    assert _apply_ocr(client, max_workers=5) == expected
+    assert client.completed == [4, 3, 2, 1, 0]
+    # the lines of the excerpts overlap, so the result depends on the order in which they are combined
+    assert "Excerpt0" in expected
+    assert "Excerpt1" not in expected
@@ -0,0 +1,27 @@
+"""Unit tests for the configuration of the AWS clients."""
+from types import SimpleNamespace
+
+from aws import aws
+
+
+def _settings(**kwargs) -> SimpleNamespace:
+    defaults = dict(
+        workers=2,
+        textract_max_concurrency=4,
+        download_concurrency=8,
+        upload_concurrency=8,
+        aws_max_pool_connections=None,
+        aws_tcp_keepalive=True,
+        aws_retry_mode=None,
+        aws_max_attempts=None
+    )
+    return SimpleNamespace(**{**defaults, **kwargs})
+
+
+def test_default_max_pool_connections():
+    # enough for the concurrent parts of the S3 transfers of all workers
+    assert aws.client_config(_settings()).max_pool_connections == 16
+    assert aws.client_config(_settings(textract_max_concurrency=12)).max_pool_connections == 24
+    small_settings = _settings(workers=1, download_concurrency=1, upload_concurrency=1)
+    assert aws.client_config(small_settings).max_pool_connections == 10
+    assert aws.client_config(_settings(aws_max_pool_connections=5)).max_pool_connections == 5
@@ -0,0 +1,142 @@
+"""Unit tests for resuming the processing of a document from per-page checkpoints."""
+import io
+import shutil
+from pathlib import Path
+
+import pymupdf
+import pytest
+from PIL import Image, ImageDraw
+
+from ocr import Processor, readingorder
+from ocr.checkpoint import CheckpointStore, PageCheckpoint, STATUS_DONE, STATUS_SKIPPED, document_checkpoint_dir
+from ocr.textline import TextLine, TextWord
+from tests.helpers import FakeTextract
+
+
+def _scanned_pdf(path: Path, pages: int):
+    doc = pymupdf.Document()
+    for page_index in range(pages):
+        page = doc.new_page()
+        image = Image.new("RGB", (300, 400), "white")
+        ImageDraw.Draw(image).text((20, 20), f"Scanned page {page_index}", fill="black")
+        buffer = io.BytesIO()
+        image.save(buffer, "jpeg")
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    doc.save(path)
+
+
+def _process(tmp_path: Path, original: Path, client: FakeTextract, checkpoint_dir: Path | None, **kwargs) -> str:
+    # The input file is modified by the incremental saves, so every run starts from a fresh copy, as in main.py.
+    tmp_dir = tmp_path / "tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+    input_path = tmp_dir / "input.pdf"
+    shutil.copyfile(original, input_path)
+    Processor(
+        input_path=input_path,
+        output_path=tmp_dir / "output.pdf",
+        debug_page=None,
+        tmp_dir=tmp_dir,
+        textract_client=client,
+        confidence_threshold=0.5,
+        use_aggressive_strategy=False,
+        checkpoint_dir=checkpoint_dir,
+        **kwargs
+    ).process()
+    with pymupdf.open(tmp_dir / "output.pdf") as doc:
+        return "".join(page.get_text() for page in doc)
+
+
+def test_line_round_trip(tmp_path):
+    line = TextLine(
+        text="Hello world",
+        orientation=90,
+        derotated_rect=pymupdf.Rect(10.5, 20.25, 110.125, 30),
+        rect=pymupdf.Rect(20, 10.5, 30, 110.125),
+        confidence=0.875,
+        words=[
+            TextWord("Hello", pymupdf.Rect(10.5, 20.25, 50, 30), 90),
+            TextWord("world", pymupdf.Rect(60, 20.25, 110.125, 30), 90)
+        ]
+    )
+    store = CheckpointStore(tmp_path, b"%PDF-1.7 document", settings={"confidence_threshold": 0.5})
+    store.save(0, PageCheckpoint(status=STATUS_DONE, lines=[line]))
+    store.save(1, PageCheckpoint(status=STATUS_SKIPPED, lines=[]))
+
+    # a new store for the same document and settings finds the checkpoints
+    store = CheckpointStore(tmp_path, b"%PDF-1.7 document", settings={"confidence_threshold": 0.5})
+    assert store.load(0) == PageCheckpoint(status=STATUS_DONE, lines=[line])
+    assert store.load(1) == PageCheckpoint(status=STATUS_SKIPPED, lines=[])
+    assert store.load(2) is None
+
+    # but not for different settings
+    assert CheckpointStore(tmp_path, b"%PDF-1.7 document", settings={"confidence_threshold": 0.6}).load(0) is None
+
+
+def test_document_checkpoint_dir_stays_inside_checkpoint_path(tmp_path):
+    checkpoint_path = tmp_path / "checkpoints"
+    for name in ["../../etc", "folder/../../../file.pdf", "/absolute.pdf", "..", "file.pdf"]:
+        path = document_checkpoint_dir(str(checkpoint_path), name)
+        assert path.parent == checkpoint_path
+        assert path.name not in ("", ".", "..")
+    path_a = document_checkpoint_dir(str(checkpoint_path), "a.pdf")
+    assert path_a == document_checkpoint_dir(str(checkpoint_path), "a.pdf")
+    assert path_a != document_checkpoint_dir(str(checkpoint_path), "b.pdf")
+
+
+def test_clear_only_removes_own_checkpoints(tmp_path):
+    other_file = tmp_path / "other.txt"
+    other_file.write_text("not a checkpoint")
+    store = CheckpointStore(tmp_path, b"%PDF-1.7 document", settings={"confidence_threshold": 0.5})
+    other_store = CheckpointStore(tmp_path, b"%PDF-1.7 document", settings={"confidence_threshold": 0.6})
+    store.save(0, PageCheckpoint(status=STATUS_SKIPPED, lines=[]))
+    other_store.save(0, PageCheckpoint(status=STATUS_SKIPPED, lines=[]))
+
+    store.clear()
+    assert not store.path.exists()
+    assert other_file.exists()
+    assert other_store.load(0) == PageCheckpoint(status=STATUS_SKIPPED, lines=[])
+
+
+def test_reading_order_configuration_is_part_of_the_fingerprint(tmp_path, monkeypatch):
+    settings = {"reading_order": readingorder.configuration()}
+    store = CheckpointStore(tmp_path, b"%PDF-1.7 document", settings=settings)
+    store.save(0, PageCheckpoint(status=STATUS_SKIPPED, lines=[]))
+
+    monkeypatch.setattr(readingorder, "_max_lines", 100)
+    settings = {"reading_order": readingorder.configuration()}
+    assert CheckpointStore(tmp_path, b"%PDF-1.7 document", settings=settings).load(0) is None
+
+
+def test_resume_does_not_send_completed_pages(tmp_path):
+    original = tmp_path / "original.pdf"
+    _scanned_pdf(original, pages=3)
+    checkpoint_dir = tmp_path / "checkpoints"
+    expected_text = _process(tmp_path, original, FakeTextract(), checkpoint_dir=None)
+
+    # crash while the second page is sent to AWS Textract
+    with pytest.raises(RuntimeError, match="Simulated crash"):
+        _process(tmp_path, original, FakeTextract(fail_after=1), checkpoint_dir)
+
+    # The first page is restored from its checkpoint. The request numbers in the fake responses are still the same as
+    # in the clean run, as the request for the first page is counted by fail_after.
+    client = FakeTextract()
+    client.calls = 1
+    assert _process(tmp_path, original, client, checkpoint_dir) == expected_text
+    assert client.calls == 3
+    # the checkpoints are removed after a successful run
+    assert not checkpoint_dir.exists()
+
+
+def test_page_pipeline_does_not_change_the_output(tmp_path):
+    original = tmp_path / "original.pdf"
+    _scanned_pdf(original, pages=6)
+    # Every page is saved incrementally, while up to 3 later pages are already preprocessed and sent to AWS Textract.
+    expected_text = _process(
+        tmp_path, original, FakeTextract(), checkpoint_dir=None, page_pipeline_depth=0, save_interval_pages=1
+    )
+    text = _process(
+        tmp_path, original, FakeTextract(), checkpoint_dir=None, page_pipeline_depth=3, save_interval_pages=1
+    )
+    assert text == expected_text
+    assert text == "".join(f"Request{page_number}\n" for page_number in range(1, 7))
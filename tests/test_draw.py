@@ -0,0 +1,23 @@
+"""Unit tests for drawing the OCR text layer."""
+import pymupdf
+
+from ocr.draw import draw_ocr_text_page, TextLayerResources
+from ocr.textline import TextLine, TextWord
+
+
+def _line(rect: pymupdf.Rect, text: str) -> TextLine:
+    word = TextWord(text=text, derotated_rect=rect, orientation=0)
+    return TextLine(text=text, orientation=0, derotated_rect=rect, rect=rect, confidence=1, words=[word])
+
+
+def test_text_layers_share_fonts():
+    doc = pymupdf.Document()
+    resources = TextLayerResources(doc)
+    for index in range(3):
+        page = doc.new_page()
+        draw_ocr_text_page(page, [_line(pymupdf.Rect(100, 100, 300, 120), f"Page{index}")], resources=resources)
+
+    for index, page in enumerate(doc):
+        assert page.get_text().strip() == f"Page{index}"
+    font_xrefs = {font[0] for page in doc for font in page.get_fonts()}
+    assert len(font_xrefs) == 1
@@ -0,0 +1,84 @@
+"""Unit tests for the interval of incremental saves."""
+from pathlib import Path
+
+import pymupdf
+
+from ocr import Processor
+from ocr.incrementalsave import IncrementalSaver
+from tests.helpers import FakeClock
+
+
+def _open_doc(tmp_path: Path) -> tuple[pymupdf.Document, Path]:
+    path = tmp_path / "doc.pdf"
+    doc = pymupdf.Document()
+    for _ in range(10):
+        doc.new_page()
+    doc.save(path)
+    return pymupdf.open(path), path
+
+
+def _modify_page(doc: pymupdf.Document, page_index: int):
+    doc[page_index].insert_text((100, 100), f"Page {page_index}")
+
+
+def test_interval_pages(tmp_path):
+    doc, path = _open_doc(tmp_path)
+    saver = IncrementalSaver(doc, path, interval_pages=3)
+    for page_index in range(10):
+        _modify_page(doc, page_index)
+        saver.page_modified()
+    assert saver.statistics.saves == 3
+    assert saver.unsaved_pages == 1
+    assert saver.statistics.bytes_written > 0
+
+
+def test_interval_seconds(tmp_path):
+    doc, path = _open_doc(tmp_path)
+    clock = FakeClock()
+    saver = IncrementalSaver(doc, path, interval_pages=0, interval_seconds=5, clock=clock)
+    for page_index in range(10):
+        clock.now += 2
+        _modify_page(doc, page_index)
+        saver.page_modified()
+    # saves after 6, 12 and 18 seconds
+    assert saver.statistics.saves == 3
+
+
+def test_no_intervals(tmp_path):
+    doc, path = _open_doc(tmp_path)
+    saver = IncrementalSaver(doc, path, interval_pages=0, interval_seconds=None)
+    for page_index in range(10):
+        _modify_page(doc, page_index)
+        saver.page_modified()
+    assert saver.statistics.saves == 0
+
+
+def _processor(input_path: Path, tmp_dir: Path, **kwargs) -> Processor:
+    return Processor(
+        input_path=input_path,
+        output_path=tmp_dir / "out.pdf",
+        debug_page=None,
+        tmp_dir=tmp_dir,
+        textract_client=None,
+        confidence_threshold=0.45,
+        use_aggressive_strategy=False,
+        **kwargs
+    )
+
+
+def test_read_only_input_is_copied_for_incremental_saves(tmp_path):
+    _, path = _open_doc(tmp_path)
+    tmp_dir = tmp_path / "tmp"
+
+    processor = _processor(path, tmp_dir, input_read_only=True)
+    save_path = processor.incremental_save_path(path, None)
+    assert save_path.parent == tmp_dir
+    assert save_path.read_bytes() == path.read_bytes()
+
+    # opened in place if no incremental saves are configured
+    processor = _processor(path, tmp_dir, input_read_only=True, save_interval_pages=0)
+    assert processor.incremental_save_path(path, None) is None
+
+    # writable inputs are saved in place, and inputs in memory are not saved at all
+    assert _processor(path, tmp_dir).incremental_save_path(path, None) == path
+    assert _processor(path, tmp_dir).incremental_save_path(path, path.read_bytes()) is None
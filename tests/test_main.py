@@ -0,0 +1,96 @@
+"""Unit tests for the failure handling of the batch processing in main.py."""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import main
+from ocr import ProcessResult
+from ocr.source import AssetSource
+from ocr.target import AssetTarget
+from tests.helpers import FakeAssetItem
+
+
+class FakeAssetSource(AssetSource):
+    def __init__(self, items: list[FakeAssetItem]):
+        self.items = items
+
+    def iterator(self):
+        return iter(self.items)
+
+
+class RecordingTarget(AssetTarget):
+    def __init__(self):
+        self.saved = []
+
+    def save(self, item, process_result: ProcessResult):
+        self.saved.append(item.filename)
+        main.cleanup(SETTINGS, item)
+
+    def existing_filenames(self):
+        return set()
+
+    def index_id(self) -> str:
+        return "recording"
+
+    def list_new_filenames(self, marker: str | None):
+        return iter([])
+
+
+SETTINGS = SimpleNamespace(cleanup_tmp_files=True, textract_aws_profile=None)
+
+
+def fake_process(settings, filename: str, *args) -> ProcessResult:
+    """Runs in a worker process instead of main.process_in_worker()."""
+    if filename.startswith("crash"):
+        # like a worker process that is killed when it runs out of memory
+        os._exit(1)
+    if filename.startswith("process-error"):
+        raise RuntimeError(f"Cannot process {filename}")
+    time.sleep(0.1)
+    return ProcessResult(1)
+
+
+def fake_worker_pool(settings, workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _check_all_handled(items: list[FakeAssetItem], target: RecordingTarget, failed_filenames: list[str]):
+    assert sorted(target.saved + failed_filenames) == sorted(item.filename for item in items)
+    for item in items:
+        assert item.released
+        assert not item.tmp_dir.exists()
+
+
+def test_sequential_failures(tmp_path, monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "eu-central-1")
+    monkeypatch.setattr(main, "create_processor", lambda settings, filename, *args: SimpleNamespace(
+        process=lambda: fake_process(settings, filename)
+    ))
+    filenames = ["a.pdf", "load-error.pdf", "process-error.pdf", "b.pdf"]
+    items = [FakeAssetItem(filename, tmp_path / filename) for filename in filenames]
+    target = RecordingTarget()
+
+    failed_filenames = main.process_sequentially(SETTINGS, FakeAssetSource(items), target)
+
+    assert failed_filenames == ["load-error.pdf", "process-error.pdf"]
+    assert target.saved == ["a.pdf", "b.pdf"]
+    _check_all_handled(items, target, failed_filenames)
+
+
+def test_parallel_failures(tmp_path):
+    filenames = ["a.pdf", "load-error.pdf", "process-error.pdf", "crash.pdf", "b.pdf", "c.pdf", "d.pdf", "e.pdf"]
+    items = [FakeAssetItem(filename, tmp_path / filename) for filename in filenames]
+    target = RecordingTarget()
+
+    failed_filenames = main.process_in_parallel(
+        SETTINGS, FakeAssetSource(items), target, workers=2, create_executor=fake_worker_pool, process=fake_process
+    )
+
+    assert {"load-error.pdf", "process-error.pdf", "crash.pdf"} <= set(failed_filenames)
+    # At most one other document was in flight when the worker process died. The remaining documents are processed by
+    # new worker processes.
+    assert len(failed_filenames) <= 4
+    assert {"c.pdf", "d.pdf", "e.pdf"} <= set(target.saved)
+    _check_all_handled(items, target, failed_filenames)
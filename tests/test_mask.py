@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+import pymupdf
+import pytest
+
+from ocr.mask import Mask
+from tests.helpers import ReferenceMask
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_mask_matches_reference(seed, monkeypatch):
+    # build the summed-area table early, so that both ways of answering the queries are used
+    monkeypatch.setattr("ocr.mask.SUMMED_AREA_TABLE_COST", 1)
+    rng = random.Random(seed)
+    page = pymupdf.Document().new_page(width=120.4, height=80.6)
+    mask = Mask(page)
+    reference = ReferenceMask(page)
+
+    def random_rect() -> pymupdf.Rect:
+        # also rects that are partially outside the page, inverted or empty
+        x0, y0 = rng.uniform(-20, 130), rng.uniform(-20, 90)
+        return pymupdf.Rect(x0, y0, x0 + rng.uniform(-5, 40), y0 + rng.uniform(-5, 30))
+
+    for step in range(300):
+        # alternate between phases with many modifications and phases with many queries only
+        if (step // 50) % 2 == 0 and rng.random() < 0.5:
+            rect = random_rect()
+            if rng.random() < 0.7:
+                mask.add_rect(rect)
+                reference.add_rect(rect)
+            else:
+                mask.remove_rect(rect)
+                reference.remove_rect(rect)
+        else:
+            rect = random_rect()
+            assert mask.intersects(rect) == reference.intersects(rect)
+            with np.errstate(invalid="ignore"):
+                expected = reference.coverage_ratio(rect)
+                actual = mask.coverage_ratio(rect)
+            assert actual == expected or (np.isnan(actual) and np.isnan(expected))
+
+    assert np.array_equal(mask.mask, reference.mask.astype(bool))
+
+
+def test_mask_uses_summed_area_table_when_not_modified():
+    page = pymupdf.Document().new_page(width=100, height=100)
+    mask = Mask(page)
+    mask.add_rect(pymupdf.Rect(10, 10, 19, 19))
+    for _ in range(60):
+        assert mask.coverage_ratio(pymupdf.Rect(0, 0, 39, 39)) == 0.0625
+    assert mask._summed_area_table is not None
+
+    mask.remove_rect(pymupdf.Rect(10, 10, 14, 19))
+    assert mask._summed_area_table is None
+    assert mask.coverage_ratio(pymupdf.Rect(0, 0, 39, 39)) == 0.03125
+
+
+def test_large_submasks_use_summed_area_table():
+    page = pymupdf.Document().new_page(width=1000, height=800)
+    mask = Mask(page)
+    mask.add_rect(pymupdf.Rect(0, 0, 499, 799))
+    mask._build_summed_area_table()
+    # more than 2**16 entries
+    assert mask.coverage_ratio(pymupdf.Rect(0, 0, 999, 799)) == 0.5
+    assert mask._direct_query_cost == 0
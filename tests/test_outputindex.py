@@ -0,0 +1,148 @@
+"""Unit tests for the persistent index of existing outputs."""
+import os
+from types import SimpleNamespace
+
+from ocr import ProcessResult
+from ocr.outputindex import OutputIndex
+from ocr.target import FileAssetTarget, IndexedAssetTarget, S3AssetTarget
+from tests.helpers import FakeAssetItem, FakeClock
+
+
+def test_refresh_and_markers(tmp_path):
+    index = OutputIndex(tmp_path / "index.sqlite", "target")
+    assert index.marker is None
+    index.refresh([("a.pdf", "prefix/a.pdf"), ("b.pdf", "prefix/b.pdf")])
+    assert index.marker == "prefix/b.pdf"
+    assert "a.pdf" in index
+    assert "c.pdf" not in index
+    assert len(index) == 2
+
+    # An empty refresh keeps the previous marker.
+    index.refresh([])
+    assert index.marker == "prefix/b.pdf"
+
+    # Different targets in the same database are independent.
+    other = OutputIndex(tmp_path / "index.sqlite", "other")
+    assert "a.pdf" not in other
+    assert other.marker is None
+
+
+def test_indexed_file_target(tmp_path):
+    out_path = tmp_path / "out"
+    os.makedirs(out_path)
+    (out_path / "existing.pdf").write_bytes(b"%PDF-")
+    index_path = tmp_path / "index.sqlite"
+
+    target = IndexedAssetTarget(FileAssetTarget(out_path), index_path)
+    assert "existing.pdf" in target.existing_filenames()
+    target.save(FakeAssetItem("new.pdf", tmp_path), ProcessResult(1, output_bytes=b"%PDF-"))
+    assert "new.pdf" in target.index
+    target.index.close()
+
+    # on the next start, the index is reused and refreshed
+    target = IndexedAssetTarget(FileAssetTarget(out_path), index_path)
+    existing = target.existing_filenames()
+    assert "existing.pdf" in existing
+    assert "new.pdf" in existing
+    assert len(existing) == 2
+
+    # the directory has not been modified since the last listing, so it is not listed again
+    assert list(target.list_new_filenames(target.index.marker)) == []
+
+
+class CountingFileAssetTarget(FileAssetTarget):
+    """Counts the outputs that are listed."""
+    listed = 0
+
+    def list_new_filenames(self, marker: str | None):
+        for filename, new_marker in super().list_new_filenames(marker):
+            self.listed += 1
+            yield filename, new_marker
+
+
+def test_own_outputs_do_not_cause_a_rescan(tmp_path):
+    out_path = tmp_path / "out"
+    os.makedirs(out_path)
+    (out_path / "existing.pdf").write_bytes(b"%PDF-")
+    index_path = tmp_path / "index.sqlite"
+
+    target = IndexedAssetTarget(CountingFileAssetTarget(out_path), index_path)
+    target.existing_filenames()
+    assert target.target.listed == 1
+    for filename in ["a.pdf", "b.pdf"]:
+        target.save(FakeAssetItem(filename, tmp_path), ProcessResult(1, output_bytes=b"%PDF-"))
+    target.index.close()
+
+    # the second start does not list the output directory again
+    target = IndexedAssetTarget(CountingFileAssetTarget(out_path), index_path)
+    assert len(target.existing_filenames()) == 3
+    assert target.target.listed == 0
+    target.index.close()
+
+    # outputs that are added from outside are still found
+    (out_path / "outside.pdf").write_bytes(b"%PDF-")
+    target = IndexedAssetTarget(CountingFileAssetTarget(out_path), index_path)
+    target.save(FakeAssetItem("c.pdf", tmp_path), ProcessResult(1, output_bytes=b"%PDF-"))
+    assert "outside.pdf" in target.existing_filenames()
+    assert target.target.listed == 5
+
+
+class FakeS3Objects:
+    """The objects collection of a bucket, listed in the lexicographical order of the keys as by S3."""
+    def __init__(self, keys: set[str]):
+        self.keys = keys
+        self.listed = 0
+
+    def filter(self, Prefix: str, Marker: str = ""):
+        for key in sorted(self.keys):
+            if key.startswith(Prefix) and key > Marker:
+                self.listed += 1
+                yield SimpleNamespace(key=key)
+
+
+def _fake_s3_bucket(keys: set[str]):
+    def upload_fileobj(fileobj, bucket_name, key, **kwargs):
+        keys.add(key)
+
+    client = SimpleNamespace(upload_fileobj=upload_fileobj)
+    return SimpleNamespace(name="bucket", objects=FakeS3Objects(keys), meta=SimpleNamespace(client=client))
+
+
+def _filenames(index: OutputIndex) -> set[str]:
+    filenames = {filename for filename in ["a.pdf", "b.pdf", "c.pdf", "d.pdf"] if filename in index}
+    assert len(index) == len(filenames)
+    return filenames
+
+
+def test_indexed_s3_target(tmp_path):
+    keys = {"output/a.pdf", "output/c.pdf"}
+    bucket = _fake_s3_bucket(keys)
+    index_path = tmp_path / "index.sqlite"
+    clock = FakeClock(1000.0)
+
+    def indexed_target() -> IndexedAssetTarget:
+        s3_target = S3AssetTarget(bucket, "output/", tmp_path)
+        return IndexedAssetTarget(s3_target, index_path, full_refresh_seconds=3600, clock=clock)
+
+    target = indexed_target()
+    assert _filenames(target.existing_filenames()) == {"a.pdf", "c.pdf"}
+    target.save(FakeAssetItem("d.pdf", tmp_path), ProcessResult(1, output_bytes=b"%PDF-"))
+    assert "output/d.pdf" in keys
+    target.index.close()
+
+    # Another process adds an output with a key before the marker, and an output is removed. The incremental listing
+    # only lists the keys after the last listed key.
+    keys.add("output/b.pdf")
+    keys.remove("output/a.pdf")
+    clock.now += 60
+    bucket.objects.listed = 0
+    target = indexed_target()
+    assert _filenames(target.existing_filenames()) == {"a.pdf", "c.pdf", "d.pdf"}
+    assert bucket.objects.listed == 1
+    target.index.close()
+
+    # the full listing reconciles the index with the bucket
+    clock.now += 3600
+    target = indexed_target()
+    assert _filenames(target.existing_filenames()) == {"b.pdf", "c.pdf", "d.pdf"}
+    assert target.index.marker == "output/d.pdf"
@@ -0,0 +1,52 @@
+"""Unit tests for the shared page analysis."""
+import io
+
+import pymupdf
+from PIL import Image
+
+from ocr.pageanalysis import PageAnalysis
+from ocr.preprocess.clean import find_old_ocr_rects
+from ocr.util import is_digitally_born
+
+
+def _image_bytes() -> bytes:
+    bytes_io = io.BytesIO()
+    Image.new("RGB", (100, 100), "white").save(bytes_io, "png")
+    return bytes_io.getvalue()
+
+
+def test_digitally_born_and_invalidate():
+    doc = pymupdf.Document()
+    page = doc.new_page()
+    page.insert_text((100, 100), "Digitally-born text")
+
+    analysis = PageAnalysis(page)
+    assert analysis.digitally_born
+    assert is_digitally_born(page)
+    assert analysis.image_info == []
+
+    # Cover the text with an image, as in scanned documents where the old OCR text is defined as "fill-text".
+    analysis.page.insert_image(page.rect, stream=_image_bytes())
+    # outdated until the analysis is invalidated
+    assert analysis.digitally_born
+
+    analysis.invalidate()
+    assert not analysis.digitally_born
+    assert len(analysis.image_info) == 1
+    assert find_old_ocr_rects(analysis.page, analysis) == analysis.summary.visible_text_rects
+    assert find_old_ocr_rects(analysis.page) == analysis.summary.visible_text_rects
+
+
+def test_bboxlog_is_only_computed_once():
+    doc = pymupdf.Document()
+    page = doc.new_page()
+    page.insert_text((100, 100), "Digitally-born text")
+
+    calls = []
+    get_bboxlog = page.get_bboxlog
+    page.get_bboxlog = lambda: calls.append(1) or get_bboxlog()
+
+    analysis = PageAnalysis(page)
+    is_digitally_born(page, analysis)
+    find_old_ocr_rects(page, analysis)
+    assert len(calls) == 1
@@ -0,0 +1,56 @@
+"""Unit tests for the adaptive Textract rate limiter."""
+import pytest
+
+from ocr.textract.ratelimit import RateLimiter
+from tests.helpers import FakeClock
+
+
+def test_acquire_respects_rate():
+    clock = FakeClock(1000.0)
+    limiter = RateLimiter(max_rate=2, burst=1, clock=clock, sleep=clock.sleep)
+
+    start = clock.now
+    for _ in range(5):
+        limiter.acquire()
+    # the first request uses the initial burst token, the other 4 requests are spaced at 0.5 seconds
+    assert clock.now - start == 2.0
+
+
+def test_aimd():
+    clock = FakeClock(1000.0)
+    limiter = RateLimiter(max_rate=10, min_rate=1, clock=clock, sleep=clock.sleep)
+
+    limiter.on_throttle()
+    assert limiter.rate == 5
+
+    # several throttling responses in quick succession only count once
+    limiter.on_throttle()
+    assert limiter.rate == 5
+
+    clock.now += 2
+    limiter.on_throttle()
+    assert limiter.rate == 2.5
+
+    clock.now += 2
+    limiter.on_throttle()
+    clock.now += 2
+    limiter.on_throttle()
+    assert limiter.rate == 1
+
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(3)
+
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == 10
+
+
+def test_shared_state_file(tmp_path):
+    clock = FakeClock(1000.0)
+    state_path = tmp_path / "ratelimit.json"
+    limiter1 = RateLimiter(max_rate=10, state_path=state_path, clock=clock, sleep=clock.sleep)
+    limiter2 = RateLimiter(max_rate=10, state_path=state_path, clock=clock, sleep=clock.sleep)
+
+    limiter1.on_throttle()
+    assert limiter2.rate == 5
@@ -1,8 +1,13 @@
 """Unit tests for the reading order logic."""
+import random
+
+import numpy as np
 import pymupdf
 import pytest
 
-from ocr.readingorder import ReadingOrderGeometry, sort_lines
+from ocr.readingorder import (
+    ReadingOrderColumn, ReadingOrderGeometry, ReadingOrderIndex, TextLineReadingOrder, sort_lines
+)
 from tests.test_readingorder_pdfs import _create_line
 
 
@@ -58,3 +63,41 @@ def test_textline_needstocomebefore():
     ]
     sorted_blocks = sort_lines(lines)
     assert len([line for block in sorted_blocks for line in block.lines]) == 3
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_readingorderindex_matches_geometry(seed):
+    rng = random.Random(seed)
+
+    def random_rect() -> pymupdf.Rect:
+        x0, y0 = rng.choice([0, 10, 20, 25]) + rng.uniform(-2, 2), rng.choice([0, 10, 20, 25]) + rng.uniform(-2, 2)
+        return pymupdf.Rect(x0, y0, x0 + rng.uniform(0, 30), y0 + rng.uniform(0, 12))
+
+    lines = [TextLineReadingOrder(_create_line(random_rect(), str(i))) for i in range(200)]
+    # lines with degenerate coordinates are always checked individually
+    lines.append(TextLineReadingOrder(_create_line(pymupdf.Rect(20, 20, 10, 10), "inverted")))
+    lines.append(TextLineReadingOrder(_create_line(pymupdf.Rect(float("nan"), 0, 10, 10), "nan")))
+    index = ReadingOrderIndex(lines)
+
+    for other in lines[:50]:
+        assert list(index.needs_to_come_before(other.geometry)) == [
+            line.geometry.needs_to_come_before(other.geometry) for line in lines
+        ]
+
+        column = ReadingOrderColumn(
+            rect=pymupdf.Rect(other.geometry.rect).include_rect(random_rect()),
+            bottom_of_first_line=other.geometry.rect.y1,
+            top_of_last_line=other.geometry.rect.y0 + rng.uniform(0, 20)
+        )
+        assert index.is_interrupted(column, np.zeros(len(lines), dtype=bool)) == any(
+            column.is_interrupted_by(line.geometry.rect) for line in lines
+        )
+        assert [lines[position] for position in index.extensions(column, accurately=False)] == [
+            line for line in lines if column.can_be_extended_by(line.geometry)
+        ]
+        assert [lines[position] for position in index.extensions(column, accurately=True)] == [
+            line for line in lines if column.is_accurately_extended_by(line.geometry)
+        ]
+        assert index.following(other.geometry) == [
+            line for line in lines if line.geometry.distance_after(other.geometry) < 20
+        ]
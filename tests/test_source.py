@@ -0,0 +1,103 @@
+"""Unit tests for listing and prefetching the input assets."""
+import gzip
+from types import SimpleNamespace
+
+from aws import aws
+from ocr.source import S3AssetSource, AssetSource, PrefetchingAssetSource
+from tests.helpers import FakeAssetItem
+
+
+class FakePaginator:
+    """Pages of list_objects_v2 results for a fixed set of keys, with two objects per page."""
+    def __init__(self, keys: list[str]):
+        self.keys = sorted(keys)
+
+    def paginate(self, Bucket: str, Prefix: str, Delimiter: str | None = None):
+        contents = []
+        common_prefixes = []
+        for key in self.keys:
+            if not key.startswith(Prefix):
+                continue
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common_prefix = Prefix + rest[:rest.index(Delimiter) + 1]
+                if common_prefix not in common_prefixes:
+                    common_prefixes.append(common_prefix)
+            else:
+                contents.append({"Key": key, "Size": 1})
+        for start in range(0, max(len(contents), 1), 2):
+            yield {
+                "Contents": contents[start:start + 2],
+                "CommonPrefixes": [{"Prefix": prefix} for prefix in common_prefixes] if start == 0 else []
+            }
+
+
+def _fake_bucket(keys: list[str]):
+    client = SimpleNamespace(get_paginator=lambda name: FakePaginator(keys))
+    return SimpleNamespace(name="bucket", meta=SimpleNamespace(client=client))
+
+
+def test_list_objects_parallel():
+    keys = [f"input/{directory}/{index}.pdf" for directory in "abcd" for index in range(5)] + ["input/top.pdf"]
+    listed = list(aws.list_objects_parallel(_fake_bucket(keys), "input/", concurrency=3))
+    assert sorted(key for key, _ in listed) == sorted(keys)
+
+
+def test_list_objects_parallel_aborted():
+    keys = [f"input/{directory}/{index}.pdf" for directory in "abcdefgh" for index in range(20)]
+    objects = aws.list_objects_parallel(_fake_bucket(keys), "input/", concurrency=2)
+    assert len([next(objects) for _ in range(3)]) == 3
+    # closing the iterator must not block on the listing threads
+    objects.close()
+
+
+def test_manifest(tmp_path):
+    manifest_path = tmp_path / "inventory.csv.gz"
+    with gzip.open(manifest_path, "wt") as file:
+        file.write('"bucket","input/File%201.pdf","1234","2024-01-01T00:00:00.000Z"\n')
+        file.write('"bucket","input/empty.pdf","0","2024-01-01T00:00:00.000Z"\n')
+        file.write('"bucket","input/image.jpg","1234","2024-01-01T00:00:00.000Z"\n')
+        file.write('"bucket","other/file.pdf","1234","2024-01-01T00:00:00.000Z"\n')
+        file.write('"other-bucket","input/file.pdf","1234","2024-01-01T00:00:00.000Z"\n')
+        file.write('"bucket","input/skipped.pdf","1234","2024-01-01T00:00:00.000Z"\n')
+
+    source = S3AssetSource(
+        s3_bucket=SimpleNamespace(name="bucket"),
+        s3_prefix="input/",
+        skip_filenames={"skipped.pdf"},
+        tmp_dir=tmp_path,
+        manifest_path=manifest_path,
+        manifest_schema="Bucket, Key, Size, LastModifiedDate"
+    )
+    items = list(source.iterator())
+    assert [(item.s3_key, item.size) for item in items] == [("input/File 1.pdf", 1234)]
+
+
+class FakeAssetSource(AssetSource):
+    def __init__(self, tmp_dir):
+        self.tmp_dir = tmp_dir
+        self.pulled = 0
+
+    def iterator(self):
+        for index in range(20):
+            self.pulled += 1
+            yield FakeAssetItem(f"{index}.pdf", self.tmp_dir / str(index))
+
+
+def test_prefetch_budget_counts_items_until_released(tmp_path):
+    source = FakeAssetSource(tmp_path)
+    prefetching = PrefetchingAssetSource(source, prefetch_count=5, max_bytes=35)
+    items = prefetching.iterator()
+
+    handed_out = [next(items) for _ in range(3)]
+    # three items in use: only the next item has been pulled from the source, but it is not loaded ahead
+    assert prefetching.in_use_size() == 30
+    assert source.pulled == 4
+
+    for item in handed_out:
+        item.release()
+    assert prefetching.in_use_size() == 0
+    assert next(items).filename == "3.pdf"
+    # the released budget is used for loading further items ahead
+    assert source.pulled == 7
+    items.close()
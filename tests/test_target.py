@@ -0,0 +1,33 @@
+"""Unit tests for saving the results in the background."""
+import pytest
+
+from ocr import ProcessResult
+from ocr.target import AssetTarget, BackgroundAssetTarget
+from tests.helpers import FakeAssetItem
+
+
+class FailingTarget(AssetTarget):
+    def save(self, item, process_result: ProcessResult):
+        raise OSError(f"Cannot save {item.filename}")
+
+    def existing_filenames(self):
+        return set()
+
+    def index_id(self) -> str:
+        return "failing"
+
+    def list_new_filenames(self, marker: str | None):
+        return iter([])
+
+
+def test_save_errors_are_raised_on_exit(tmp_path):
+    with pytest.raises(OSError, match="a.pdf"):
+        with BackgroundAssetTarget(FailingTarget(), max_pending=1) as target:
+            target.save(FakeAssetItem("a.pdf", tmp_path), ProcessResult(1))
+
+
+def test_save_errors_do_not_hide_the_original_error(tmp_path):
+    with pytest.raises(KeyboardInterrupt):
+        with BackgroundAssetTarget(FailingTarget(), max_pending=1) as target:
+            target.save(FakeAssetItem("a.pdf", tmp_path), ProcessResult(1))
+            raise KeyboardInterrupt
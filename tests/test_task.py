@@ -0,0 +1,84 @@
+"""Unit tests for queueing the files that are processed by the API."""
+import threading
+
+import pytest
+
+from utils import task
+
+
+@pytest.fixture
+def scheduler(monkeypatch) -> task.Scheduler:
+    monkeypatch.setattr(task, "active_tasks", {})
+    scheduler = task.Scheduler(workers=1, queue_limit=2)
+    monkeypatch.setattr(task, "scheduler", scheduler)
+    return scheduler
+
+
+def _start_blocking_task(file: str) -> threading.Event:
+    """Starts a task that occupies the only worker, until the returned event is set."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def target():
+        started.set()
+        assert release.wait(timeout=10)
+        return file
+
+    task.start(file, target)
+    assert started.wait(timeout=10)
+    return release
+
+
+def test_queue_limit(scheduler):
+    release = _start_blocking_task("running.pdf")
+    assert task.start("queued1.pdf", lambda: "queued1.pdf")
+    assert task.start("queued2.pdf", lambda: "queued2.pdf")
+    assert task.status() == {"queued": 2, "running": 1, "workers": 1, "queue_limit": 2}
+
+    with pytest.raises(task.QueueFullError):
+        task.start("rejected.pdf", lambda: "rejected.pdf")
+    # the rejected file is not active, so it can be started again later
+    assert not task.has_task("rejected.pdf")
+    assert task.collect_result("rejected.pdf") is None
+
+    # a file that is already active is not queued again
+    assert not task.start("queued1.pdf", lambda: "queued1.pdf")
+
+    release.set()
+    scheduler.queue.join()
+    assert task.status() == {"queued": 0, "running": 0, "workers": 1, "queue_limit": 2}
+    assert task.start("rejected.pdf", lambda: "rejected.pdf")
+    scheduler.queue.join()
+    assert task.collect_result("rejected.pdf") == task.Output(ok=True, value="rejected.pdf")
+
+
+def test_fifo_order(scheduler):
+    order = []
+    release = _start_blocking_task("running.pdf")
+    for file in ["first.pdf", "second.pdf"]:
+        task.start(file, lambda file=file: order.append(file))
+    release.set()
+    scheduler.queue.join()
+    assert order == ["first.pdf", "second.pdf"]
+
+
+def test_failed_task(scheduler):
+    def target():
+        raise RuntimeError("Simulated failure")
+
+    task.start("failed.pdf", target)
+    scheduler.queue.join()
+    result = task.collect_result("failed.pdf")
+    assert not result.ok
+    assert isinstance(result.value, RuntimeError)
+    assert not task.has_task("failed.pdf")
+
+
+def test_status_without_configure(monkeypatch):
+    monkeypatch.setattr(task, "scheduler", None)
+    assert task.status() == {
+        "queued": 0,
+        "running": 0,
+        "workers": task.DEFAULT_WORKERS,
+        "queue_limit": task.DEFAULT_QUEUE_LIMIT
+    }
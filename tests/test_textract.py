@@ -1,7 +1,20 @@
 """Unit tests for textract."""
-from ocr.textline import TextLine, TextWord
-from ocr.textract.textract import clip_rects, text_lines_from_response
+import math
+import random
+
+import pymupdf
+import pytest
+from pydantic import ValidationError
+
+from ocr.textline import TextLine, TextWord, text_lines_from_textract
+from ocr.textract.fastparse import UnsupportedResponse, page_lines
+from ocr.textract.textract import (
+    clip_rects, text_lines_from_response, pdf_bytes, prepare_tiles, combine_text_lines, pydantic_page_lines,
+    TILE_UPDATE_HEADROOM_BYTES
+)
+from ocr.textract.textract_schema import BoundingBox, Geometry, Line, Point, Polygon, Word
 from pymupdf import Rect, Matrix
+from tests.helpers import pairwise_combine_text_lines
 
 
 def test_clip_rects():
@@ -28,6 +41,38 @@ def test_clip_rects():
     assert clip_rects(tall) == [tall, top, middle, bottom]
 
 
+@pytest.mark.parametrize("rotation", [0, 90])
+def test_prepare_tiles(rotation):
+    doc = pymupdf.Document()
+    page = doc.new_page(width=3000, height=2500)
+    page.insert_text((100, 100), "Excerpt")
+    page.set_rotation(rotation)
+    doc_bytes = pdf_bytes(doc)
+
+    rects = clip_rects(page.rect)
+    tiles = prepare_tiles(doc_bytes, rects)
+    assert len(tiles) == len(rects)
+    for clip_rect, tile in zip(rects, tiles):
+        assert tile.clip_rect == clip_rect
+        # the tiles share the serialized page, and only hold their own incremental update
+        assert tile.doc_bytes is doc_bytes
+        assert tile.payload == doc_bytes + tile.update
+        assert tile.payload_size == len(tile.payload)
+        assert len(tile.update) < TILE_UPDATE_HEADROOM_BYTES
+        with pymupdf.Document(stream=tile.payload) as tile_doc:
+            assert not tile_doc.is_repaired
+            assert tile_doc.page_count == 1
+            assert tile_doc[0].rotation == rotation
+            cropbox = tile_doc[0].cropbox
+
+        # same cropbox as when modifying a freshly opened copy of the document
+        with pymupdf.Document(stream=doc_bytes) as expected_doc:
+            expected_page = expected_doc[0]
+            clip_transformed = clip_rect * expected_page.rect.torect(expected_page.cropbox)
+            expected_page.set_cropbox(clip_transformed.intersect(expected_page.mediabox))
+            assert cropbox == expected_page.cropbox
+
+
 def test_parse_response():
     response = {
         'DocumentMetadata': {'Pages': 1},
@@ -151,3 +196,138 @@ def test_parse_response():
     }
     assert text_lines_from_response(response, transform, page_height) == []
 
+
+def _random_lines(rng: random.Random, count: int, offset: float) -> list[TextLine]:
+    lines = []
+    for index in range(count):
+        x0 = rng.choice([rng.uniform(0, 1000), round(rng.uniform(0, 1000), -1)])
+        y0 = rng.choice([rng.uniform(0, 1000), round(rng.uniform(0, 1000), -1)])
+        rect = pymupdf.Rect(x0 + offset, y0, x0 + offset + rng.uniform(0, 200), y0 + rng.choice([0, 10, rng.uniform(5, 15)]))
+        lines.append(TextLine(f"line {index}", 0, rect, rect, 1, []))
+    return lines
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_combine_text_lines_matches_brute_force(seed):
+    rng = random.Random(seed)
+    lines1 = _random_lines(rng, 200, offset=0)
+    lines2 = _random_lines(rng, 100, offset=rng.uniform(0, 5))
+    # exact duplicates and slightly shifted copies, as in the overlapping parts of adjacent tiles
+    for line in rng.sample(lines1, 60):
+        rect = pymupdf.Rect(line.rect) + (rng.choice([0, 0.5, 3]), 0, rng.choice([0, 0.5, 3]), 0)
+        lines2.append(TextLine(line.text, 0, rect, rect, 1, []))
+    rng.shuffle(lines2)
+
+    combined = combine_text_lines(lines1, lines2)
+    expected = pairwise_combine_text_lines(lines1, lines2)
+    assert [id(line) for line in combined] == [id(line) for line in expected]
+
+
+def _synthetic_response(rng: random.Random, line_count: int) -> dict:
+    def geometry(left: float, top: float, width: float, height: float, rotation: bool) -> dict:
+        result = {
+            'BoundingBox': {'Width': width, 'Height': height, 'Left': left, 'Top': top},
+            'Polygon': [
+                {'X': left, 'Y': top}, {'X': left + width, 'Y': top},
+                {'X': left + width, 'Y': top + height}, {'X': left, 'Y': top + height}
+            ]
+        }
+        if rotation:
+            result['RotationAngle'] = 0.0
+        return result
+
+    page = {'BlockType': 'PAGE', 'Id': 'page', 'Geometry': geometry(0, 0, 1, 1, False), 'Relationships': []}
+    blocks = [page]
+    words = []
+    for line_index in range(line_count):
+        left, top = rng.uniform(0, 0.8), rng.uniform(0, 0.95)
+        word_ids = [f"word-{line_index}-{word_index}" for word_index in range(rng.randint(1, 4))]
+        for word_index, word_id in enumerate(word_ids):
+            words.append({
+                'BlockType': 'WORD', 'Id': word_id, 'Text': f"w{word_index}", 'TextType': 'PRINTED',
+                'Confidence': rng.uniform(50, 100), 'Geometry': geometry(left + word_index * 0.05, top, 0.04, 0.01, True)
+            })
+        blocks.append({
+            'BlockType': 'LINE', 'Id': f"line-{line_index}", 'Text': " ".join(f"w{i}" for i in range(len(word_ids))),
+            'Confidence': rng.uniform(50, 100), 'Geometry': geometry(left, top, 0.05 * len(word_ids), 0.01, False),
+            'Relationships': [{'Type': 'CHILD', 'Ids': word_ids}]
+        })
+        page['Relationships'] = [{'Type': 'CHILD', 'Ids': [block['Id'] for block in blocks[1:]]}]
+    return {'Blocks': blocks + words, 'DocumentMetadata': {'Pages': 1}}
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_fast_parser_matches_pydantic(seed):
+    rng = random.Random(seed)
+    response = _synthetic_response(rng, 50)
+    assert page_lines(response) == pydantic_page_lines(response)
+
+    # integer coordinates, missing optional fields, unknown blocks and relationships, missing and duplicate children
+    blocks = response['Blocks']
+    blocks[1]['Geometry']['BoundingBox']['Left'] = 0
+    del blocks[2]['Text']
+    blocks[3]['Confidence'] = None
+    blocks[4]['Relationships'].append({'Type': 'VALUE', 'Ids': ['page']})
+    blocks[5]['Relationships'][0]['Ids'].extend(['missing', blocks[5]['Relationships'][0]['Ids'][0]])
+    blocks.append({'BlockType': 'KEY_VALUE_SET', 'Id': 'other'})
+    blocks[0]['Relationships'][0]['Ids'].append('other')
+    assert page_lines(response) == pydantic_page_lines(response)
+
+    # no page
+    assert page_lines({'Blocks': blocks[1:]}) == pydantic_page_lines({'Blocks': blocks[1:]}) == []
+
+
+def test_fast_parser_falls_back_to_pydantic():
+    transform = Matrix(500, 0, 0, 800, 0, 0)
+    for mutate in [
+        # coerced by pydantic
+        lambda blocks: blocks[1]['Geometry']['BoundingBox'].update(Left="0.5"),
+        # lines and words that are treated as unknown blocks by pydantic
+        lambda blocks: blocks[2].pop('Relationships'),
+        lambda blocks: blocks[-1]['Geometry'].pop('RotationAngle'),
+        lambda blocks: blocks[-2].update(Text=3),
+    ]:
+        response = _synthetic_response(random.Random(0), 10)
+        mutate(response['Blocks'])
+        with pytest.raises(UnsupportedResponse):
+            page_lines(response)
+        lines = pydantic_page_lines(response)
+        assert text_lines_from_response(response, transform, 800) == [
+            TextLine.from_textract(line, 800, transform) for line in lines
+        ]
+
+    # invalid for pydantic as well
+    with pytest.raises(ValidationError):
+        text_lines_from_response({'Blocks': [{'BlockType': 'PAGE'}]}, transform, 800)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_text_lines_from_textract_matches_derotator(seed):
+    rng = random.Random(seed)
+
+    def geometry(left: float, top: float, width: float, height: float, angle: float) -> Geometry:
+        dx, dy = math.cos(angle), math.sin(angle)
+        points = [
+            (left, top), (left + width * dx, top + width * dy),
+            (left + width * dx - height * dy, top + width * dy + height * dx), (left - height * dy, top + height * dx)
+        ]
+        return Geometry(
+            BoundingBox(min(x for x, _ in points), min(y for _, y in points), width, height),
+            Polygon([Point(x, y) for x, y in points])
+        )
+
+    lines = []
+    for _ in range(200):
+        # mostly (almost) axis-aligned text, and some text at arbitrary angles
+        angle = math.radians(rng.choice([0, 90, 180, -90, rng.uniform(-10, 10), rng.uniform(-180, 180)]))
+        left, top = rng.uniform(0, 1), rng.uniform(0, 1)
+        words = [
+            Word(f"w{index}", 90.0, geometry(left + index * 0.05, top, 0.04, 0.01, angle + rng.uniform(-0.05, 0.05)), 0.0)
+            for index in range(rng.randint(0, 3))
+        ]
+        lines.append(Line("line", words, rng.uniform(50, 100), geometry(left, top, 0.15, 0.01, angle)))
+
+    transform = pymupdf.Rect(0, 0, 1, 1).torect(pymupdf.Rect(13.3, 20.7, 611.9, 841.9))
+    assert text_lines_from_textract(lines, 841.9, transform) == [
+        TextLine.from_textract(line, 841.9, transform) for line in lines
+    ]
@@ -0,0 +1,49 @@
+"""Unit tests for the Textract response cache."""
+import os
+
+from ocr.textract.cache import ResponseCache
+
+
+def test_get_and_put(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=1024 * 1024)
+    key = cache.key(b"%PDF-1.7 payload")
+    assert key == cache.key(b"%PDF-1.7 payload")
+    assert key != cache.key(b"%PDF-1.7 other payload")
+
+    assert cache.get(key) is None
+    cache.put(key, {"Blocks": [{"BlockType": "PAGE", "Id": "1"}], "ResponseMetadata": {"RequestId": "abc"}})
+    assert cache.get(key) == {"Blocks": [{"BlockType": "PAGE", "Id": "1"}]}
+
+    # entries are found again by a new cache instance
+    assert ResponseCache(tmp_path, max_bytes=1024 * 1024).get(key) == {"Blocks": [{"BlockType": "PAGE", "Id": "1"}]}
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=1024 * 1024)
+    keys = [cache.key(str(index).encode()) for index in range(3)]
+    for index, key in enumerate(keys):
+        cache.put(key, {"Blocks": [], "Index": index})
+        # make sure that the access times are distinct
+        os.utime(cache._entry_path(key), (index, index))
+        cache.entries[key] = (cache.entries[key][0], index)
+
+    # accessing the first entry makes it the most recently used one
+    assert cache.get(keys[0]) is not None
+
+    cache.max_bytes = cache.total_bytes
+    cache.put(cache.key(b"new"), {"Blocks": []})
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+
+
+def test_size_is_shared_between_processes(tmp_path):
+    # two caches on the same directory, as in two worker processes
+    max_bytes = 4000
+    caches = [ResponseCache(tmp_path, max_bytes=max_bytes), ResponseCache(tmp_path, max_bytes=max_bytes)]
+    for index in range(300):
+        cache = caches[index % 2]
+        cache.put(cache.key(str(index).encode()), {"Blocks": [], "Index": index})
+
+    total_bytes = sum(path.stat().st_size for path in tmp_path.glob("*/*.json.gz"))
+    # each cache might have missed the entries of the other one since its last scan
+    assert total_bytes <= max_bytes * 1.05
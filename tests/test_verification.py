@@ -0,0 +1,67 @@
+"""Unit tests for the lightweight verification of output documents."""
+import io
+
+import pymupdf
+import pytest
+
+from ocr.verification import verify_pdf_structure, verify_page_tree_count
+
+
+def _pdf_bytes(**kwargs) -> bytes:
+    doc = pymupdf.Document()
+    for _ in range(3):
+        doc.new_page().insert_text((100, 100), "Text")
+    buffer = io.BytesIO()
+    doc.ez_save(buffer, **kwargs)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("use_objstms", [0, 1])
+def test_valid_document(use_objstms):
+    verify_pdf_structure(io.BytesIO(_pdf_bytes(use_objstms=use_objstms)))
+
+
+def test_valid_file(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(_pdf_bytes())
+    with open(path, "rb") as file:
+        verify_pdf_structure(file)
+
+
+def test_empty_document():
+    with pytest.raises(ValueError, match="empty"):
+        verify_pdf_structure(io.BytesIO(b""))
+
+
+def test_truncated_document():
+    data = _pdf_bytes()
+    with pytest.raises(ValueError, match="trailer"):
+        verify_pdf_structure(io.BytesIO(data[:len(data) // 2]))
+
+
+def test_wrong_xref_offset():
+    data = _pdf_bytes(use_objstms=0)
+    corrupt = data.replace(b"startxref\n", b"startxref\n1", 1)
+    with pytest.raises(ValueError, match="offset"):
+        verify_pdf_structure(io.BytesIO(corrupt))
+
+
+def test_page_tree_count():
+    with pymupdf.open(stream=_pdf_bytes()) as doc:
+        verify_page_tree_count(doc, 3)
+
+
+def test_wrong_page_tree_count():
+    doc = pymupdf.Document()
+    for _ in range(3):
+        doc.new_page()
+    pages_xref = int(doc.xref_get_key(doc.pdf_catalog(), "Pages")[1].split()[0])
+    doc.xref_set_key(pages_xref, "Count", "2")
+    buffer = io.BytesIO()
+    doc.ez_save(buffer)
+
+    # the file itself is well-formed
+    verify_pdf_structure(io.BytesIO(buffer.getvalue()))
+    with pymupdf.open(stream=buffer.getvalue()) as written_doc:
+        with pytest.raises(ValueError, match="2 pages instead of 3"):
+            verify_page_tree_count(written_doc, 3)
@@ -0,0 +1,55 @@
+import time
+
+import pymupdf
+import pytest
+
+from ocr import readingorder
+from ocr.readingorder import ENGINE_HEURISTIC, ENGINE_XY_CUT, TimeBudgetExceeded, sort_lines, sort_lines_with_fallback
+from ocr.xycut import xy_cut
+from tests.test_readingorder_pdfs import _create_line
+
+
+def _texts(blocks) -> list[list[str]]:
+    return [[line.text for line in block] for block in blocks]
+
+
+def test_xy_cut_columns():
+    lines = [
+        _create_line(pymupdf.Rect(0, 0, 400, 10), "title"),
+        _create_line(pymupdf.Rect(200, 30, 400, 40), "right 1"),
+        _create_line(pymupdf.Rect(0, 30, 180, 40), "left 1"),
+        _create_line(pymupdf.Rect(0, 42, 180, 52), "left 2"),
+        _create_line(pymupdf.Rect(200, 42, 400, 52), "right 2"),
+        _create_line(pymupdf.Rect(150, 80, 250, 90), "page number"),
+    ]
+    assert _texts(xy_cut(lines)) == [["title"], ["left 1", "left 2"], ["right 1", "right 2"], ["page number"]]
+
+
+def test_xy_cut_degenerate_lines():
+    assert xy_cut([]) == []
+
+    lines = [
+        _create_line(pymupdf.Rect(0, 0, 100, 10), "a"),
+        _create_line(pymupdf.Rect(float("nan"), 0, 100, 10), "nan"),
+        _create_line(pymupdf.Rect(0, 30, 100, 40), "b"),
+        _create_line(pymupdf.Rect(100, 100, 0, 0), "inverted"),
+    ]
+    assert _texts(xy_cut(lines)) == [["a"], ["b"], ["nan", "inverted"]]
+
+
+def test_sort_lines_with_fallback():
+    lines = [_create_line(pymupdf.Rect(0, y, 100, y + 10), str(y)) for y in range(0, 100, 12)]
+    try:
+        readingorder.configure(max_lines=None, time_budget_seconds=None)
+        blocks, engine = sort_lines_with_fallback(lines)
+        assert engine == ENGINE_HEURISTIC
+
+        readingorder.configure(max_lines=len(lines) - 1, time_budget_seconds=None)
+        blocks, engine = sort_lines_with_fallback(lines)
+        assert engine == ENGINE_XY_CUT
+        assert [line for block in blocks for line in block.lines] == lines
+    finally:
+        readingorder.configure(max_lines=None, time_budget_seconds=None)
+
+    with pytest.raises(TimeBudgetExceeded):
+        sort_lines(lines, deadline=time.monotonic() - 1)
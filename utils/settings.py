@@ -12,12 +12,38 @@ class SharedSettings(BaseSettings):
 
     confidence_threshold: float
     use_aggressive_strategy: bool = False
+    textract_max_concurrency: int = 4
+    textract_max_tps: float | None = None
+    textract_min_tps: float = 0.5
+    textract_rate_limit_file: str | None = None
+    textract_cache_path: str | None = None
+    textract_cache_max_mb: int = 1024
+    page_pipeline_depth: int = 0
+    checkpoint_path: str | None = None
+    save_interval_pages: int = 1
+    save_interval_seconds: float | None = None
+    input_in_memory_max_mb: int = 50
+    download_part_mb: int = 16
+    download_concurrency: int = 8
+    output_in_memory_max_mb: int = 50
+    upload_part_mb: int = 16
+    upload_concurrency: int = 8
+    output_verification: Literal['full', 'light'] = 'full'
+    reading_order_max_lines: int = 20000
+    reading_order_time_budget_seconds: float = 120
 
 
 class ApiSettings(SharedSettings):
     aws_profile: str | None = None
     textract_aws_profile: str | None = None
     skip_processing: bool = False
+    workers: int = 2
+    queue_limit: int = 100
+    queue_retry_after_seconds: int = 60
+    aws_max_pool_connections: int | None = None
+    aws_tcp_keepalive: bool = True
+    aws_max_attempts: int | None = None
+    aws_retry_mode: Literal['legacy', 'standard', 'adaptive'] | None = None
 
     s3_input_endpoint: str | None = None
     s3_input_bucket: str
@@ -30,6 +56,7 @@ class ApiSettings(SharedSettings):
 
 class ScriptSettings(SharedSettings):
     cleanup_tmp_files: bool
+    workers: int = 1
 
     textract_aws_profile: str
 
@@ -40,12 +67,20 @@ class ScriptSettings(SharedSettings):
     input_s3_prefix: str | None = None
     input_skip_existing: bool
     input_debug_page: int | None = None
+    input_prefetch_count: int = 0
+    input_prefetch_max_mb: int | None = None
+    input_s3_list_concurrency: int = 1
+    input_manifest_path: str | None = None
+    input_manifest_schema: str = "Bucket, Key, Size"
 
     output_type: Literal['path', 's3']
     output_path: str | None = None
     output_aws_profile: str | None = None
     output_s3_bucket: str | None = None
     output_s3_prefix: str | None = None
+    output_upload_queue: int = 0
+    output_index_path: str | None = None
+    output_index_full_refresh_hours: float = 24
 
 
 logging.info(f"Loading env variables from '.env'.")
@@ -1,11 +1,10 @@
 import logging
+import queue
 import threading
 import typing
 from dataclasses import dataclass
 from typing import Dict, TypeVar
 
-from fastapi import BackgroundTasks
-
 Result = TypeVar("Result")
 
 
@@ -21,19 +20,104 @@ class Output:
     value: Result | RuntimeError
 
 
+class QueueFullError(Exception):
+    """Raised when a task cannot be started, because the queue of waiting tasks is full."""
+
+
 active_tasks: Dict[str, Task] = {}
 active_tasks_lock = threading.Lock()
 
 
-def start(file: str, background_tasks: BackgroundTasks, target: typing.Callable[[], Result]) -> bool:
+class Scheduler:
+    """Runs tasks in a fixed number of worker threads, taking them from a bounded FIFO queue."""
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.queue: queue.Queue[tuple[str, typing.Callable[[], Result]]] = queue.Queue(maxsize=queue_limit)
+        self.running = 0
+        self.running_lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._work, name=f"task-worker-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, file: str, target: typing.Callable[[], Result]):
+        try:
+            self.queue.put_nowait((file, target))
+        except queue.Full:
+            raise QueueFullError(f"Queue is full ({self.queue_limit} waiting tasks).")
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def _work(self):
+        while True:
+            file, target = self.queue.get()
+            with self.running_lock:
+                self.running += 1
+            try:
+                run(file, target)
+            finally:
+                with self.running_lock:
+                    self.running -= 1
+                self.queue.task_done()
+
+
+# used when configure() has not been called, same as the defaults of ApiSettings
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_LIMIT = 100
+
+scheduler: Scheduler | None = None
+scheduler_lock = threading.Lock()
+
+
+def configure(workers: int, queue_limit: int):
+    global scheduler
+    scheduler = Scheduler(workers=max(workers, 1), queue_limit=max(queue_limit, 1))
+    logging.info(f"Processing at most {scheduler.workers} files in parallel, with up to {scheduler.queue_limit} "
+                 f"files waiting in the queue.")
+
+
+def get_scheduler() -> Scheduler:
+    """The configured scheduler, or a scheduler with the default limits if configure() has not been called."""
+    with scheduler_lock:
+        if scheduler is None:
+            configure(workers=DEFAULT_WORKERS, queue_limit=DEFAULT_QUEUE_LIMIT)
+        return scheduler
+
+
+def start(file: str, target: typing.Callable[[], Result]) -> bool:
+    """Queues a task for the given file. Returns False if a task for this file is already active.
+
+    Raises QueueFullError if the queue has reached its limit.
+    """
     with active_tasks_lock:
         if file in active_tasks:
             return False
         active_tasks[file] = Task(file=file)
-        background_tasks.add_task(lambda: run(file, target))
+        try:
+            get_scheduler().submit(file, target)
+        except QueueFullError:
+            del active_tasks[file]
+            raise
         return True
 
 
+def status() -> dict[str, int]:
+    current_scheduler = get_scheduler()
+    with current_scheduler.running_lock:
+        running = current_scheduler.running
+    return {
+        "queued": current_scheduler.queue_depth,
+        "running": running,
+        "workers": current_scheduler.workers,
+        "queue_limit": current_scheduler.queue_limit,
+    }
+
+
 def has_task(file: str) -> bool:
     with active_tasks_lock:
         return file in active_tasks